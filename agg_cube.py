@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+# Precomputed aggregation cube for the trend charts. For every block of a wide pivot tab
+# the numerator / denominator sums are stored as [product x month x year x block] arrays,
+# so any product selection is one weighted sum over the product axis for every block of
+# the tab at once, instead of isin + groupby + merge per chart and per year.
+
+
+def trend_block(key, cols, den, num, out, blank_zeros=True):
+    """One chart's worth of columns in a tab.
+
+    cols: (start, stop) column slice of the block in the tab (None = find it by column name)
+    den / num / out: column name templates with a {yr} placeholder
+    blank_zeros: replace 0 with '' like get_req_filtered_df_scores / _act_ques_pt do
+    """
+    return {'key': key, 'cols': cols, 'den': den, 'num': num, 'out': out, 'blank_zeros': blank_zeros}
+
+
+def score_block(prefix_name, cols, param_col, agg_col):
+    # Same column naming as get_req_filtered_df_scores
+    return trend_block(prefix_name, cols, f'{prefix_name}_score_kbs_enrollment_id_{{yr}}',
+                       f'{prefix_name}_{agg_col}_{{yr}}', f'{prefix_name}_{param_col}_{{yr}}')
+
+
+def act_ques_pt_block(param_col, cols, agg_col):
+    # Same column naming as get_req_filtered_df_act_ques_pt
+    return trend_block(param_col, cols, f'{param_col}_kbs_enrollment_id_{{yr}}',
+                       f'{param_col}_{agg_col}_{{yr}}', f'{param_col}_{{yr}}')
+
+
+class AggCube:
+    def __init__(self, month_col, products, months, years, blocks, num, den, block_months):
+        self.month_col = month_col
+        self.products = products          # pd.Index of product codes (product axis)
+        self.months = months              # pd.Index of month labels (month axis)
+        self.years = years
+        self.blocks = blocks
+        self.num = num                    # float64 [product, month, year, block]
+        self.den = den
+        self.block_months = block_months  # per block: month axis positions, in sheet order
+
+    def select(self, selected_products):
+        """Filtered, aggregated frame for every block: {block key: DataFrame}.
+
+        Output columns match the get_req_filtered_df* helpers: the month column, then
+        per year the denominator, numerator and ratio columns.
+        """
+        mask = self.products.isin(list(selected_products)).astype(np.float64)
+        num = np.tensordot(mask, self.num, axes=1)  # [month, year, block]
+        den = np.tensordot(mask, self.den, axes=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = num / den
+        ratio = np.nan_to_num(ratio, nan=0.0, posinf=np.inf, neginf=-np.inf)
+
+        result = {}
+        for k, block in enumerate(self.blocks):
+            rows = self.block_months[k]
+            frame = {self.month_col: self.months[rows]}
+            for y, yr in enumerate(self.years):
+                frame[block['den'].format(yr=yr)] = den[rows, y, k]
+                frame[block['num'].format(yr=yr)] = num[rows, y, k]
+                frame[block['out'].format(yr=yr)] = ratio[rows, y, k]
+            df = pd.DataFrame(frame)
+            if block['blank_zeros']:
+                df = df.replace(0, '')
+            result[block['key']] = df
+        return result
+
+
+def locate_block(columns, block, years):
+    """(start, stop) of a block in a tab header: from the product_code column before its
+    first numerator / denominator column up to the next product_code column"""
+    columns = [str(c) for c in columns]
+    names = {template.format(yr=yr) for template in (block['den'], block['num']) for yr in years}
+    first = next((i for i, name in enumerate(columns) if name in names), None)
+    if first is None:
+        return 0, len(columns)
+    starts = [i for i, name in enumerate(columns) if name == 'product_code']
+    start = max((i for i in starts if i <= first), default=0)
+    stop = min((i for i in starts if i > start), default=len(columns))
+    return start, stop
+
+
+def _block_frame(df, block, years):
+    start, stop = block['cols'] or locate_block(df.columns, block, years)
+    return df.iloc[:, start:stop]
+
+
+def build_cube(df, month_col, blocks, years):
+    """Build an AggCube from a wide pivot tab; each block keeps its own product / month
+    columns, so blocks that were concatenated side by side need not be row aligned."""
+    frames = [_block_frame(df, block, years) for block in blocks]
+    products = pd.Index(pd.unique(np.concatenate([f['product_code'].astype(str).to_numpy() for f in frames])))
+    months = pd.Index(pd.unique(np.concatenate([f[month_col].dropna().to_numpy() for f in frames])))
+
+    shape = (len(products), len(months), len(years), len(blocks))
+    num = np.zeros(shape)
+    den = np.zeros(shape)
+    block_months = []
+    for k, (block, frame) in enumerate(zip(blocks, frames)):
+        p = products.get_indexer(frame['product_code'].astype(str))
+        m = months.get_indexer(frame[month_col])
+        valid = (p >= 0) & (m >= 0)
+        block_months.append(months.get_indexer(frame[month_col].dropna().unique()))
+        for y, yr in enumerate(years):
+            for target, template in ((num, block['num']), (den, block['den'])):
+                col = template.format(yr=yr)
+                if col not in frame.columns:
+                    continue
+                values = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64, na_value=0.0)
+                np.add.at(target, (p[valid], m[valid], y, k), values[valid])
+    # shared by every session of the process: read-only so no caller can modify them in place
+    num.setflags(write=False)
+    den.setflags(write=False)
+    return AggCube(month_col, products, months, list(years), blocks, num, den, block_months)
+
+
+def build_cubes(data, specs, years):
+    """{tab key: AggCube} for every (month_col, blocks) spec in `specs`"""
+    return {key: build_cube(data[key], month_col, blocks, years)
+            for key, (month_col, blocks) in specs.items() if not data[key].empty}
@@ -1,12 +1,27 @@
 import streamlit as st
-import plotly.express as px
 import pandas as pd
-import sys
+import os
 import time
 import calendar
 from datetime import datetime
-from helper_function import add_heading,create_metric_chart ,display_chart_with_lines,add_gsheet_link,get_req_filtered_df_scores,get_req_filtered_df_act_ques_pt
-from helper_function import calc_avg , calc_active_users,get_req_filtered_df,build_cards_html , read_from_gsheets,read_from_gsheets_area
+from helper_function import add_heading,add_gsheet_link
+from helper_function import build_cards_html, DASHBOARD_TABS, MCAT_SHEET_ID
+from kpi_engine import KPI_TABS, definition_index, memoized_cards
+from helper_function import years, _figure_cache
+from sheet_schemas import apply_schemas
+from data_manager import DataManager
+import snapshot_cache
+import data_sources
+import sql_pushdown
+import prewarm
+import selections
+from chart_blocks import CHART_TABS, cube_specs, render_tab, render_tab_series, select_blocks
+import memory_report
+import instrumentation
+from instrumentation import timer
+
+log = instrumentation.get_logger('app')
+_run_started = time.perf_counter()
 
 st.set_page_config(
     page_title="MCAT Dashboard", 
@@ -44,42 +59,57 @@ def compatible_rerun():
         # Silent fallback - don't break the app
         pass
 
-@st.cache_data(ttl=900)  # Cache for 15 minutes - Compatible with Streamlit 1.50+
+# Trend chart blocks per tab, from the chart registry
+TREND_CUBE_SPECS = cube_specs()
+
 def load_data():
-    """Load all data from Google Sheets with caching"""
-    return {
-        'product_code_df': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Product Code'),
-        'KPI_data_all': read_from_gsheets_area('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','KPIs_sheet','A2','AF27'),
-        'KPI_data_Pm_all': read_from_gsheets_area('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','KPIs_sheet_tll_PM','A2','AF27'),
-
-        'prod_score_gain_data': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Score_Gain_Sheet'),
-        'DScBd_metrics': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Detailed Score Breakdown_Metrics'),
-        'monthly_fl_metrics': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Monthly Full Length Engagement_metrics'),   
-        'monthwise_act_ques_pt_metrics': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Monthwise Activity_Questions_PT_metrics(Act_month)'),
-        'monthwise_act_ques_pt_metrics_exp': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Monthwise Activity_Questions_PT_metrics(Expiry_month)'),
-        'act_comp_trend': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Activity_Completion_Trends(30_60_90_days)_metrics'),
-        'ques_comp_trend': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Ques_Ans_Completion_Trends(30_60_90_days)_metrics'),
-        'kpis_metric_def': read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Kpi_Metrics_definition')
-    }
+    """Load every dashboard tab from the configured data source (MCAT_DATA_SOURCE,
+    Google Sheets by default: one batched request for every tab)"""
+    # Coerce to the declared dtypes once here, not on every rerun
+    return apply_schemas(data_sources.get_source().read_tabs(DASHBOARD_TABS))
+
+@st.cache_resource
+def get_sql_trends():
+    return sql_pushdown.SqlTrends(sql_pushdown.FactStore(), TREND_CUBE_SPECS, years)
+
+def sql_trends():
+    """SqlTrends over the fact database when MCAT_FACTS_DB is set (see sql_pushdown.py)"""
+    return get_sql_trends() if sql_pushdown.FACTS_DB else None
+
+@st.cache_resource
+def get_recent_selections():
+    return selections.RecentSelections()
+
+@st.cache_resource  # One manager per process, shared by all sessions
+def get_data_manager():
+    # Refreshed in the background every 15 minutes; viewers never wait for a reload, and
+    # every load warms the caches for the common selections (see prewarm.py)
+    prewarmer = prewarm.Prewarmer(get_recent_selections(), sql_trends())
+    return DataManager(load_data, TREND_CUBE_SPECS, years, interval=900,
+                       before_refresh=snapshot_cache.clear_revision_cache, on_load=prewarmer.schedule,
+                       kpi_tabs=KPI_TABS, check=snapshot_cache.stale_message).start()
+
+def select_trends(key, selected_products):
+    return select_blocks(data, key, selected_products, sql_trends())
+
+def select_series(key, selected_products, grain):
+    """Trend blocks of tab `key` by day or week (fact database only, see sql_pushdown.py)"""
+    trends = get_sql_trends()
+    def compute():
+        with timer('sql_trends', tab=key, grain=grain):
+            return trends.series(key, selected_products, grain)
+    return trends.memoize(data.cache, (key, grain, frozenset(selected_products)), compute)
+
+def trend_grains(key):
+    return get_sql_trends().grains(key) if sql_pushdown.FACTS_DB else ['month']
 
 # Load all data with caching and error handling
 try:
-    with st.spinner("Loading data from Google Sheets..."):
-        data = load_data()
+    with st.spinner("Loading data..."):
+        data_manager = get_data_manager()
+        data = data_manager.current()
     
     product_code_df = data['product_code_df']
-    score_gain_kpi = data['KPI_data_all'].iloc[:,0:6]
-    act_per_user_kpi = data['KPI_data_all'].iloc[:,7:13]
-    active_user_kpi = data['KPI_data_all'].iloc[:,14:18]
-    ques_ans_kpi = data['KPI_data_all'].iloc[:,19:25]
-    test_per_user_kpi = data['KPI_data_all'].iloc[:,26:32]
-
-    score_gain_kpi_pm = data['KPI_data_Pm_all'].iloc[:,0:6]
-    act_per_user_kpi_pm = data['KPI_data_Pm_all'].iloc[:,7:13]
-    active_user_kpi_pm = data['KPI_data_Pm_all'].iloc[:,14:18]
-    ques_ans_kpi_pm = data['KPI_data_Pm_all'].iloc[:,19:25]
-    test_per_user_kpi_pm = data['KPI_data_Pm_all'].iloc[:,26:32]
-
     DScBd_metrics = data['DScBd_metrics']
     monthly_fl_metrics = data['monthly_fl_metrics']
     monthwise_act_ques_pt_metrics = data['monthwise_act_ques_pt_metrics']
@@ -87,7 +117,9 @@ try:
     prod_score_gain_data = data['prod_score_gain_data']
     act_comp_trend = data['act_comp_trend']
     ques_comp_trend = data['ques_comp_trend']
-    kpis_metrics_definition = data['kpis_metric_def']
+    instrumentation.register_cache('memo', data.cache)
+    kpi_definitions = data.memoize('kpis_metric_def', 'definition_index', (),
+                                   lambda: definition_index(data['kpis_metric_def']))
     
     # Validate data loaded successfully
     if product_code_df.empty:
@@ -95,7 +127,7 @@ try:
         st.stop()
         
 except Exception as e:
-    print(e)
+    log.exception("Error loading data")
     st.error(f"🚨 Error loading data: {str(e)}")
     st.info("💡 This might be a temporary connectivity issue. Please refresh the page.")
     st.stop()
@@ -118,7 +150,7 @@ st.markdown(
     """,
     unsafe_allow_html=True
 )
-add_gsheet_link('https://docs.google.com/spreadsheets/d/1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4/','Data Source Link to all Kpis and Metrics')
+add_gsheet_link(f'https://docs.google.com/spreadsheets/d/{MCAT_SHEET_ID}/','Data Source Link to all Kpis and Metrics')
 
 # Initialize session state variables after data is loaded successfully
 if "filter_panel" not in st.session_state:
@@ -131,9 +163,40 @@ if "selected_products" not in st.session_state:
 # ------------------------------
 # Sidebar filter toggle (gear icon)
 # ------------------------------
-with st.sidebar:
-    if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+# The selection the page below is rendered with; the filter fragment compares against it
+if st.session_state.get('rendered_products') != st.session_state.selected_products:
+    get_recent_selections().record(st.session_state.selected_products)  # pre-warmed after refreshes
+st.session_state.rendered_products = list(st.session_state.selected_products)
+
+def apply_selection(products):
+    """Make `products` the page's selection (and the picker's staged value)"""
+    st.session_state.product_picker = list(products)
+    st.session_state.selected_products = list(products)
+    instrumentation.incr('filter_applies')
+
+def apply_saved_selection():
+    name = st.session_state.get('saved_selection_name')
+    saved = selections.load_saved_selections()
+    if name in saved:
+        known = set(product_code_df["product_code"].astype(str))
+        apply_selection(sorted(p for p in saved[name] if p in known))
+
+def save_current_selection():
+    name = (st.session_state.get('new_selection_name') or '').strip()
+    if name and st.session_state.selected_products:
+        selections.save_selection(name, st.session_state.selected_products)
+        st.session_state.new_selection_name = ''
+
+def delete_saved_selection():
+    name = st.session_state.get('saved_selection_name')
+    if name:
+        selections.delete_selection(name)
+        st.session_state.saved_selection_name = None
+
+@st.fragment
+def product_filter_panel():
+    """Filters toggle and product picker. Runs as a fragment, and the picker is a form:
+    picking products reruns nothing, and the page reruns once when a selection is applied."""
     if st.button("⚙️ Filters"):
         st.session_state.filter_panel = not st.session_state.filter_panel
 
@@ -142,62 +205,69 @@ with st.sidebar:
 
         all_products = sorted(product_code_df["product_code"].unique())
 
-        # Session State-Driven Approach - Single source of truth
-        
-        # Initialize debounce timers for buttons
-        if "last_select_all_click" not in st.session_state:
-            st.session_state.last_select_all_click = 0
-        if "last_clear_all_click" not in st.session_state:
-            st.session_state.last_clear_all_click = 0
-            
-        # Button actions with independent debounce (0.5 seconds each)
-        current_time = time.time()
-        select_all_disabled = (current_time - st.session_state.last_select_all_click) < 0.5
-        clear_all_disabled = (current_time - st.session_state.last_clear_all_click) < 0.5
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("Select All", key="select_all_btn", use_container_width=True, disabled=select_all_disabled):
-                if not select_all_disabled:  # Double-check to prevent race conditions
-                    # Update session state and force widget refresh by changing its key
-                    st.session_state.selected_products = all_products.copy()
-                    st.session_state.multiselect_key = f"multiselect_selectall_{int(time.time()*1000)}"
-                    st.session_state.last_select_all_click = current_time
-                    compatible_rerun()
-                
-        with col2:
-            if st.button("Clear All", key="clear_all_btn", use_container_width=True, disabled=clear_all_disabled):
-                if not clear_all_disabled:  # Double-check to prevent race conditions
-                    # Update session state and force widget refresh by changing its key
-                    st.session_state.selected_products = []
-                    st.session_state.multiselect_key = f"multiselect_clearall_{int(time.time()*1000)}"
-                    st.session_state.last_clear_all_click = current_time
-                    compatible_rerun()
-        
-        # Initialize multiselect key if not exists
-        if "multiselect_key" not in st.session_state:
-            st.session_state.multiselect_key = "multiselect_initial"
-        
-        # Callback function to handle multiselect changes with error prevention
-        def on_multiselect_change():
-            # Safely update session state - prevent KeyError from rapid button clicks
-            current_key = st.session_state.multiselect_key
-            if current_key in st.session_state:
-                st.session_state.selected_products = st.session_state[current_key]
-            else:
-                # Fallback: keep existing selection if key doesn't exist (race condition)
-                pass
-        
-        # Multiselect widget with dynamic key and callback
-        selected_products = st.multiselect(
-            "Select Product Codes",
-            options=all_products,
-            default=st.session_state.selected_products,
-            key=st.session_state.multiselect_key,
-            on_change=on_multiselect_change,
-            help="💡 Tip: Use the buttons above for Select All/Clear All operations"
-        )
+        # One stable widget key; it is dropped while the panel is closed and re-seeded
+        # from the applied selection when it opens again
+        if "product_picker" not in st.session_state:
+            st.session_state.product_picker = [p for p in st.session_state.selected_products if p in set(all_products)]
+
+        with st.form("product_filter_form", border=False):
+            st.multiselect(
+                "Select Product Codes",
+                options=all_products,
+                key="product_picker",
+                help="💡 Pick any number of products, then Apply"
+            )
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.form_submit_button("Apply", type="primary", use_container_width=True,
+                                      on_click=lambda: apply_selection(st.session_state.product_picker))
+            with col2:
+                st.form_submit_button("Select All", use_container_width=True,
+                                      on_click=apply_selection, args=(all_products,))
+            with col3:
+                st.form_submit_button("Clear All", use_container_width=True,
+                                      on_click=apply_selection, args=([],))
+
+        saved = selections.load_saved_selections()
+        if saved:
+            st.selectbox("Saved selections", sorted(saved), index=None, key="saved_selection_name",
+                         placeholder="Choose a saved selection")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.button("Load", key="load_saved_btn", use_container_width=True, on_click=apply_saved_selection)
+            with col2:
+                st.button("Delete", key="delete_saved_btn", use_container_width=True, on_click=delete_saved_selection)
+        with st.expander("Save current selection"):
+            st.text_input("Name", key="new_selection_name")
+            st.button("Save", key="save_selection_btn", on_click=save_current_selection,
+                      disabled=not st.session_state.selected_products)
+
+    if st.session_state.selected_products != st.session_state.rendered_products:
+        compatible_rerun()
+
+with st.sidebar:
+    if st.button("🔄 Refresh Data"):
+        data_manager.refresh_async()
+    if data_manager.refreshing:
+        st.caption("Refreshing data in the background…")
+    elif data_manager.loaded_at:
+        st.caption(f"Data loaded at {datetime.fromtimestamp(data_manager.loaded_at):%H:%M}")
+    if data_manager.last_error:
+        st.warning(f"⚠️ {data_manager.last_error}")
+    product_filter_panel()
+    # Daily / weekly views need the enrollment-level fact tables (MCAT_FACTS_DB)
+    if sql_pushdown.FACTS_DB:
+        st.radio("Trend granularity", sql_pushdown.GRAINS, key="trend_grain", horizontal=True,
+                 format_func=str.title)
+    with st.expander("Memory usage"):
+        if st.toggle("Show memory report", key="show_memory_report"):
+            mem_rows = memory_report.report(data, {'figures': _figure_cache})
+            mem_totals = memory_report.summary(mem_rows)
+            st.caption(f"Process RSS {memory_report.fmt_bytes(mem_totals['rss'])} · shared data "
+                       f"{memory_report.fmt_bytes(mem_totals['shared'])} · this session "
+                       f"{memory_report.fmt_bytes(memory_report.deep_size(dict(st.session_state)))}")
+            st.dataframe(pd.DataFrame(mem_rows).assign(size=lambda df: df['bytes'].map(memory_report.fmt_bytes)),
+                         hide_index=True)
 
 # Create a container for filter status that updates dynamically
 filter_status_container = st.container()
@@ -237,20 +307,10 @@ with filter_status_container:
     """, unsafe_allow_html=True)
 
 #--- KPIs calculation and display- Start
-kpi_registry = [
-    {"df": score_gain_kpi, "calc": calc_avg , "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Score Gain', 'Definition'].iloc[0]},
-    {"df": act_per_user_kpi, "calc": calc_avg, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Activity / User', 'Definition'].iloc[0]},
-    {"df": active_user_kpi, "calc": calc_active_users, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Active Users', 'Definition'].iloc[0]},
-    {"df": ques_ans_kpi, "calc": calc_avg, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Questions Answered / User', 'Definition'].iloc[0]},
-    {"df": test_per_user_kpi, "calc": calc_avg, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Tests / User', 'Definition'].iloc[0]},
-]
-kpi_registry_pm = [
-    {"df": score_gain_kpi_pm, "calc": calc_avg, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Score Gain', 'Definition'].iloc[0]},
-    {"df": act_per_user_kpi_pm, "calc": calc_avg, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Activity / User', 'Definition'].iloc[0]},
-    {"df": active_user_kpi_pm, "calc": calc_active_users, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Active Users', 'Definition'].iloc[0]},
-    {"df": ques_ans_kpi_pm, "calc": calc_avg, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Questions Answered / User', 'Definition'].iloc[0]},
-    {"df": test_per_user_kpi_pm, "calc": calc_avg, "Tooltip_text":kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Tests / User', 'Definition'].iloc[0]}
-]
+def kpi_cards(tab_key, selected_products):
+    """Every KPI card of a KPI tab for a selection: one vectorized pass, memoized per dataset version"""
+    with timer('kpi_cards', tab=tab_key):
+        return memoized_cards(data, tab_key, selected_products)
 
 # Safety check for empty selections
 if not st.session_state.selected_products:
@@ -258,176 +318,58 @@ if not st.session_state.selected_products:
     st.markdown("<div class='kpi-container'>No data to display</div>", unsafe_allow_html=True)
 else:
     st.markdown(f"""<div class="kpi-subheading">KPIs for the month of <span class="highlight-month">{prev_month}</span></div>""", unsafe_allow_html=True)
-    st.markdown(f"<div class='kpi-container'>{build_cards_html(kpi_registry , st.session_state.selected_products)}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='kpi-container'>{build_cards_html(kpi_cards('KPI_data_all', st.session_state.selected_products), kpi_definitions)}</div>", unsafe_allow_html=True)
     st.markdown(f"""<div class="kpi-subheading">KPIs for January to <span class="highlight-month">{prev_month}</span></div>""", unsafe_allow_html=True)
-    st.markdown(f"<div class='kpi-container'>{build_cards_html(kpi_registry_pm , st.session_state.selected_products)}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='kpi-container'>{build_cards_html(kpi_cards('KPI_data_Pm_all', st.session_state.selected_products), kpi_definitions)}</div>", unsafe_allow_html=True)
 
 
 
 #--- KPIs calculation and display- End
 
 
-def display_chart_with_lines(fig):
-    st.markdown('<hr class="chart-line">', unsafe_allow_html=True)
-    st.plotly_chart(fig, use_container_width=True)
-    st.markdown('<hr class="chart-line">', unsafe_allow_html=True)
-year_colors = {
-    "2023": "#F57411",  # Orange
-    "2024": "#0016A8",  # Blue
-    "2025": "#00923D",  # Green
-}
-# Score Gain by Expiry Month
-score_gain_data_filt = get_req_filtered_df(prod_score_gain_data, st.session_state.selected_products,'Score_gain','score_gain')
-score_gain_melted = score_gain_data_filt.melt(id_vars="Expiry_month",
-                    value_vars=["Score_gain_2023", "Score_gain_2024", "Score_gain_2025"],
-                    var_name="Year",
-                    value_name="Score Gain")
-score_gain_melted["Year"] = score_gain_melted["Year"].str.split("_").str[-1]
-score_gain_colors = {
-    "2023": "#F57411",  # Orange
-    "2024": "#0016A8",  # Blue
-    "2025": "#00923D",  # Green
-}
-score_gain_tooltip = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Score Gain Metrics', 'Definition'].iloc[0]
-add_heading(f"Score Gain by Expiry Month", score_gain_tooltip)
-fig = px.line(
-    score_gain_melted,
-    x="Expiry_month",
-    y="Score Gain",
-    color="Year",
-    markers=True,  # add points on lines
-    color_discrete_map=score_gain_colors,
-    line_shape="spline"
-
-)
-fig.update_layout(
-     title={
-        "text": "",
-        "x": 0.5,              # Center title
-        "xanchor": "center",
-        "yanchor": "top",
-        "font": {"size": 22}
-    },
-    xaxis_title="Expiry Month",
-    yaxis_title="Score Gain",
-    legend_title="Year",
-    template="plotly_dark",  # since your page is dark themed
-    plot_bgcolor="rgba(0,0,0,0)",  # transparent plot area
-    paper_bgcolor="rgba(0,0,0,0)",  # transparent background
-)
-
-
-st.markdown('<hr class="chart-line">', unsafe_allow_html=True)
-st.plotly_chart(fig, use_container_width=True)
-st.markdown('<hr class="chart-line">', unsafe_allow_html=True)
-
-# Detailed Score Breakdown Charts
-detailed_score_tooltip = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Detailed Score Breakdown', 'Definition'].iloc[0]
-add_heading("Detailed Score Breakdown by Expiry Month", detailed_score_tooltip)
-# Display three charts side by side
-first_score_ch_filt = get_req_filtered_df_scores(DScBd_metrics.iloc[:,0:8],st.session_state.selected_products ,'Expiry_month', 'Score_Avg' , 'score_scaled_score','First')
-max_score_ch_filt = get_req_filtered_df_scores(DScBd_metrics.iloc[:,8:16],st.session_state.selected_products ,'Expiry_month', 'Score_Avg' , 'score_scaled_score','Max')
-latest_score_ch_filt = get_req_filtered_df_scores(DScBd_metrics.iloc[:,16:24],st.session_state.selected_products ,'Expiry_month', 'Score_Avg' , 'score_scaled_score','Latest')
-
-col1, col2, col3 = st.columns(3)
-with col1:
-    display_chart_with_lines(create_metric_chart(first_score_ch_filt, 'Expiry_month',"First_Score_Avg",'Score','First Score Average'))
-
-with col2:
-    display_chart_with_lines(create_metric_chart(max_score_ch_filt, 'Expiry_month',"Max_Score_Avg",'Score','Max Score Average'))
-
-with col3:
-    display_chart_with_lines(create_metric_chart(latest_score_ch_filt, 'Expiry_month',"Latest_Score_Avg",'Score','Latest Score Average'))
-
-## Month Wise Full length 
-monthly_Fl_act_month_tooltip = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'FL Score changes (Activity Month)', 'Definition'].iloc[0]
-add_heading("Monthly Full Length Score Averages by Activity Month", monthly_Fl_act_month_tooltip)
-aamc1 = get_req_filtered_df_scores(monthly_fl_metrics.iloc[:,0:8], st.session_state.selected_products, 'Activity_month','Avg_Score', 'score_scaled_score', 'AAMC1')
-kfl1 = get_req_filtered_df_scores(monthly_fl_metrics.iloc[:,8:16], st.session_state.selected_products, 'Activity_month','Avg_Score', 'score_scaled_score', 'KFL1')
-kfl2 = get_req_filtered_df_scores(monthly_fl_metrics.iloc[:,16:24], st.session_state.selected_products, 'Activity_month','Avg_Score', 'score_scaled_score', 'KFL2')
-kfl3 = get_req_filtered_df_scores(monthly_fl_metrics.iloc[:,24:32], st.session_state.selected_products, 'Activity_month','Avg_Score', 'score_scaled_score', 'KFL3')
-col1, col2, col3 , col4 = st.columns(4)
-with col1:
-    display_chart_with_lines(create_metric_chart(aamc1, 'Activity_month',"AAMC1_Avg_Score",'Score','AAMC1 Average Score'))
-with col2:
-    display_chart_with_lines(create_metric_chart(kfl1, 'Activity_month',"KFL1_Avg_Score",'Score','KFL1 Average Score'))
-with col3:
-    display_chart_with_lines(create_metric_chart(kfl2, 'Activity_month',"KFL2_Avg_Score",'Score','KFL2 Average Score'))
-with col4:
-    display_chart_with_lines(create_metric_chart(kfl3, 'Activity_month',"KFL3_Avg_Score",'Score','KFL3 Average Score'))
-
-aamc2 = get_req_filtered_df_scores(monthly_fl_metrics.iloc[:,32:40], st.session_state.selected_products, 'Activity_month','Avg_Score', 'score_scaled_score', 'AAMC2')
-aamc3 = get_req_filtered_df_scores(monthly_fl_metrics.iloc[:,40:48], st.session_state.selected_products, 'Activity_month','Avg_Score', 'score_scaled_score', 'AAMC3')
-aamc4 = get_req_filtered_df_scores(monthly_fl_metrics.iloc[:,48:56], st.session_state.selected_products, 'Activity_month','Avg_Score', 'score_scaled_score', 'AAMC4')
-aamc5 = get_req_filtered_df_scores(monthly_fl_metrics.iloc[:,56:64], st.session_state.selected_products, 'Activity_month','Avg_Score', 'score_scaled_score', 'AAMC5')
-col1, col2, col3 , col4 = st.columns(4)
-with col1:
-    display_chart_with_lines(create_metric_chart(aamc2, 'Activity_month',"AAMC2_Avg_Score",'Score','AAMC2 Average Score'))
-with col2:
-    display_chart_with_lines(create_metric_chart(aamc3, 'Activity_month',"AAMC3_Avg_Score",'Score','AAMC3 Average Score'))
-with col3:
-    display_chart_with_lines(create_metric_chart(aamc4, 'Activity_month',"AAMC4_Avg_Score",'Score','AAMC4 Average Score'))
-with col4:
-    display_chart_with_lines(create_metric_chart(aamc5, 'Activity_month',"AAMC5_Avg_Score",'Score','AAMC5 Average Score'))
-
-## Monthwise Activity, Questions and Practice Test by Activity Month
-monthwise_eng_act_month_tooltip = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Total Engagment Metrics(Activity Month)', 'Definition'].iloc[0]
-add_heading("Monthwise Activity, Questions Answered & Practice Test Per User by Activity Month", monthwise_eng_act_month_tooltip)
-month_act = get_req_filtered_df_act_ques_pt(monthwise_act_ques_pt_metrics.iloc[:,0:8], st.session_state.selected_products, 'Activity_month', 'Avg_Activity', 'sequence_title',)
-month_ques = get_req_filtered_df_act_ques_pt(monthwise_act_ques_pt_metrics.iloc[:,8:16], st.session_state.selected_products, 'Activity_month', 'Avg Question Answered', 'total_scored_items_answered')
-month_pt = get_req_filtered_df_act_ques_pt(monthwise_act_ques_pt_metrics.iloc[:,16:24], st.session_state.selected_products, 'Activity_month', 'Avg Practice Test', 'sequence_name')
-
-col1, col2, col3  = st.columns(3)
-with col1:
-    display_chart_with_lines(create_metric_chart(month_act, 'Activity_month',"Avg_Activity",'Average Activity','Average Activity'))
-with col2:
-    display_chart_with_lines(create_metric_chart(month_ques, 'Activity_month',"Avg Question Answered",'Average Questions Answered','Average Questions Answered'))
-with col3:
-    display_chart_with_lines(create_metric_chart(month_pt, 'Activity_month',"Avg Practice Test",'Average Practice Test','Average Practice Test'))
-
-## Monthwise Activity, Questions and Practice Test by Expiry Month
-monthwise_eng_exp_month_tooltip = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Total Engagment Metrics(Expiry Month)', 'Definition'].iloc[0]
-add_heading("Monthwise Activity, Questions Answered & Practice Test Per User by Expiry Month", monthwise_eng_exp_month_tooltip)
-exp_month_act = get_req_filtered_df_act_ques_pt(monthwise_act_ques_pt_metrics_exp.iloc[:,0:8], st.session_state.selected_products, 'Expiry_month', 'Avg_Activity', 'sequence_title',)
-exp_month_ques = get_req_filtered_df_act_ques_pt(monthwise_act_ques_pt_metrics_exp.iloc[:,8:16], st.session_state.selected_products, 'Expiry_month', 'Avg Question Answered', 'total_scored_items_answered')
-exp_month_pt = get_req_filtered_df_act_ques_pt(monthwise_act_ques_pt_metrics_exp.iloc[:,16:24], st.session_state.selected_products, 'Expiry_month', 'Avg Practice Test', 'sequence_name')
-
-col1, col2, col3  = st.columns(3)
-with col1:
-    display_chart_with_lines(create_metric_chart(exp_month_act, 'Expiry_month',"Avg_Activity",'Average Activity','Average Activity'))
-with col2:
-    display_chart_with_lines(create_metric_chart(exp_month_ques, 'Expiry_month',"Avg Question Answered",'Average Questions Answered','Average Questions Answered'))
-with col3:
-    display_chart_with_lines(create_metric_chart(exp_month_pt, 'Expiry_month',"Avg Practice Test",'Average Practice Test','Average Practice Test'))
-
-
-## Activities Completed Trends 30,60,90 days
-act_comp_trend_tooltip = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Activity completion trend', 'Definition'].iloc[0]
-add_heading("Activity Completion Trend First 30,60,90 days from ESD", act_comp_trend_tooltip)
-act_30_days = get_req_filtered_df_act_ques_pt(act_comp_trend.iloc[:,0:8], st.session_state.selected_products, 'ESD_month', 'Activity_30_days', 'sequence_title')
-act_60_days = get_req_filtered_df_act_ques_pt(act_comp_trend.iloc[:,8:16], st.session_state.selected_products, 'ESD_month', 'Activity_60_days', 'sequence_title')
-act_90_days = get_req_filtered_df_act_ques_pt(act_comp_trend.iloc[:,16:24], st.session_state.selected_products, 'ESD_month', 'Activity_90_days', 'sequence_title')
-
-col1, col2, col3  = st.columns(3)
-with col1:
-    display_chart_with_lines(create_metric_chart(act_30_days, 'ESD_month',"Activity_30_days",'Activity Completed in 30 Days','Activity Completed in 30 Days'))
-with col2:
-    display_chart_with_lines(create_metric_chart(act_60_days, 'ESD_month',"Activity_60_days",'Activity Completed in 60 Days','Activity Completed in 60 Days'))
-with col3:
-    display_chart_with_lines(create_metric_chart(act_90_days, 'ESD_month',"Activity_90_days",'Activity Completed in 90 Days','Activity Completed in 90 Days'))
-
-## Questions Completed Trends 30,60,90 days
-ques_comp_trend_tooltip = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Question completion trend', 'Definition'].iloc[0]
-add_heading("Questions Completion Trend First 30,60,90 days from ESD", ques_comp_trend_tooltip)
-ques_30_days = get_req_filtered_df_act_ques_pt(ques_comp_trend.iloc[:,0:8], st.session_state.selected_products, 'ESD_month', 'Ques_Ans_30_days', 'total_scored_items_answered')
-ques_60_days = get_req_filtered_df_act_ques_pt(ques_comp_trend.iloc[:,8:16], st.session_state.selected_products, 'ESD_month', 'Ques_Ans_60_days', 'total_scored_items_answered')
-ques_90_days = get_req_filtered_df_act_ques_pt(ques_comp_trend.iloc[:,16:24], st.session_state.selected_products, 'ESD_month', 'Ques_Ans_90_days', 'total_scored_items_answered')
-
-col1, col2, col3  = st.columns(3)
-with col1:
-    display_chart_with_lines(create_metric_chart(ques_30_days, 'ESD_month',"Ques_Ans_30_days",'Questions Answered in 30 Days','Questions Answered in 30 Days'))
-with col2:
-    display_chart_with_lines(create_metric_chart(ques_60_days, 'ESD_month',"Ques_Ans_60_days",'Questions Answered in 60 Days','Questions Answered in 60 Days'))
-with col3:
-    display_chart_with_lines(create_metric_chart(ques_90_days, 'ESD_month',"Ques_Ans_90_days",'Questions Answered in 90 Days','Questions Answered in 90 Days'))
-
+def definition(metric):
+    return kpi_definitions.get(metric, '')
+
+@st.fragment
+def chart_section(section_key, heading, tooltip_text, render, show_by_default=False):
+    """One dashboard section as its own fragment: its toggle reruns only this section,
+    and the section's figures are only built while it is shown."""
+    add_heading(heading, tooltip_text)
+    if st.toggle("Show charts", value=show_by_default, key=f"show_{section_key}"):
+        with timer('section', section=section_key):
+            render(st.session_state.selected_products)
+
+def render_chart_tab(tab):
+    def render(selected_products):
+        grain = st.session_state.get('trend_grain', 'month')
+        if grain != 'month' and grain in trend_grains(tab['key']):
+            return render_tab_series(tab, select_series(tab['key'], selected_products, grain))
+        if grain != 'month':
+            st.caption("The fact tables have no row-level dates for this section; showing months.")
+        render_tab(tab, select_trends(tab['key'], selected_products))
+    return render
+
+# Sections above the fold are shown straight away; the rest render when opened
+for tab in CHART_TABS:
+    chart_section(tab['section'], tab['heading'], definition(tab['definition']),
+                  render_chart_tab(tab),
+                  show_by_default=tab['show_by_default'])
+
+instrumentation.observe('script_run', time.perf_counter() - _run_started)
+instrumentation.write_metrics()
+
+# Admin / debug panel: MCAT_DEBUG=1 or ?debug=1 in the URL
+if os.environ.get('MCAT_DEBUG') == '1' or st.query_params.get('debug') == '1':
+    with st.sidebar.expander("Performance"):
+        metrics = instrumentation.snapshot()
+        for rows in (metrics['timings'], metrics['counters']):
+            for row in rows:
+                row['labels'] = ', '.join(f'{k}={v}' for k, v in row['labels'].items())
+        if metrics['timings']:
+            st.dataframe(pd.DataFrame(metrics['timings']).drop(columns='total_s').round(1), hide_index=True)
+        if metrics['counters']:
+            st.dataframe(pd.DataFrame(metrics['counters']), hide_index=True)
+        if metrics['caches']:
+            st.dataframe(pd.DataFrame(metrics['caches']).round(3), hide_index=True)
+        st.download_button("Download metrics (Prometheus)", instrumentation.prometheus_text(),
+                           file_name="mcat_metrics.prom", mime="text/plain")
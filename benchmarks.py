@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import helper_function
+import snapshot_cache
+from agg_cube import build_cube, score_block
+from kpi_engine import KpiEngine, definition_index
+from sheet_schemas import apply_schemas
+from sheets_client import SheetsClient
+from synthetic_data import FakeGSheetsClient, synthetic_tabs
+
+# Benchmarks for the dashboard hot paths on synthetic tabs (see synthetic_data.py), no
+# Google Sheets needed. Each scenario (product count x years of history) times the load
+# path, the per-chart helpers, the KPI cards, chart building, and full script runs
+# through Streamlit's AppTest. Results are written as JSON so runs can be compared
+# across commits:
+#
+#   python benchmarks.py                                  # 25 and 2000 products, 3 and 10 years
+#   python benchmarks.py --products 25 --only app
+#   python benchmarks.py --compare benchmark_results/<commit>.json
+
+RESULTS_DIR = 'benchmark_results'
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def measure(fn, repeat=5, warmup=1):
+    """Wall time of fn() in seconds: min / median / mean over `repeat` runs"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {'runs': repeat, 'min': min(times), 'median': statistics.median(times), 'mean': statistics.fmean(times)}
+
+
+def use_fake_client(tabs):
+    """Point helper_function at a FakeGSheetsClient (unthrottled) and a fresh snapshot dir"""
+    fake = FakeGSheetsClient(tabs)
+    helper_function._gc = fake
+    helper_function.sheets = SheetsClient(lambda: fake, rate=1e9, burst=1e9)
+    snapshot_cache.SNAPSHOT_DIR = tempfile.mkdtemp(prefix='mcat-bench-')
+    snapshot_cache.clear_revision_cache()
+    return fake
+
+
+def _fetch(fake):
+    # New revision each call, so every tab is downloaded again instead of read from the snapshot
+    fake.drive.revision = f'bench-{time.perf_counter_ns()}'
+    snapshot_cache.clear_revision_cache()
+    return helper_function.load_dashboard_data()
+
+
+def kernel_cases(n_products, years, seed=0):
+    """{case name: callable} for the helpers behind one page render"""
+    fake = use_fake_client(synthetic_tabs(n_products, years, seed=seed))
+    raw = helper_function.load_dashboard_data()
+    data = apply_schemas(raw)
+    products = data['product_code_df']['product_code'].astype(str).tolist()
+    selection = sorted(np.random.default_rng(seed).choice(products, size=max(1, len(products) // 2), replace=False))
+    width = 2 + 2 * len(years)  # product_code, month, enrollments + measure per year
+    detailed = data['DScBd_metrics']
+    monthwise = data['monthwise_act_ques_pt_metrics']
+    cube_blocks = [score_block(p, (width * i, width * i + width), 'Score_Avg', 'score_scaled_score')
+                   for i, p in enumerate(['First', 'Max', 'Latest'])]
+    cube = build_cube(detailed, 'Expiry_month', cube_blocks, years)
+    engine = KpiEngine(data['KPI_data_all'])
+    cards = engine.compute(selection)
+    definitions = definition_index(data['kpis_metric_def'])
+    chart_df = cube.select(selection)['First']
+    value_cols = [f'First_Score_Avg_{yr}' for yr in helper_function.years]
+
+    return {
+        'load_dashboard_data:fetch': lambda: _fetch(fake),
+        'load_dashboard_data:snapshot': helper_function.load_dashboard_data,
+        'apply_schemas': lambda: apply_schemas(raw),
+        'get_req_filtered_df': lambda: helper_function.get_req_filtered_df(
+            data['prod_score_gain_data'], selection, 'Score_gain', 'score_gain'),
+        'get_req_filtered_df_scores': lambda: helper_function.get_req_filtered_df_scores(
+            detailed.iloc[:, :width], selection, 'Expiry_month', 'Score_Avg', 'score_scaled_score', 'First'),
+        'get_req_filtered_df_act_ques_pt': lambda: helper_function.get_req_filtered_df_act_ques_pt(
+            monthwise.iloc[:, :width], selection, 'Activity_month', 'Avg_Activity', 'sequence_title'),
+        'agg_cube:build': lambda: build_cube(detailed, 'Expiry_month', cube_blocks, years),
+        'agg_cube:select': lambda: cube.select(selection),
+        # KpiEngine replaced calc_avg: build once per dataset version, compute per selection
+        'kpi_engine:build': lambda: KpiEngine(data['KPI_data_all']),
+        'kpi_engine:compute': lambda: engine.compute(selection),
+        'build_cards_html': lambda: helper_function.build_cards_html(cards, definitions),
+        'create_metric_chart:build': lambda: helper_function._build_metric_chart(
+            chart_df, 'Expiry_month', value_cols, 'Score', 'First Score Average'),
+        'create_metric_chart:cached': lambda: helper_function.create_metric_chart(
+            chart_df, 'Expiry_month', 'First_Score_Avg', 'Score', 'First Score Average'),
+    }
+
+
+def _fresh_app():
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    st.cache_resource.clear()
+    helper_function._figure_cache.clear()
+    snapshot_cache.clear_revision_cache()
+    return AppTest.from_file(APP_PATH, default_timeout=600)
+
+
+def _run(at):
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].message}")
+    return at
+
+
+def app_cases(n_products, seed=0):
+    """Full script runs through AppTest against a fake client (the app's own years)"""
+    use_fake_client(synthetic_tabs(n_products, helper_function.years, seed=seed))
+    warm = _run(_fresh_app())
+    products = helper_function.load_dashboard_data()['product_code_df']['product_code'].tolist()
+    subsets = [products[:max(1, len(products) // k)] for k in (2, 3, 4)]
+    state = {'i': 0}
+
+    def all_sections():
+        at = _run(_fresh_app())
+        for toggle in at.toggle:
+            toggle.set_value(True)
+        return _run(at)
+
+    def filter_change():
+        state['i'] += 1
+        warm.session_state['selected_products'] = subsets[state['i'] % len(subsets)]
+        return _run(warm)
+
+    return {
+        'app:cold_run': lambda: _run(_fresh_app()),
+        'app:rerun': lambda: _run(warm),
+        'app:all_sections': all_sections,
+        'app:filter_change': filter_change,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(APP_PATH)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(products=(25, 2000), n_years=(3, 10), repeat=3, only=None, app=True, seed=0):
+    """[{'scenario', 'case', 'runs', 'min', 'median', 'mean'}] for every scenario and case"""
+    pattern = re.compile(only) if only else None
+    results = []
+
+    def record(scenario, cases):
+        for name, fn in cases.items():
+            if pattern and not pattern.search(name):
+                continue
+            stats = measure(fn, repeat=repeat)
+            results.append(dict(scenario=scenario, case=name, **stats))
+            print(f"{scenario:<24} {name:<36} median {stats['median'] * 1000:9.2f} ms")
+
+    for n in products:
+        for k in n_years:
+            years = list(range(2026 - k, 2026))
+            record(f'{n}_products_{k}_years', kernel_cases(n, years, seed))
+        if app and (not pattern or pattern.search('app:')):
+            record(f'{n}_products_app', app_cases(n, seed))
+    return results
+
+
+def compare(results, baseline):
+    """Median ratio (current / baseline) for every case present in both runs"""
+    base = {(r['scenario'], r['case']): r['median'] for r in baseline['results']}
+    rows = []
+    for r in results:
+        old = base.get((r['scenario'], r['case']))
+        if old:
+            rows.append((r['scenario'], r['case'], old, r['median'], r['median'] / old))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard hot paths on synthetic data")
+    parser.add_argument('--products', type=int, nargs='+', default=[25, 2000])
+    parser.add_argument('--years', type=int, nargs='+', default=[3, 10], help="years of history per scenario")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help="regex: only run cases whose name matches")
+    parser.add_argument('--no-app', action='store_true', help="skip the AppTest script runs")
+    parser.add_argument('--out', help=f"results file (default: {RESULTS_DIR}/<commit>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare medians against")
+    args = parser.parse_args(argv)
+
+    results = run(args.products, args.years, args.repeat, args.only, app=not args.no_app)
+    commit = git_commit()
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit or 'worktree'}.json")
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'commit': commit, 'created_at': time.time(), 'python': platform.python_version(),
+                   'pandas': pd.__version__, 'numpy': np.__version__, 'repeat': args.repeat,
+                   'results': results}, f, indent=2)
+    print(f"Wrote {out}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nvs {baseline.get('commit')}: median ratio (>1 is slower)")
+        for scenario, case, old, new, ratio in compare(results, baseline):
+            print(f"{scenario:<24} {case:<36} {old * 1000:9.2f} -> {new * 1000:9.2f} ms  x{ratio:.2f}")
+
+
+if __name__ == '__main__':
+    main()
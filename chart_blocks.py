@@ -0,0 +1,161 @@
+import plotly.express as px
+import streamlit as st
+
+from agg_cube import trend_block, score_block, act_ques_pt_block
+from helper_function import (cached_figure, create_metric_chart, create_time_chart, dark_layout,
+                             display_chart_with_lines, year_colors, years)
+from instrumentation import timer
+
+# Every trend chart on the page, declared once per tab: the tab's month column, and per
+# chart its cube block (numerator / denominator / output columns) plus title and y label.
+# The same registry feeds the aggregation (cube_specs -> AggCube / SqlTrends, one product
+# mask per tab for all its blocks) and the rendering (render_tab), so a new exam or
+# metric is one more chart() entry. Blocks are found in the tab by column name
+# (agg_cube.locate_block), not by position.
+
+
+def chart(block, title, y_label=None):
+    """One chart of a tab: its cube block, the chart title and the y axis label (default: title)"""
+    return {'block': block, 'metric': block['out'].replace('_{yr}', ''), 'title': title,
+            'y_label': y_label or title}
+
+
+def chart_tab(key, month_col, section, heading, definition, charts, per_row=3, show_by_default=False,
+              figures=None):
+    """One dashboard section drawn from tab `key`.
+
+    definition: KPI_Metrics name of the section tooltip
+    per_row: charts side by side (the last row keeps the same column widths)
+    figures: custom monthly figures, figures(tab, blocks) -> [figure per chart]
+    """
+    return {'key': key, 'month_col': month_col, 'section': section, 'heading': heading,
+            'definition': definition, 'charts': charts, 'per_row': per_row, 'show_by_default': show_by_default,
+            'figures': figures}
+
+
+def score_gain_figures(tab, blocks):
+    # Score gain keeps its own look: no title, axis titles
+    score_gain_data_filt = blocks['Score_gain']
+    score_gain_melted = score_gain_data_filt.melt(id_vars="Expiry_month",
+                        value_vars=[f"Score_gain_{yr}" for yr in years],
+                        var_name="Year",
+                        value_name="Score Gain")
+    score_gain_melted["Year"] = score_gain_melted["Year"].str.split("_").str[-1]
+    def build():
+        fig = px.line(
+            score_gain_melted,
+            x="Expiry_month",
+            y="Score Gain",
+            color="Year",
+            markers=True,  # add points on lines
+            color_discrete_map=year_colors,
+            line_shape="spline"
+
+        )
+        fig.update_layout(
+             title={
+                "text": "",
+                "x": 0.5,              # Center title
+                "xanchor": "center",
+                "yanchor": "top",
+                "font": {"size": 22}
+            },
+            xaxis_title="Expiry Month",
+            yaxis_title="Score Gain",
+            legend_title="Year",
+            **dark_layout(),
+        )
+        return fig
+    return [cached_figure(score_gain_melted, ('score_gain_chart',), build)]
+
+
+FL_EXAM_LABELS = ['AAMC1', 'KFL1', 'KFL2', 'KFL3', 'AAMC2', 'AAMC3', 'AAMC4', 'AAMC5']
+
+
+def _monthwise_charts():
+    return [
+        chart(act_ques_pt_block('Avg_Activity', None, 'sequence_title'), 'Average Activity'),
+        chart(act_ques_pt_block('Avg Question Answered', None, 'total_scored_items_answered'),
+              'Average Questions Answered'),
+        chart(act_ques_pt_block('Avg Practice Test', None, 'sequence_name'), 'Average Practice Test'),
+    ]
+
+
+# Dashboard sections in page order
+CHART_TABS = [
+    chart_tab('prod_score_gain_data', 'Expiry_month', 'score_gain', "Score Gain by Expiry Month",
+              'Score Gain Metrics', [
+                  chart(trend_block('Score_gain', None, 'kbs_enrollment_id_{yr}', 'score_gain_{yr}',
+                                    'Score_gain_{yr}', blank_zeros=False), 'Score Gain'),
+              ], per_row=1, show_by_default=True, figures=score_gain_figures),
+    chart_tab('DScBd_metrics', 'Expiry_month', 'detailed_score', "Detailed Score Breakdown by Expiry Month",
+              'Detailed Score Breakdown', [
+                  chart(score_block(pick, None, 'Score_Avg', 'score_scaled_score'), f'{pick} Score Average', 'Score')
+                  for pick in ('First', 'Max', 'Latest')
+              ], show_by_default=True),
+    chart_tab('monthly_fl_metrics', 'Activity_month', 'monthly_fl',
+              "Monthly Full Length Score Averages by Activity Month", 'FL Score changes (Activity Month)', [
+                  chart(score_block(exam, None, 'Avg_Score', 'score_scaled_score'), f'{exam} Average Score', 'Score')
+                  for exam in FL_EXAM_LABELS
+              ], per_row=4),
+    chart_tab('monthwise_act_ques_pt_metrics', 'Activity_month', 'monthwise_act',
+              "Monthwise Activity, Questions Answered & Practice Test Per User by Activity Month",
+              'Total Engagment Metrics(Activity Month)', _monthwise_charts()),
+    chart_tab('monthwise_act_ques_pt_metrics_exp', 'Expiry_month', 'monthwise_exp',
+              "Monthwise Activity, Questions Answered & Practice Test Per User by Expiry Month",
+              'Total Engagment Metrics(Expiry Month)', _monthwise_charts()),
+    chart_tab('act_comp_trend', 'ESD_month', 'act_comp_trend', "Activity Completion Trend First 30,60,90 days from ESD",
+              'Activity completion trend', [
+                  chart(act_ques_pt_block(f'Activity_{days}_days', None, 'sequence_title'),
+                        f'Activity Completed in {days} Days')
+                  for days in (30, 60, 90)
+              ]),
+    chart_tab('ques_comp_trend', 'ESD_month', 'ques_comp_trend',
+              "Questions Completion Trend First 30,60,90 days from ESD", 'Question completion trend', [
+                  chart(act_ques_pt_block(f'Ques_Ans_{days}_days', None, 'total_scored_items_answered'),
+                        f'Questions Answered in {days} Days')
+                  for days in (30, 60, 90)
+              ]),
+]
+
+
+def cube_specs(tabs=CHART_TABS):
+    """{tab key: (month column, [cube blocks])}, the specs build_cubes / SqlTrends take"""
+    return {tab['key']: (tab['month_col'], [c['block'] for c in tab['charts']]) for tab in tabs}
+
+
+def select_blocks(registry, key, selected_products, trends=None):
+    """Trend blocks of tab `key` for a selection: from the fact database when `trends`
+    (sql_pushdown.SqlTrends) is given, otherwise from the tab's cube; memoized either way"""
+    if trends is None:
+        return registry.select(key, selected_products)
+    def compute():
+        with timer('sql_trends', tab=key):
+            return trends.select(key, selected_products)
+    return trends.memoize(registry.cache, (key, frozenset(selected_products)), compute)
+
+
+def tab_figures(tab, blocks):
+    """The monthly figure of every chart of a tab (cached, see helper_function.cached_figure)"""
+    if tab['figures']:
+        return tab['figures'](tab, blocks)
+    return [create_metric_chart(blocks[c['block']['key']], tab['month_col'], c['metric'], c['y_label'], c['title'])
+            for c in tab['charts']]
+
+
+def _draw(tab, figures):
+    per_row = tab['per_row']
+    for start in range(0, len(figures), per_row):
+        for col, fig in zip(st.columns(per_row), figures[start:start + per_row]):
+            with col:
+                display_chart_with_lines(fig)
+
+
+def render_tab(tab, blocks):
+    """Draw every chart of a tab from its selected blocks ({block key: DataFrame})"""
+    _draw(tab, tab_figures(tab, blocks))
+
+
+def render_tab_series(tab, series):
+    """Same charts by day or week, from SqlTrends.series blocks"""
+    _draw(tab, [create_time_chart(series[c['block']['key']], c['y_label'], c['title']) for c in tab['charts']])
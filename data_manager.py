@@ -0,0 +1,113 @@
+import threading
+import time
+
+from dataset_registry import DatasetRegistry
+from instrumentation import get_logger, incr, timer
+
+log = get_logger('data_manager')
+
+# Process-wide owner of the dashboard data (stale-while-revalidate). Every session is
+# served the current DatasetRegistry straight away; reloads from the source happen on a
+# background thread, on a schedule or on demand, and the new registry is swapped in with
+# a single assignment once it is fully built. Only the first request after a cold start
+# waits for data.
+
+
+class DataManager:
+    def __init__(self, load, cube_specs=None, years=None, interval=900, before_refresh=None, on_load=None,
+                 kpi_tabs=(), check=None):
+        """load: () -> {key: DataFrame}, already schema-coerced
+        kpi_tabs: KPI tabs whose KpiEngine is built with each registry
+        check: optional () -> warning message or None, asked after every load; a message
+        is kept in last_error although the load succeeded (e.g. stale snapshots were served)
+        interval: seconds between scheduled background refreshes (None = on demand only)
+        before_refresh: optional hook run before every background reload (e.g. to drop
+        memoized revision checks so the source is asked again)
+        on_load: optional hook called with every newly built registry (e.g. to pre-warm
+        its caches); its errors never fail the load
+        """
+        self.load = load
+        self.cube_specs = cube_specs
+        self.years = years
+        self.interval = interval
+        self.before_refresh = before_refresh
+        self.on_load = on_load
+        self.check = check
+        self.kpi_tabs = kpi_tabs
+        self.loaded_at = None
+        self.last_error = None
+        self.changed = set()    # dataset keys that changed in the last refresh
+        self._current = None
+        self._lock = threading.Lock()           # guards the initial load
+        self._refresh_lock = threading.Lock()   # one refresh at a time
+        self._refreshing = threading.Event()
+        self._scheduler = None
+
+    def _build(self):
+        previous = self._current
+        with timer('data_load'):
+            data = self.load()
+        with timer('registry_build'):
+            registry = DatasetRegistry(data, self.cube_specs, self.years, previous=previous, kpi_tabs=self.kpi_tabs)
+        self.changed = previous.changed(registry.versions) if previous is not None else set(registry.versions)
+        self._current = registry  # atomic swap: readers see the old or the new registry
+        self.loaded_at = time.time()
+        self.last_error = self.check() if self.check else None
+        if self.last_error:
+            log.warning("Data loaded with a warning: %s", self.last_error)
+        if self.on_load:
+            try:
+                self.on_load(registry)
+            except Exception as e:
+                log.warning("on_load hook failed: %s", e)
+        return registry
+
+    def current(self):
+        """The live registry; blocks only when nothing has been loaded yet"""
+        registry = self._current
+        if registry is None:
+            with self._lock:
+                if self._current is None:
+                    with self._refresh_lock:
+                        self._build()
+            registry = self._current
+        return registry
+
+    @property
+    def refreshing(self):
+        return self._refreshing.is_set()
+
+    def refresh(self):
+        """Reload now on the calling thread; on failure keep serving the old registry"""
+        with self._refresh_lock:
+            self._refreshing.set()
+            try:
+                if self.before_refresh:
+                    self.before_refresh()
+                self._build()
+            except Exception as e:
+                self.last_error = e
+                incr('data_refresh_errors')
+                log.warning("Background data refresh failed, keeping the current data: %s", e)
+            finally:
+                self._refreshing.clear()
+
+    def refresh_async(self):
+        """Start a background refresh unless one is already running. Returns True if started."""
+        if self.refreshing or self._refresh_lock.locked():
+            return False
+        threading.Thread(target=self.refresh, name='data-refresh', daemon=True).start()
+        return True
+
+    def start(self):
+        """Start the scheduled refresh thread (once); returns self"""
+        if self.interval and self._scheduler is None:
+            self._scheduler = threading.Thread(target=self._run_schedule, name='data-refresh-schedule', daemon=True)
+            self._scheduler.start()
+        return self
+
+    def _run_schedule(self):
+        while True:
+            time.sleep(self.interval)
+            if self._current is not None:
+                self.refresh()
@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+# Where the dashboard tabs are read from. Every backend returns the same
+# {result key: DataFrame} that helper_function.read_tabs_from_gsheets does for a
+# DASHBOARD_TABS-style spec, so load_data (and apply_schemas after it) does not care
+# which one is configured:
+#   sheets[:<spreadsheet id>]   Google Sheets (default; id defaults to MCAT_SHEET_ID)
+#   parquet:<directory>         one Parquet file per tab
+#   sqlite:<file>               one table per tab in an SQLite database
+#   duckdb:<file>               same, in DuckDB (needs the optional duckdb package)
+# chosen with MCAT_DATA_SOURCE. The local backends are filled with `export`, from the
+# live sheet or from synthetic data, so the dashboard can run offline:
+#
+#   python data_sources.py export parquet:data/tabs                  # copy the live tabs
+#   python data_sources.py export sqlite:data/tabs.db --synthetic 2000
+#   MCAT_DATA_SOURCE=parquet:data/tabs streamlit run app.py
+#
+# The wide tabs repeat column names (product_code / month once per block, blank
+# separator columns), which neither Parquet nor SQL tables allow, so the local backends
+# store unique names and keep the sheet's header alongside.
+
+DATA_SOURCE = os.environ.get('MCAT_DATA_SOURCE', 'sheets')
+HEADER_KEY = b'mcat.columns'
+COLUMNS_TABLE = '_mcat_columns'
+
+
+def storage_columns(columns):
+    """Unique, readable column names for a tab header (blank -> col<i>, repeats -> name__<i>)"""
+    seen = set()
+    names = []
+    for i, name in enumerate(map(str, columns)):
+        unique = name if name and name not in seen else f'{name or "col"}__{i}'
+        seen.add(unique)
+        names.append(unique)
+    return names
+
+
+def _storable(df):
+    # Plain column types every backend round-trips (categories as their string values)
+    out = df.copy()
+    out.columns = storage_columns(df.columns)
+    for col in out.columns:
+        if isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(object).where(out[col].notna(), None)
+    return out
+
+
+class SheetsSource:
+    def __init__(self, sheet_id=None):
+        from helper_function import MCAT_SHEET_ID
+        self.sheet_id = sheet_id or MCAT_SHEET_ID
+
+    def read_tabs(self, tabs):
+        from helper_function import read_tabs_from_gsheets
+        return read_tabs_from_gsheets(self.sheet_id, tabs)
+
+    def __repr__(self):
+        return f'sheets:{self.sheet_id}'
+
+
+class ParquetSource:
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, f'{key}.parquet')
+
+    def read_tabs(self, tabs):
+        import pyarrow.parquet as pq
+        result = {}
+        for key in tabs:
+            table = pq.read_table(self._path(key))
+            df = table.to_pandas()
+            header = (table.schema.metadata or {}).get(HEADER_KEY)
+            if header:
+                df.columns = json.loads(header)
+            result[key] = df
+        return result
+
+    def write_tabs(self, data):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        os.makedirs(self.root, exist_ok=True)
+        for key, df in data.items():
+            table = pa.Table.from_pandas(_storable(df), preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[HEADER_KEY] = json.dumps([str(c) for c in df.columns]).encode('utf-8')
+            tmp = self._path(key) + '.tmp'
+            pq.write_table(table.replace_schema_metadata(metadata), tmp)
+            os.replace(tmp, self._path(key))
+
+    def __repr__(self):
+        return f'parquet:{self.root}'
+
+
+class SQLiteSource:
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        return sqlite3.connect(self.path)
+
+    def _query(self, con, sql, params=()):
+        return pd.read_sql_query(sql, con, params=params)
+
+    def _replace_table(self, con, name, df):
+        df.to_sql(name, con, if_exists='replace', index=False)
+
+    def read_tabs(self, tabs):
+        con = self.connect()
+        try:
+            result = {}
+            for key in tabs:
+                df = self._query(con, f'SELECT * FROM "{key}"')
+                header = self._query(con, f'SELECT name FROM {COLUMNS_TABLE} WHERE tab = ? ORDER BY position', (key,))
+                if len(header) == len(df.columns):
+                    df.columns = header['name'].tolist()
+                result[key] = df
+            return result
+        finally:
+            con.close()
+
+    def write_tabs(self, data):
+        con = self.connect()
+        try:
+            header = pd.DataFrame([(key, i, str(name)) for key, df in data.items() for i, name in enumerate(df.columns)],
+                                  columns=['tab', 'position', 'name'])
+            for key, df in data.items():
+                self._replace_table(con, key, _storable(df))
+            self._replace_table(con, COLUMNS_TABLE, header)
+            con.commit()
+        finally:
+            con.close()
+
+    def __repr__(self):
+        return f'sqlite:{self.path}'
+
+
+class DuckDBSource(SQLiteSource):
+    def connect(self):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("The duckdb data source needs the duckdb package (pip install duckdb)") from e
+        return duckdb.connect(self.path)
+
+    def _query(self, con, sql, params=()):
+        return con.execute(sql, list(params)).df()
+
+    def _replace_table(self, con, name, df):
+        con.register('_mcat_frame', df)
+        try:
+            con.execute(f'CREATE OR REPLACE TABLE "{name}" AS SELECT * FROM _mcat_frame')
+        finally:
+            con.unregister('_mcat_frame')
+
+    def __repr__(self):
+        return f'duckdb:{self.path}'
+
+
+BACKENDS = {
+    'sheets': SheetsSource,
+    'parquet': ParquetSource,
+    'sqlite': SQLiteSource,
+    'duckdb': DuckDBSource,
+}
+
+
+def get_source(spec=None):
+    """Backend for a '<kind>[:<location>]' spec (default: MCAT_DATA_SOURCE)"""
+    kind, _, location = (spec or DATA_SOURCE).partition(':')
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown data source {kind!r}; expected one of {', '.join(BACKENDS)}")
+    if kind != 'sheets' and not location:
+        raise ValueError(f"The {kind} data source needs a location, e.g. {kind}:path")
+    return BACKENDS[kind](location or None)
+
+
+def synthetic_data(n_products, years=None):
+    """Synthetic tabs (see synthetic_data.py) as read_tabs would return them"""
+    from helper_function import DASHBOARD_TABS, _a1_range, _values_to_df
+    from synthetic_data import synthetic_tabs
+    tabs = synthetic_tabs(n_products, years or (2023, 2024, 2025))
+    return {key: _values_to_df(tabs[_a1_range(*spec)], numerize=not (spec[1] and spec[2]))
+            for key, spec in DASHBOARD_TABS.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy the dashboard tabs into a local data source")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="write every dashboard tab to a parquet / sqlite / duckdb source")
+    export.add_argument('target', help="e.g. parquet:data/tabs, sqlite:data/tabs.db")
+    export.add_argument('--source', help="where to read from (default: MCAT_DATA_SOURCE)")
+    export.add_argument('--synthetic', type=int, metavar='N_PRODUCTS', help="write synthetic tabs instead")
+    args = parser.parse_args(argv)
+
+    from helper_function import DASHBOARD_TABS
+    from sheet_schemas import apply_schemas
+    target = get_source(args.target)
+    if not hasattr(target, 'write_tabs'):
+        parser.error(f"{target!r} is read-only")
+    if args.synthetic:
+        data = synthetic_data(args.synthetic)
+    else:
+        data = get_source(args.source).read_tabs(DASHBOARD_TABS)
+    # stored typed (numeric / categorical columns), so readers skip the string parsing
+    target.write_tabs(apply_schemas(data))
+    print(f"Wrote {len(data)} tabs to {target!r}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+from agg_cube import build_cubes
+from kpi_engine import KpiEngine
+
+# Process-wide home for the loaded tabs. Each tab gets a content fingerprint once at
+# load; aggregates are memoized in a bounded LRU keyed by
+# (dataset version, block, frozenset(products)), so a cache lookup never hashes a
+# DataFrame and memory stays capped however many distinct selections come in. The trend
+# cubes and KPI engines are built with the registry and live outside the LRU, so heavy
+# selection traffic can only evict per-selection results, never the precomputed matrices.
+# A refreshed registry takes over the previous one's cache and drops only the entries
+# of datasets whose version changed. A key being computed is computed once: the
+# pre-warmer and the first viewers after a load wait for each other's results.
+
+_MISSING = object()
+
+
+class BoundedLRU:
+    """Thread-safe LRU dict with a fixed number of entries"""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # lookups served by another caller's in-flight compute (counted as hits)
+        self._data = OrderedDict()
+        self._flights = {}  # key -> Future of the compute in progress
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """The cached value of key, or compute() it and cache it. Callers asking for a key
+        whose compute is already running wait for that result instead of repeating it."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            flight = self._flights.get(key)
+            if flight is None:
+                self.misses += 1
+                flight = self._flights[key] = Future()
+                mine = True
+            else:
+                self.hits += 1
+                self.coalesced += 1
+                mine = False
+        if not mine:
+            return flight.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.set_exception(e)
+            raise
+        self.put(key, value)
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.set_result(value)
+        return value
+
+    def discard(self, predicate):
+        """Drop every entry whose key matches predicate(key)"""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of the (key, value) pairs, least recently used first"""
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self):
+        return len(self._data)
+
+
+def fingerprint(df):
+    """Content hash of a DataFrame (values, column names and dtypes)"""
+    h = hashlib.blake2b(digest_size=8)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode('utf-8'))
+    if not df.empty:
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class DatasetRegistry:
+    def __init__(self, data, cube_specs=None, years=None, cache=None, previous=None, kpi_tabs=()):
+        """kpi_tabs: KPI tabs to build a KpiEngine for
+        previous: the registry this one replaces. Its cache is shared and the cubes and KPI
+        engines of unchanged datasets are reused, so only changed datasets are rebuilt."""
+        self.datasets = data
+        self.versions = {key: fingerprint(df) for key, df in data.items()}
+        changed = previous.changed(self.versions) if previous is not None else set(self.versions)
+        self.cubes = {} if previous is None else {k: c for k, c in previous.cubes.items() if k not in changed}
+        if cube_specs:
+            self.cubes.update(build_cubes(data, {k: s for k, s in cube_specs.items() if k in changed}, years))
+        self.engines = {} if previous is None else {k: e for k, e in previous.engines.items() if k not in changed}
+        self.engines.update({k: KpiEngine(data[k]) for k in kpi_tabs if k in changed and k in data})
+        if previous is not None:
+            cache = previous.cache
+            stale = set(previous.versions.values()) - set(self.versions.values())
+            cache.discard(lambda key: key[0] in stale)
+        self.cache = cache if cache is not None else BoundedLRU()
+
+    def changed(self, versions):
+        """Keys of a {key: version} map whose dataset differs from this registry's"""
+        return {key for key, v in versions.items() if self.versions.get(key) != v}
+
+    def __getitem__(self, key):
+        return self.datasets[key]
+
+    def version(self, key):
+        return self.versions[key]
+
+    def memoize(self, key, block, products, compute):
+        """compute() once per (version of dataset `key`, block, product selection)"""
+        cache_key = (self.versions[key], block, frozenset(products))
+        return self.cache.get_or_compute(cache_key, compute)
+
+    def memoized(self, key, block, func):
+        """Wrap a func(df, selected_products) helper so its result is memoized"""
+        return lambda df, products: self.memoize(key, block, products, lambda: func(df, products))
+
+    def select(self, key, products):
+        """Every trend block of tab `key` for a product selection (see AggCube.select)"""
+        return self.memoize(key, 'trend_cube', products, lambda: self.cubes[key].select(products))
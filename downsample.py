@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+# Server-side point reduction for the daily / weekly trend charts. Years of daily points
+# per chart would make the browser parse and draw tens of thousands of SVG nodes; each
+# series is cut down to a fixed budget before it is sent, and figures still above
+# WEBGL_POINTS are drawn with Scattergl, so payload size and render time stay bounded at
+# any grain.
+#   lttb    Largest-Triangle-Three-Buckets: keeps the points that shape the line
+#   minmax  lowest and highest point of each bucket: keeps every spike
+
+MAX_POINTS = int(os.environ.get('MCAT_MAX_POINTS', 1500))      # per chart, shared by its series
+WEBGL_POINTS = int(os.environ.get('MCAT_WEBGL_POINTS', 1000))  # Scattergl above this many points
+
+
+def lttb(x, y, n_out):
+    """Indices of the n_out points LTTB keeps (the first and last point always)"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets between the ends
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(y, n_buckets):
+    """Indices of the lowest and highest point in each of n_buckets equal runs (plus both ends)"""
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    bucket = np.arange(n) * n_buckets // n
+    order = np.lexsort((np.asarray(y, dtype=np.float64), bucket))
+    starts = np.searchsorted(bucket, np.arange(n_buckets))
+    ends = np.append(starts[1:], n)
+    return np.unique(np.concatenate([order[starts], order[ends - 1], [0, n - 1]]))
+
+
+METHODS = {
+    'lttb': lambda x, y, n: lttb(x, y, n),
+    'minmax': lambda x, y, n: minmax(y, max(1, n // 2)),
+}
+
+
+def downsample(df, x, y, max_points, method='lttb'):
+    """Rows of df (sorted by x) kept for a line of at most ~max_points points"""
+    df = df[df[y].notna()]
+    if len(df) <= max_points:
+        return df
+    xs = df[x].to_numpy()
+    if np.issubdtype(xs.dtype, np.datetime64):
+        xs = xs.astype('datetime64[ns]').astype(np.int64)
+    return df.iloc[METHODS[method](xs, df[y].to_numpy(), max_points)]
@@ -0,0 +1,404 @@
+import argparse
+import calendar
+import os
+from datetime import datetime
+
+import pandas as pd
+
+import score_engine
+from score_engine import FL_EXAMS
+
+# Monthly ETL behind the dashboard tabs, ported from kpis_metrics.ipynb. Every per-product
+# aggregate is one groupby over all products and years at once (the notebook filtered the
+# full frame once per product code), and the reference month / years are parameters.
+#
+#   python etl.py                          # previous month, 2023-2025, publish to the sheet
+#   python etl.py --ref-month 6 --out out  # write CSVs instead of publishing
+#   python etl.py --workers 1              # build the tabs in this process (default: a
+#                                          # process pool over every core, etl_pipeline.py)
+
+COMPLETION_WINDOWS = [30, 60, 90]  # days from enrollment start
+
+QUERY_DIR = os.environ.get('MCAT_QUERY_DIR', 'SQL Queries')
+SOURCE_QUERIES = {
+    'scores': 'Scores_query_23_25.sql',
+    'activity': 'Activity_query_23_25.sql',
+    'kfl': 'KFL_Query.sql',
+    'quiz': 'mcat_quiz.sql',
+}
+ACTIVITY_COLUMNS = ['kbs_enrollment_id', 'product_code', 'enroll_start_date', 'enroll_exp_date', 'date_created',
+                    'date_completed', 'sequence_name', 'sequence_title', 'total_scored_items_answered']
+TEST_COLUMNS = ['kbs_enrollment_id', 'product_code', 'enroll_start_date', 'enroll_exp_date', 'date_created',
+                'date_completed', 'sequence_name', 'total_scored_items_answered']
+
+
+def load_sources(query_dir=QUERY_DIR, since=None):
+    """Run the four source queries; returns {'scores', 'activity', 'kfl', 'quiz'} frames.
+
+    since: only fetch rows completed on or after this date (incremental runs)
+    """
+    # db_utils holds the warehouse connection helpers and is not part of this repo
+    from db_utils import load_query, execute_query
+    sources = {}
+    for name, file in SOURCE_QUERIES.items():
+        query = load_query(os.path.join(query_dir, file))
+        if since is not None:
+            query = (f"SELECT * FROM ({query.strip().rstrip(';')}) src "
+                     f"WHERE src.date_completed >= '{pd.Timestamp(since):%Y-%m-%d}'")
+        sources[name] = execute_query(query)
+    return sources
+
+
+def _add_date_parts(df, date_col, prefix):
+    dates = pd.to_datetime(df[date_col], errors='coerce')
+    df[date_col] = dates
+    df[f'{prefix}_year'] = dates.dt.year
+    df[f'{prefix}_month'] = dates.dt.month
+
+
+def clean_sources(sources):
+    """Row-level cleaning of the raw query results: activity (activities + quizzes +
+    practice tests), tests (practice tests + KFL exams), scores and kfl.
+
+    Counted columns get 0/1 indicator columns (n_<col>) so every pipeline aggregates with
+    sums, which works the same on these rows and on pre-folded partials (etl_incremental).
+    """
+    scores = sources['scores'].copy()
+    quiz = sources['quiz'].copy()
+    scores['sequence_title'] = scores['sequence_name']
+    quiz['sequence_title'] = quiz['sequence_name']
+
+    kfl = sources['kfl']
+    kfl = kfl[~kfl['sequence_title'].str.contains('Practice', case=False)]
+    kfl = kfl[kfl['exam_completed'] == 1].copy()
+    kfl['scaled_score'] = pd.to_numeric(kfl['scaled_score'], errors='coerce')
+    kfl['date_created'] = pd.to_datetime(kfl['date_created'])
+    _add_date_parts(kfl, 'date_completed', 'Activity')
+
+    act = sources['activity']
+    act = act[act['status'] == 'completed']
+    act = act[~act['sequence_title'].str.contains('AAMC Practice Exam', case=False)]
+
+    activity = pd.concat([act[ACTIVITY_COLUMNS], quiz[ACTIVITY_COLUMNS], scores[ACTIVITY_COLUMNS]], ignore_index=True)
+    activity = activity.dropna(subset=['enroll_exp_date'])
+    tests = pd.concat([scores[TEST_COLUMNS], kfl[TEST_COLUMNS]], ignore_index=True)
+    for df in (activity, tests):
+        df['date_created'] = pd.to_datetime(df['date_created'])
+        _add_date_parts(df, 'date_completed', 'Activity')
+        _add_date_parts(df, 'enroll_exp_date', 'Expiry')
+    _add_date_parts(activity, 'enroll_start_date', 'ESD')
+    activity['n_sequence_title'] = activity['sequence_title'].notna().astype(int)
+    activity['n_sequence_name'] = activity['sequence_name'].notna().astype(int)
+    tests['n_sequence_name'] = tests['sequence_name'].notna().astype(int)
+    # Completion trend windows: was the activity done within N days of enrollment start
+    act_to_start = (activity['date_created'] - activity['enroll_start_date']).dt.days
+    for days in COMPLETION_WINDOWS:
+        within = (act_to_start <= days).astype(int)
+        activity[f'w{days}_rows'] = within
+        activity[f'w{days}_n_sequence_title'] = activity['n_sequence_title'] * within
+        activity[f'w{days}_total_scored_items_answered'] = activity['total_scored_items_answered'].fillna(0) * within
+
+    scores['scaled_score'] = pd.to_numeric(scores['scaled_score'], errors='coerce')
+    scores['date_created'] = pd.to_datetime(scores['date_created'])
+    _add_date_parts(scores, 'enroll_exp_date', 'Expiry')
+    _add_date_parts(scores, 'date_completed', 'Activity')
+    return {'activity': activity, 'tests': tests, 'scores': scores, 'kfl': kfl}
+
+
+def derive(frames):
+    """Add what needs each enrollment's full history: the score picks, score_gain, products"""
+    table = score_engine.score_table(frames['scores'], frames['kfl'])
+    return dict(frames, score_table=table, score_gain=score_gain_frame(table),
+                products=frames['activity']['product_code'].unique())
+
+
+def prepare(sources):
+    """The frames every pipeline works from: clean_sources + derive"""
+    return derive(clean_sources(sources))
+
+
+def score_gain_frame(table):
+    """Per enrollment with 2+ practice tests: first AAMC1 score, best other score, gain"""
+    first = score_engine.pick(table, score_engine.FIRST, min_pt=2)
+    best = score_engine.pick(table, score_engine.MAX, min_pt=2)
+    gain = pd.merge(first[['kbs_enrollment_id', 'product_code', 'enroll_exp_date', 'scaled_score']],
+                    best[['kbs_enrollment_id', 'scaled_score']],
+                    on='kbs_enrollment_id', how='inner', suffixes=('_first', '_max'))
+    gain['score_gain'] = gain['scaled_score_max'] - gain['scaled_score_first']
+    gain['Expiry_year'] = gain['enroll_exp_date'].dt.year
+    gain['Expiry_month'] = gain['enroll_exp_date'].dt.month
+    return gain
+
+
+def month_year_pivot(df, month_col, year_col, aggs, years, products, months=None, prefix='', year_major=False):
+    """Wide product x month table with one column per (aggregate, year), the layout of
+    every metric tab, from a single groupby over all products and years.
+
+    aggs: named aggregations, e.g. {'kbs_enrollment_id': ('kbs_enrollment_id', 'nunique')}
+    months: month numbers to list (default: every month with data)
+    year_major: columns year by year (score tabs) instead of aggregate by aggregate
+    """
+    keyed = df.dropna(subset=[month_col, year_col])
+    keyed = keyed.assign(**{month_col: keyed[month_col].astype(int), year_col: keyed[year_col].astype(int)})
+    keyed = keyed[keyed[year_col].isin(years)]
+    wide = keyed.groupby(['product_code', month_col, year_col]).agg(**aggs).unstack(year_col, fill_value=0)
+    if months is None:
+        months = sorted(wide.index.get_level_values(month_col).unique())
+    wide = wide.reindex(pd.MultiIndex.from_product([products, months], names=['product_code', month_col]),
+                        fill_value=0)
+    names = sorted(aggs)  # same order pivot_table gave the notebook
+    order = [(n, y) for y in years for n in names] if year_major else [(n, y) for n in names for y in years]
+    wide = wide.reindex(columns=pd.MultiIndex.from_tuples(order), fill_value=0)
+    wide.columns = [f'{prefix}{n}_{y}' for n, y in order]
+    out = wide.reset_index()
+    out[month_col] = out[month_col].map(lambda m: calendar.month_abbr[m])
+    return out
+
+
+def _kpi_block(df, year_col, kpi_years, products, name, parameter, value_col=None, how=None):
+    # One KPI card block: product_code, per year total_<name>_<yy> (+ total_eid_<yy>), Parameter
+    rows = df[df[year_col].isin(kpi_years)]
+    rows = rows.assign(**{year_col: rows[year_col].astype(int)})
+    aggs = {'eid': ('kbs_enrollment_id', 'nunique')}
+    if value_col:
+        aggs = {'total': (value_col, how), **aggs}
+    wide = rows.groupby(['product_code', year_col]).agg(**aggs).unstack(year_col, fill_value=0)
+    wide = wide.reindex(index=products, columns=pd.MultiIndex.from_product([list(aggs), kpi_years]), fill_value=0)
+    block = pd.DataFrame({'product_code': products})
+    for yr in kpi_years:
+        sfx = str(yr)[-2:]
+        if value_col:
+            block[f'total_{name}_{sfx}'] = wide[('total', yr)].to_numpy()
+            block[f'total_eid_{sfx}'] = wide[('eid', yr)].to_numpy()
+        else:
+            block[f'total_{name}_{sfx}'] = wide[('eid', yr)].to_numpy()
+    block['Parameter'] = parameter
+    return block
+
+
+# KPI tab blocks by start cell: (frame, date prefix, name, Parameter, summed column, aggregation)
+KPI_LAYOUT = {
+    'A2': ('score_gain', 'Expiry', 'diff_score', 'Score Gain', 'score_gain', 'sum'),
+    'H2': ('activity', 'Activity', 'sequence_name', 'Avg Activity / User', 'n_sequence_name', 'sum'),
+    'O2': ('activity', 'Activity', 'active_user', 'Active Users', None, None),
+    'T2': ('activity', 'Activity', 'total_scored_items_answered', 'Avg Questions Answered / User',
+           'total_scored_items_answered', 'sum'),
+    'AA2': ('tests', 'Activity', 'sequence_name', 'Avg Tests / User', 'n_sequence_name', 'sum'),
+}
+
+
+def kpi_block(frames, ref_month, kpi_years, cumulative, cell):
+    """The KPI block starting at `cell` of KPIs_sheet (ref month only) or KPIs_sheet_tll_PM
+    (cumulative: January up to the ref month)"""
+    source, prefix, name, parameter, value_col, how = KPI_LAYOUT[cell]
+    df = frames[source]
+    months = df[f'{prefix}_month']
+    df = df[months <= ref_month if cumulative else months == ref_month]
+    return _kpi_block(df, f'{prefix}_year', kpi_years, frames['products'], name, parameter, value_col, how)
+
+
+def kpi_blocks(frames, ref_month, kpi_years, cumulative=False):
+    """[(start cell, block)] for KPIs_sheet or KPIs_sheet_tll_PM"""
+    return [(cell, kpi_block(frames, ref_month, kpi_years, cumulative, cell)) for cell in KPI_LAYOUT]
+
+
+SCORE_AGGS = {'kbs_enrollment_id': ('kbs_enrollment_id', 'nunique'), 'scaled_score': ('scaled_score', 'sum')}
+
+
+def score_gain_tab(frames, years):
+    gain = frames['score_gain']
+    gain = gain[gain['Expiry_year'].isin(years)]
+    aggs = {'kbs_enrollment_id': ('kbs_enrollment_id', 'nunique'), 'score_gain': ('score_gain', 'sum')}
+    return month_year_pivot(gain, 'Expiry_month', 'Expiry_year', aggs, years, frames['products'],
+                            months=sorted(gain['Expiry_month'].dropna().astype(int).unique()), year_major=True)
+
+
+DETAILED_PICKS = {'First_score_': score_engine.FIRST, 'Max_score_': score_engine.MAX,
+                  'Latest_score_': score_engine.LATEST}
+
+
+def detailed_score_block(frames, years, prefix):
+    """One pick (DETAILED_PICKS prefix) by expiry month, for the score gain enrollments"""
+    gain = frames['score_gain']
+    gain = gain[gain['Expiry_year'].isin(years)]
+    table = frames['score_table']
+    table = table[table['kbs_enrollment_id'].isin(gain['kbs_enrollment_id'].unique())
+                  & table['Expiry_year'].isin(years)]
+    months = sorted(gain['Expiry_month'].dropna().astype(int).unique())
+    return month_year_pivot(score_engine.pick(table, DETAILED_PICKS[prefix]), 'Expiry_month', 'Expiry_year',
+                            SCORE_AGGS, years, frames['products'], months=months, prefix=prefix, year_major=True)
+
+
+def detailed_score_tab(frames, years):
+    """First / Max / Latest score blocks by expiry month, for the score gain enrollments"""
+    return pd.concat([detailed_score_block(frames, years, prefix) for prefix in DETAILED_PICKS], axis=1)
+
+
+def monthly_fl_block(frames, years, label):
+    """First attempt score of one full length exam, by activity month"""
+    return month_year_pivot(score_engine.pick(frames['score_table'], label), 'Activity_month', 'Activity_year',
+                            SCORE_AGGS, years, frames['products'], prefix=f'{label}_score_', year_major=True)
+
+
+def monthly_fl_tab(frames, years):
+    """First attempt score of every full length exam, by activity month"""
+    return pd.concat([monthly_fl_block(frames, years, label) for label in FL_EXAMS], axis=1)
+
+
+def monthwise_tab(frames, years, month_col, year_col):
+    """Activity / questions answered / practice tests per user, by activity or expiry month"""
+    products = frames['products']
+    enrollments = ('kbs_enrollment_id', 'nunique')
+    act = month_year_pivot(frames['activity'], month_col, year_col,
+                           {'kbs_enrollment_id': enrollments, 'sequence_title': ('n_sequence_title', 'sum')},
+                           years, products, prefix='Avg_Activity_')
+    months = [list(calendar.month_abbr).index(m) for m in act[month_col].unique()]
+    ques = month_year_pivot(frames['activity'], month_col, year_col,
+                            {'kbs_enrollment_id': enrollments,
+                             'total_scored_items_answered': ('total_scored_items_answered', 'sum')},
+                            years, products, months=months, prefix='Avg Question Answered_')
+    # Practice tests per active user: same product x month grid as the activity block, so
+    # its enrollment counts line up row for row
+    pt = month_year_pivot(frames['tests'], month_col, year_col, {'sequence_name': ('n_sequence_name', 'sum')},
+                          years, products, months=months, prefix='Avg Practice Test_')
+    for yr in years:
+        pt[f'Avg Practice Test_kbs_enrollment_id_{yr}'] = act[f'Avg_Activity_kbs_enrollment_id_{yr}']
+    return pd.concat([act, ques, pt], axis=1)
+
+
+def completion_trend_block(frames, years, as_of, agg_col, measure, label, days):
+    """Per enrollment start month: activity in the first `days` days, for enrollments that
+    started at least that many days before as_of.
+
+    measure: summed column, read from its w<days>_ window variant
+    """
+    rows = frames['activity']
+    rows = rows[rows['ESD_year'].isin(years)]
+    days_to_start = (pd.Timestamp(as_of).normalize() - pd.to_datetime(rows['enroll_start_date'])).dt.days
+    window = rows[(days_to_start >= days) & (rows[f'w{days}_rows'] > 0)]
+    aggs = {'kbs_enrollment_id': ('kbs_enrollment_id', 'nunique'), agg_col: (f'w{days}_{measure}', 'sum')}
+    return month_year_pivot(window, 'ESD_month', 'ESD_year', aggs, years, frames['products'],
+                            prefix=f'{label}_{days}_days_')
+
+
+def completion_trend_tab(frames, years, as_of, agg_col, measure, label):
+    """completion_trend_block for every COMPLETION_WINDOWS window, side by side"""
+    return pd.concat([completion_trend_block(frames, years, as_of, agg_col, measure, label, days)
+                      for days in COMPLETION_WINDOWS], axis=1)
+
+
+def product_frame(frames):
+    return pd.DataFrame({'product_code': frames['products']})
+
+
+def output_tasks(ref_month, years, as_of=None, kpi_years=None):
+    """{tab name: [(start cell, [(fn, args)])]}: every block of every dashboard tab as
+    fn(frames, *args) calls; the frames of one start cell are placed side by side. A
+    start cell of None means the frame replaces the whole tab."""
+    as_of = as_of or datetime.today()
+    kpi_years = kpi_years or years[-2:]
+
+    def whole(*parts):
+        return [(None, list(parts))]
+
+    def kpi_tab(cumulative):
+        return [(cell, [(kpi_block, (ref_month, kpi_years, cumulative, cell))]) for cell in KPI_LAYOUT]
+
+    def trend(agg_col, measure, label):
+        return whole(*[(completion_trend_block, (years, as_of, agg_col, measure, label, days))
+                       for days in COMPLETION_WINDOWS])
+
+    return {
+        'Product Code': whole((product_frame, ())),
+        'KPIs_sheet': kpi_tab(False),
+        'KPIs_sheet_tll_PM': kpi_tab(True),
+        'Score_Gain_Sheet': whole((score_gain_tab, (years,))),
+        'Detailed Score Breakdown_Metrics': whole(*[(detailed_score_block, (years, prefix))
+                                                    for prefix in DETAILED_PICKS]),
+        'Monthly Full Length Engagement_metrics': whole(*[(monthly_fl_block, (years, label)) for label in FL_EXAMS]),
+        'Monthwise Activity_Questions_PT_metrics(Act_month)':
+            whole((monthwise_tab, (years, 'Activity_month', 'Activity_year'))),
+        'Monthwise Activity_Questions_PT_metrics(Expiry_month)':
+            whole((monthwise_tab, (years, 'Expiry_month', 'Expiry_year'))),
+        'Activity_Completion_Trends(30_60_90_days)_metrics': trend('sequence_title', 'n_sequence_title', 'Activity'),
+        'Ques_Ans_Completion_Trends(30_60_90_days)_metrics':
+            trend('total_scored_items_answered', 'total_scored_items_answered', 'Ques_Ans'),
+    }
+
+
+def assemble(parts):
+    """One start cell's frame from its block frames"""
+    return parts[0] if len(parts) == 1 else pd.concat(parts, axis=1)
+
+
+def build_outputs(frames, ref_month, years, as_of=None, kpi_years=None):
+    """{tab name: [(start cell, DataFrame)]} for every dashboard tab, built in this process
+    (etl_pipeline.run_pipeline builds the same on a process pool)"""
+    tasks = output_tasks(ref_month, years, as_of, kpi_years)
+    return {tab: [(cell, assemble([fn(frames, *args) for fn, args in parts])) for cell, parts in cells]
+            for tab, cells in tasks.items()}
+
+
+def publish(outputs, sheet_id, force=False):
+    """All tabs in one diffed bulk write (see publisher.py)"""
+    from publisher import SheetPublisher
+    publisher = SheetPublisher(sheet_id)
+    for tab, blocks in outputs.items():
+        for cell, df in blocks:
+            publisher.add(tab, df, cell)
+    summary = publisher.publish(force=force)
+    print(f"Published {summary['ranges']} changed ranges ({summary['cells']} cells); "
+          f"{summary['skipped']}/{summary['blocks']} blocks unchanged")
+    return summary
+
+
+def write_csv(outputs, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for tab, blocks in outputs.items():
+        for cell, df in blocks:
+            name = tab if cell is None else f'{tab}__{cell}'
+            df.to_csv(os.path.join(out_dir, f'{name}.csv'), index=False)
+
+
+def previous_month(today=None):
+    today = today or datetime.today()
+    return today.month - 1 if today.month > 1 else 12
+
+
+def build_parser(description="Rebuild the MCAT dashboard tabs from the source queries"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--ref-month', type=int, default=previous_month(),
+                        help="month the KPI tabs report on (default: previous month)")
+    parser.add_argument('--years', type=int, nargs='+', default=[2023, 2024, 2025])
+    parser.add_argument('--kpi-years', type=int, nargs='+', help="years compared on the KPI cards (default: last two)")
+    parser.add_argument('--as-of', type=pd.Timestamp, help="reference date for the 30/60/90 day trends (default: today)")
+    parser.add_argument('--query-dir', default=QUERY_DIR)
+    parser.add_argument('--sheet-id', help="spreadsheet to publish to (default: the dashboard sheet)")
+    parser.add_argument('--out', help="write CSVs to this directory instead of publishing")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="processes building the tabs (default: every core; 1 builds them in this process)")
+    parser.add_argument('--force-publish', action='store_true',
+                        help="diff every block against the sheet, even ones unchanged since the last publish")
+    return parser
+
+
+def emit(frames, args):
+    """Build every tab from prepared frames and publish them (or write CSVs with --out)"""
+    from etl_pipeline import run_pipeline, timing_report
+    outputs, timings = run_pipeline(frames, args.ref_month, args.years, args.as_of, args.kpi_years, args.workers)
+    print(f"Built {len(timings)} tasks; slowest:\n{timing_report(timings, top=10)}")
+    if args.out:
+        write_csv(outputs, args.out)
+    else:
+        from helper_function import MCAT_SHEET_ID
+        publish(outputs, args.sheet_id or MCAT_SHEET_ID, force=args.force_publish)
+    return outputs
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    emit(prepare(load_sources(args.query_dir)), args)
+
+
+if __name__ == '__main__':
+    main()
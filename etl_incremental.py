@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import shutil
+import time
+
+import pandas as pd
+
+import etl
+
+# Incremental mode for etl.py. The cleaned source rows are folded into partial aggregates
+# at (enrollment, product, month, year) grain and stored locally as one Parquet file per
+# activity month. Distinct enrollment counts stay exact because the enrollment is part of
+# the grain. A run only queries rows completed since the watermark month (minus a lookback
+# for late-arriving rows), replaces those month partitions wholesale and rebuilds the tabs
+# from the stored partials, so its cost follows one month of data, not the whole history.
+# Stored rows come back in partition (activity month) order, not query order, so the
+# tabs list products in a different row order than a full etl.py run, and score picks
+# tied on date_created (broken on input order, like idxmin) can go to another attempt.
+#
+#   python etl_incremental.py            # incremental run, publish
+#   python etl_incremental.py --full     # rebuild the store from the full history
+
+STORE_DIR = os.environ.get('MCAT_ETL_STORE', '.etl_store')
+LOOKBACK_MONTHS = 1
+
+ACTIVITY_GRAIN = ['kbs_enrollment_id', 'product_code', 'Activity_year', 'Activity_month',
+                  'Expiry_year', 'Expiry_month', 'ESD_year', 'ESD_month', 'enroll_start_date']
+TEST_GRAIN = ['kbs_enrollment_id', 'product_code', 'Activity_year', 'Activity_month',
+              'Expiry_year', 'Expiry_month']
+# Scores and KFL attempts are small and need each enrollment's full history (first /
+# best / latest attempt), so they are stored as cleaned rows rather than folded
+TABLES = ['activity', 'tests', 'scores', 'kfl']
+
+
+MEASURES = re.compile(r'^(n_.*|w\d+_.*|total_scored_items_answered)$')
+
+
+def _sum_columns(df, grain):
+    return [c for c in df.columns if c not in grain and MEASURES.match(c)]
+
+
+def fold(df, grain):
+    """Partial aggregates of cleaned rows: one row per grain key, summed measure columns"""
+    return df.groupby(grain, dropna=False, observed=True)[_sum_columns(df, grain)].sum().reset_index()
+
+
+def fold_partials(frames):
+    """{table: frame to store} from etl.clean_sources output"""
+    return {
+        'activity': fold(frames['activity'], ACTIVITY_GRAIN),
+        'tests': fold(frames['tests'], TEST_GRAIN),
+        'scores': frames['scores'],
+        'kfl': frames['kfl'],
+    }
+
+
+def _periods(df):
+    # Partition key: activity month as 'YYYY-MM' ('none' when there is no completion date)
+    year, month = df['Activity_year'], df['Activity_month']
+    labels = year.astype('Int64').astype(str).str.zfill(4) + '-' + month.astype('Int64').astype(str).str.zfill(2)
+    return labels.where(year.notna() & month.notna(), 'none')
+
+
+class PartitionStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+
+    def _dir(self, table):
+        return os.path.join(self.root, table)
+
+    def partitions(self, table):
+        path = self._dir(table)
+        if not os.path.isdir(path):
+            return []
+        return sorted(f[:-len('.parquet')] for f in os.listdir(path) if f.endswith('.parquet'))
+
+    def replace(self, table, df, since_period=None):
+        """Replace every partition from since_period on (all of them when None) with df"""
+        path = self._dir(table)
+        os.makedirs(path, exist_ok=True)
+        for period in self.partitions(table):
+            if since_period is None or (period != 'none' and period >= since_period):
+                os.remove(os.path.join(path, period + '.parquet'))
+        periods = _periods(df)
+        for period, part in df.groupby(periods):
+            if since_period is not None and (period == 'none' or period < since_period):
+                continue  # rows outside the refreshed window stay as stored
+            tmp = os.path.join(path, f'{period}.parquet.tmp')
+            part.to_parquet(tmp, index=False)
+            os.replace(tmp, os.path.join(path, period + '.parquet'))
+
+    def read(self, table):
+        files = [os.path.join(self._dir(table), p + '.parquet') for p in self.partitions(table)]
+        if not files:
+            return pd.DataFrame()
+        return pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+
+    def watermark(self):
+        try:
+            with open(os.path.join(self.root, 'watermark.json'), 'r', encoding='utf-8') as f:
+                return pd.Timestamp(json.load(f)['date_completed'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set_watermark(self, value):
+        meta = {'date_completed': pd.Timestamp(value).isoformat(), 'updated_at': time.time()}
+        tmp = os.path.join(self.root, 'watermark.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.root, 'watermark.json'))
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def refresh_window(watermark, lookback_months=LOOKBACK_MONTHS):
+    """First day of the oldest month to re-pull: the watermark's month minus the lookback"""
+    return (watermark.to_period('M') - lookback_months).to_timestamp()
+
+
+def update_store(store, load=etl.load_sources, full=False, lookback_months=LOOKBACK_MONTHS):
+    """Pull new / late rows into the store; returns the start of the refreshed window
+    (None for a full rebuild)."""
+    watermark = None if full else store.watermark()
+    since = refresh_window(watermark, lookback_months) if watermark is not None else None
+    frames = etl.clean_sources(load(since=since))
+    if since is None:
+        store.clear()
+    since_period = f'{since:%Y-%m}' if since is not None else None
+    for table, df in fold_partials(frames).items():
+        store.replace(table, df, since_period)
+    latest = max((frames[t]['date_completed'].max() for t in TABLES if not frames[t].empty), default=None)
+    latest = latest if pd.notna(latest) else watermark
+    if latest is not None:
+        store.set_watermark(max(latest, watermark) if watermark is not None else latest)
+    return since
+
+
+def load_frames(store):
+    """Prepared frames (as etl.prepare returns) built from the stored partials"""
+    return etl.derive({table: store.read(table) for table in TABLES})
+
+
+def main(argv=None):
+    parser = etl.build_parser("Incrementally refresh the MCAT dashboard tabs")
+    parser.add_argument('--full', action='store_true', help="rebuild the local store from the full history")
+    parser.add_argument('--lookback-months', type=int, default=LOOKBACK_MONTHS,
+                        help="months before the watermark month to re-pull for late-arriving rows")
+    parser.add_argument('--store', default=STORE_DIR)
+    args = parser.parse_args(argv)
+
+    store = PartitionStore(args.store)
+    since = update_store(store, lambda since: etl.load_sources(args.query_dir, since=since),
+                         full=args.full, lookback_months=args.lookback_months)
+    print(f"Refreshed partitions from {since:%Y-%m}" if since is not None else "Rebuilt the full history")
+    etl.emit(load_frames(store), args)
+
+
+if __name__ == '__main__':
+    main()
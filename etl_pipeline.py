@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+import etl
+from instrumentation import get_logger, observe
+
+# etl.build_outputs as a task graph on a process pool. Every block of every tab
+# (etl.output_tasks: each AAMC / KFL exam, each First / Max / Latest pick, each 30/60/90
+# day window, each KPI block, ...) is an independent node; a tab node puts its blocks
+# side by side once they are all done. The prepared frames are written once as
+# uncompressed Arrow IPC files and memory-mapped by the workers, so the pool shares one
+# copy through the page cache instead of pickling the frames into every task.
+# Each node's wall time is reported (and recorded as the etl_task timing).
+#
+#   python etl.py --workers 8           # default: every core; --workers 1 runs in process
+
+log = get_logger('etl_pipeline')
+
+_shared = {}  # worker process: the memory-mapped frames
+
+
+def node(fn, args=(), deps=(), local=False):
+    """One task: fn(frames, *args) on a worker, or fn(*dep results) in this process (local)"""
+    return {'fn': fn, 'args': tuple(args), 'deps': list(deps), 'local': local}
+
+
+def output_graph(tasks):
+    """{node name: node} for etl.output_tasks(): one node per block, one per (tab, start cell)"""
+    graph = {}
+    for tab, cells in tasks.items():
+        for cell, parts in cells:
+            target = tab if cell is None else f'{tab}!{cell}'
+            names = [target] if len(parts) == 1 else [f'{target}[{args[-1]}]' for _, args in parts]
+            for name, (fn, args) in zip(names, parts):
+                graph[name] = node(fn, args)
+            if len(parts) > 1:
+                graph[target] = node(_assemble, deps=names, local=True)
+    return graph
+
+
+def _assemble(*blocks):
+    return etl.assemble(list(blocks))
+
+
+def share_frames(frames, root):
+    """Write the prepared frames to root as Arrow IPC files (one per frame)"""
+    import pyarrow as pa
+    os.makedirs(root, exist_ok=True)
+    for name, value in frames.items():
+        df = value if isinstance(value, pd.DataFrame) else pd.DataFrame({name: value})  # products: one array
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(os.path.join(root, f'{name}.arrow'), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    return root
+
+
+def attach_frames(root, kinds):
+    """The frames share_frames wrote, memory-mapped (only columns pandas must convert are copied).
+
+    kinds: {name: True for a DataFrame, False for a single array}
+    """
+    import pyarrow as pa
+    frames = {}
+    for name, is_frame in kinds.items():
+        table = pa.ipc.open_file(pa.memory_map(os.path.join(root, f'{name}.arrow'))).read_all()
+        df = table.to_pandas(split_blocks=True)
+        frames[name] = df if is_frame else df[name].array
+    return frames
+
+
+def _attach(root, kinds):
+    _shared['frames'] = attach_frames(root, kinds)
+
+
+def _run_node(fn, args):
+    start = time.perf_counter()
+    result = fn(_shared['frames'], *args)
+    return result, time.perf_counter() - start
+
+
+def _check(graph):
+    for name, n in graph.items():
+        missing = [d for d in n['deps'] if d not in graph]
+        if missing:
+            raise ValueError(f"Task {name!r} depends on unknown tasks {missing}")
+
+
+def run_graph(graph, frames, workers=None):
+    """Run every node; returns ({node name: result}, {node name: seconds})"""
+    _check(graph)
+    workers = workers or os.cpu_count() or 1
+    pending, results, timings = dict(graph), {}, {}
+    root = pool = None
+    if workers > 1:
+        root = share_frames(frames, tempfile.mkdtemp(prefix='mcat-etl-'))
+        pool = ProcessPoolExecutor(workers, initializer=_attach, initargs=(root, {name: isinstance(v, pd.DataFrame) for name, v in frames.items()}))
+    else:
+        _shared['frames'] = frames
+    running = {}
+    try:
+        while pending or running:
+            ready = [name for name, n in pending.items() if all(d in results for d in n['deps'])]
+            for name in ready:
+                n = pending.pop(name)
+                if n['local']:
+                    start = time.perf_counter()
+                    results[name] = n['fn'](*[results[d] for d in n['deps']])
+                    timings[name] = time.perf_counter() - start
+                elif pool is None:
+                    results[name], timings[name] = _run_node(n['fn'], n['args'])
+                else:
+                    running[pool.submit(_run_node, n['fn'], n['args'])] = name
+            if not running:
+                if pending and not ready:
+                    raise ValueError(f"Task graph has a cycle through {sorted(pending)}")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name], timings[name] = future.result()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+            shutil.rmtree(root, ignore_errors=True)
+        _shared.pop('frames', None)
+    for name, seconds in timings.items():
+        observe('etl_task', seconds, task=name)
+    return results, timings
+
+
+def run_pipeline(frames, ref_month, years, as_of=None, kpi_years=None, workers=None):
+    """etl.build_outputs on a process pool: ({tab name: [(start cell, DataFrame)]}, timings)"""
+    tasks = etl.output_tasks(ref_month, years, as_of, kpi_years)
+    start = time.perf_counter()
+    results, timings = run_graph(output_graph(tasks), frames, workers)
+    wall = time.perf_counter() - start
+    log.info('built %d tasks in %.1f s (%.1f s of task time)', len(timings), wall, sum(timings.values()))
+    outputs = {tab: [(cell, results[tab if cell is None else f'{tab}!{cell}']) for cell, _ in cells]
+               for tab, cells in tasks.items()}
+    return outputs, timings
+
+
+def timing_report(timings, top=None):
+    """Slowest tasks first, one line each"""
+    rows = sorted(timings.items(), key=lambda item: -item[1])[:top]
+    width = max((len(name) for name, _ in rows), default=0)
+    return '\n'.join(f'{name:<{width}}  {seconds * 1000:9.1f} ms' for name, seconds in rows)
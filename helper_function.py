@@ -1,14 +1,58 @@
 import streamlit as st
 import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
 import pandas as pd
 import pygsheets
 import calendar
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pygsheets.address import Address
+from pygsheets.utils import numericise_all
+import snapshot_cache
+from sheets_client import SheetsClient
+from dataset_registry import BoundedLRU, fingerprint
+from instrumentation import get_logger, incr, register_cache, timer
+from downsample import MAX_POINTS, WEBGL_POINTS, downsample
+
+log = get_logger('data')
 
 service_account_path = 'gsheet_api.json'
-gc = pygsheets.authorize(service_file=service_account_path)
+MCAT_SHEET_ID = os.environ.get('MCAT_SHEET_ID', '1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4')
+
+# Result key -> (tab name, start cell, end cell) for everything the dashboard reads
+DASHBOARD_TABS = {
+    'product_code_df': ('Product Code', None, None),
+    'KPI_data_all': ('KPIs_sheet', 'A2', 'AF27'),
+    'KPI_data_Pm_all': ('KPIs_sheet_tll_PM', 'A2', 'AF27'),
+    'prod_score_gain_data': ('Score_Gain_Sheet', None, None),
+    'DScBd_metrics': ('Detailed Score Breakdown_Metrics', None, None),
+    'monthly_fl_metrics': ('Monthly Full Length Engagement_metrics', None, None),
+    'monthwise_act_ques_pt_metrics': ('Monthwise Activity_Questions_PT_metrics(Act_month)', None, None),
+    'monthwise_act_ques_pt_metrics_exp': ('Monthwise Activity_Questions_PT_metrics(Expiry_month)', None, None),
+    'act_comp_trend': ('Activity_Completion_Trends(30_60_90_days)_metrics', None, None),
+    'ques_comp_trend': ('Ques_Ans_Completion_Trends(30_60_90_days)_metrics', None, None),
+    'kpis_metric_def': ('Kpi_Metrics_definition', None, None),
+}
+
+# Nothing touches the network at import time: the client is created on first use.
+_gc = None
+_gc_lock = threading.Lock()
+
+def get_client():
+    """Authorized pygsheets client, created on first use and shared by every reader/writer"""
+    global _gc
+    if _gc is None:
+        with _gc_lock:
+            if _gc is None:
+                _gc = pygsheets.authorize(service_file=service_account_path)
+    return _gc
+
+# Every dashboard read goes through one quota-aware wrapper around that client
+sheets = SheetsClient(get_client)
 today = datetime.today()
 prev_month = today.month - 1 if today.month > 1 else 12
 prev_prev_month = today.month - 2 if today.month > 2 else 12
@@ -17,73 +61,131 @@ prev_prev_month = calendar.month_name[prev_prev_month]
 
 def read_from_gsheets(sheet_id, tab_name):
 
-    _sheet = gc.open_by_key(sheet_id)
-    _wksheet = _sheet.worksheet('title', tab_name)
-    _df = _wksheet.get_as_df()
+    values = read_range_values(sheet_id, [_a1_range(tab_name)])[0]
+    _df = _values_to_df(values, numerize=True)
 
     return _df
 
 
 
 def read_from_gsheets_area(sheet_id, tab_name, start_cell=None, end_cell=None):
-    try:
-        sheet = gc.open_by_key(sheet_id)
-        wks = sheet.worksheet_by_title(tab_name)
+    # Read full sheet if range not given. Errors propagate: an empty frame here used to
+    # look like a tab with no data.
+    data = read_range_values(sheet_id, [_a1_range(tab_name, start_cell, end_cell)])[0]
+    return _values_to_df(data, numerize=False)
 
-        if start_cell and end_cell:
-            data = wks.get_values(start=start_cell, end=end_cell, include_tailing_empty=False)
-        else:
-            # Read full sheet if range not given
-            data = wks.get_all_values(include_tailing_empty=False)
 
-        if len(data) > 1:
-            df = pd.DataFrame(data[1:], columns=data[0])  # First row as headers
-        else:
-            df = pd.DataFrame(data)
-        return df
+## Batched loader - one values.batchGet for every tab / range the dashboard needs
+def _a1_range(tab_name, start_cell=None, end_cell=None):
+    quoted = "'" + tab_name.replace("'", "''") + "'"
+    if start_cell and end_cell:
+        return f"{quoted}!{start_cell}:{end_cell}"
+    return quoted
 
-    except Exception as e:
-        print(f"Error reading Google Sheet: {e}")
-        return pd.DataFrame()
 
+def _values_to_df(values, numerize=True):
+    # Mirrors get_as_df (full tabs) / get_values (ranges): first row is the header
+    if not values:
+        return pd.DataFrame()
+    width = max(len(row) for row in values)
+    values = [list(row) + [''] * (width - len(row)) for row in values]
+    if numerize:
+        values = [numericise_all(row, '') for row in values]
+    if len(values) > 1:
+        return pd.DataFrame(values[1:], columns=values[0])
+    return pd.DataFrame(columns=values[0])
 
-def load_to_gsheets(df_in, sheet_id, tab_name):
 
-    sheet = gc.open_by_key(sheet_id)
+def read_range_values(sheet_id, ranges, client=None):
+    """Raw cell matrices for A1 ranges, served from the local snapshot while the
+    spreadsheet revision is unchanged and downloaded in one batchGet otherwise.
 
-    # New Logic to create tab name in gsheet 
+    client: a SheetsClient (defaults to the shared one)
+    """
+    client = client or sheets
+    # None when Drive metadata can't be read (API not enabled, missing scope, offline):
+    # every range is then downloaded, and snapshots are only a fallback
+    revision = snapshot_cache.get_revision(client, sheet_id)
+    values = {r: snapshot_cache.load_values(sheet_id, r, revision) for r in ranges}
+    stale = [r for r in ranges if values[r] is None]
+    incr('snapshot_hits', len(ranges) - len(stale))
+    incr('snapshot_misses', len(stale))
+    if stale:
+        try:
+            with timer('sheet_fetch'):
+                value_ranges = client.values_batch_get(sheet_id, stale)
+        except Exception as e:
+            if revision is not None:
+                raise
+            fallback = {r: snapshot_cache.load_fallback(sheet_id, r) for r in stale}
+            if any(v is None for v in fallback.values()):
+                raise
+            log.warning("Sheets unreachable, serving %d saved ranges: %s", len(stale), e)
+            incr('snapshot_fallbacks', len(stale))
+            values.update(fallback)
+            return [values[r] for r in ranges]
+        for r, value_range in zip(stale, value_ranges):
+            values[r] = value_range.get('values', [])
+            snapshot_cache.save_values(sheet_id, r, values[r], revision)
+    return [values[r] for r in ranges]
+
+
+def _read_tab(sheet_id, spec):
+    tab_name, start_cell, end_cell = spec
+    values = read_range_values(sheet_id, [_a1_range(tab_name, start_cell, end_cell)])
+    return _values_to_df(values[0], numerize=not (start_cell and end_cell))
+
+
+def read_tabs_from_gsheets(sheet_id, tabs, max_workers=4):
+    """Read several tabs / A1 ranges of one spreadsheet.
+
+    `tabs` maps a result key to (tab_name, start_cell, end_cell); start/end of None reads
+    the whole tab. Unchanged tabs come from the local snapshot, the rest are pulled with a
+    single values.batchGet round trip; if the batch request fails, the tabs are read
+    individually on a bounded thread pool.
+    """
+    keys = list(tabs)
+    ranges = [_a1_range(*tabs[k]) for k in keys]
     try:
-        worksheet = sheet.worksheet('title', tab_name)
-        worksheet.clear()  
-    except:
-        worksheet = sheet.add_worksheet(title=tab_name, rows=df_in.shape[0]+10, cols=df_in.shape[1]+10)
+        value_ranges = read_range_values(sheet_id, ranges)
+    except Exception as e:
+        log.warning("Batched read failed, falling back to per-tab reads: %s", e)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            frames = pool.map(lambda k: _read_tab(sheet_id, tabs[k]), keys)
+            return dict(zip(keys, frames))
 
-    worksheet.set_dataframe(df_in, (1, 1), fit=True, nan='')
+    result = {}
+    for key, values in zip(keys, value_ranges):
+        _, start_cell, end_cell = tabs[key]
+        # Full tabs behave like get_as_df (numerized), ranges like get_values (raw strings)
+        result[key] = _values_to_df(values, numerize=not (start_cell and end_cell))
+    return result
 
 
+def load_dashboard_data(sheet_id=MCAT_SHEET_ID):
+    """Every tab in DASHBOARD_TABS"""
+    with timer('load_dashboard_data'):
+        return read_tabs_from_gsheets(sheet_id, DASHBOARD_TABS)
 
-def load_to_gsheets_from_cell(df_in, sheet_id, tab_name, start_cell):
-    sheet = gc.open_by_key(sheet_id)
-    worksheet = sheet.worksheet_by_title(tab_name)
 
-    addr = pygsheets.Address(start_cell)
-    start_row, start_col = addr.row, addr.col
+def load_to_gsheets(df_in, sheet_id, tab_name):
+    # Replace the whole tab; only rows that differ from what is published are written
+    from publisher import SheetPublisher
+    return SheetPublisher(sheet_id).add(tab_name, df_in).publish()
 
-    values = [df_in.columns.tolist()] + df_in.values.tolist()
-    end_row = start_row + len(values) -1
-    end_col = start_col + len(values[0]) -1 
 
-    start_a1 = pygsheets.Address((start_row, start_col)).label
-    end_a1 = pygsheets.Address((end_row, end_col)).label
-    cell_range = f"{start_a1}:{end_a1}"
 
-    worksheet.update_values(crange=cell_range, values=values)
+def load_to_gsheets_from_cell(df_in, sheet_id, tab_name, start_cell):
+    from publisher import SheetPublisher
+    return SheetPublisher(sheet_id).add(tab_name, df_in, start_cell).publish()
 
 
 
 def display_chart_with_lines(fig):
     st.markdown('<hr class="chart-line">', unsafe_allow_html=True)
-    st.plotly_chart(fig, use_container_width=True)
+    # serializing the figure into the script's output is the server-side part of sending it
+    with timer('chart_send'):
+        st.plotly_chart(fig, use_container_width=True)
     st.markdown('<hr class="chart-line">', unsafe_allow_html=True)
 year_colors = {
     "2023": "#F57411",  # Orange
@@ -92,12 +194,48 @@ year_colors = {
 }
 years = [2023,2024,2025]
 
+# Finished figures keyed by (data fingerprint, chart spec): a repeat view or a filter
+# round trip back to an earlier selection skips melt + px.line + update_layout entirely.
+# Cached figures are shared, so callers must not modify them.
+_figure_cache = BoundedLRU(maxsize=256)
+register_cache('figures', _figure_cache)
+_dark_layout = None
+
+def dark_layout():
+    """Shared dark-theme layout settings, resolved once instead of per figure"""
+    global _dark_layout
+    if _dark_layout is None:
+        _dark_layout = dict(
+            template=pio.templates["plotly_dark"],
+            plot_bgcolor="rgba(0,0,0,0)",
+            paper_bgcolor="rgba(0,0,0,0)",
+        )
+    return _dark_layout
+
+
+def cached_figure(df, spec, build):
+    """build() once per (content of df, spec) and reuse the figure afterwards"""
+    key = (fingerprint(df), spec)
+    return _figure_cache.get_or_compute(key, lambda: _timed_build(build))
+
+
 def create_metric_chart(df, month_prefix,metric_prefix,y_label , chart_title):
     # Select columns that match this metric
     # value_cols = [col for col in df.columns if col.startswith(metric_prefix)]
     value_cols=[]
     for yrs in years:
         value_cols.append(metric_prefix+f'_{yrs}')
+    spec = ('metric_chart', month_prefix, metric_prefix, y_label, chart_title)
+    return cached_figure(df[[month_prefix] + value_cols], spec,
+                         lambda: _build_metric_chart(df, month_prefix, value_cols, y_label, chart_title))
+
+
+def _timed_build(build):
+    with timer('figure_build'):
+        return build()
+
+
+def _build_metric_chart(df, month_prefix, value_cols, y_label, chart_title):
     # Melt dataframe
     df_melted = df.melt(
         id_vars=month_prefix,
@@ -125,10 +263,35 @@ def create_metric_chart(df, month_prefix,metric_prefix,y_label , chart_title):
             "yanchor": "top",
             "font": {"size": 22}
             },
-        template="plotly_dark",
-        plot_bgcolor="rgba(0,0,0,0)",
-        paper_bgcolor="rgba(0,0,0,0)",
         hovermode="x unified",
+        **dark_layout(),
+    )
+    return fig
+
+
+def create_time_chart(df, y_label, chart_title, max_points=MAX_POINTS):
+    """Daily / weekly trend chart from a SqlTrends.series block (period, Year, value):
+    one line per year, downsampled to max_points, WebGL past WEBGL_POINTS"""
+    spec = ('time_chart', y_label, chart_title, max_points)
+    return cached_figure(df[['period', 'Year', 'value']], spec,
+                         lambda: _build_time_chart(df, y_label, chart_title, max_points))
+
+
+def _build_time_chart(df, y_label, chart_title, max_points):
+    groups = list(df.groupby('Year', sort=True))
+    budget = max(3, max_points // max(1, len(groups)))
+    lines = [(year, downsample(group, 'period', 'value', budget)) for year, group in groups]
+    n_points = sum(len(line) for _, line in lines)
+    trace = go.Scattergl if n_points > WEBGL_POINTS else go.Scatter
+    mode = 'lines' if n_points > 200 else 'lines+markers'
+    fig = go.Figure([trace(x=line['period'], y=line['value'], name=str(year), mode=mode,
+                           line={'color': year_colors.get(str(year))}) for year, line in lines])
+    fig.update_layout(
+        title={"text": f"{chart_title}", "x": 0.5, "xanchor": "center", "yanchor": "top", "font": {"size": 22}},
+        yaxis_title=y_label,
+        legend_title="Year",
+        hovermode="x unified",
+        **dark_layout(),
     )
     return fig
 ## Helper function to add styled headings
@@ -172,53 +335,11 @@ def add_gsheet_link(url, text="View Full Pivot Data"):
     </div>
     """
     st.markdown(html, unsafe_allow_html=True)
-kpis_metrics_definition = read_from_gsheets('1wZmKXpk0nXaQb1aNvzjb-PFkVlpqvOc8Lj4_o49oso4','Kpi_Metrics_definition')
-@st.cache_data
-def calc_avg(df ,selected_products):
-    df_f = df[df["product_code"].isin(selected_products)]
-    if df_f.empty:
-        return None
-    col_para_n = ""
-    col_para_d = ""
-    if df_f["Parameter"].iloc[0] == "Score Gain":
-        col_para_n = "total_diff_score"
-        col_para_d = "total_eid"
-    elif df_f["Parameter"].iloc[0] == "Avg Activity / User":
-        col_para_n = "total_sequence_name"
-        col_para_d = "total_eid"
-    elif df_f["Parameter"].iloc[0] == "Avg Questions Answered / User":
-        col_para_n = "total_total_scored_items_answered"
-        col_para_d = "total_eid"
-    elif df_f["Parameter"].iloc[0] == "Avg Tests / User":
-        col_para_n = "total_sequence_name"
-        col_para_d = "total_eid"
-
-    for c in [f'{col_para_n}_24', f'{col_para_d}_24', f'{col_para_n}_25', f'{col_para_d}_25']:
-        df_f[c] = pd.to_numeric(df_f[c], errors='coerce')
-
-    v2024 = df_f[f'{col_para_n}_24'].sum() / df_f[f'{col_para_d}_24'].sum()
-    v2025 = df_f[f'{col_para_n}_25'].sum() / df_f[f'{col_para_d}_25'].sum()
-    title = df_f["Parameter"].iloc[0]
-    return title, v2024, v2025
-
-@st.cache_data
-def calc_active_users(df , selected_products):
-    df_f = df[df["product_code"].isin(selected_products)]
-    if df_f.empty:
-        return None
-    for c in ['total_active_user_24', 'total_active_user_25']:
-        df_f[c] = pd.to_numeric(df_f[c], errors='coerce')
-    v2024 = df_f["total_active_user_24"].sum()  
-    v2025 = df_f["total_active_user_25"].sum()  
-    title = df_f["Parameter"].iloc[0]
-    return title, v2024, v2025
-
-@st.cache_data
 def get_req_filtered_df(df_in, prod_code , param_col,agg_col):
     filtered_df = df_in[df_in['product_code'].isin(prod_code)]
-    final_df = pd.DataFrame(df_in['Expiry_month'].unique(), columns=['Expiry_month'])
+    final_df = pd.DataFrame(df_in['Expiry_month'].dropna().unique(), columns=['Expiry_month'])
     for yrs in years:
-        agg_df = filtered_df.groupby(['Expiry_month']).agg({
+        agg_df = filtered_df.groupby(['Expiry_month'], observed=True).agg({
             f'kbs_enrollment_id_{yrs}':'sum',
             f'{agg_col}_{yrs}':'sum',
         }).reset_index()
@@ -227,12 +348,11 @@ def get_req_filtered_df(df_in, prod_code , param_col,agg_col):
     final_df = final_df.fillna(0)
     return final_df
 
-@st.cache_data
 def get_req_filtered_df_scores(df_in, prod_code , agg_month,param_col,agg_col,prefix_name):
     filtered_df = df_in[df_in['product_code'].isin(prod_code)]
-    final_df = pd.DataFrame(df_in[agg_month].unique(), columns=[agg_month])
+    final_df = pd.DataFrame(df_in[agg_month].dropna().unique(), columns=[agg_month])
     for yrs in years:
-        agg_df = filtered_df.groupby([agg_month]).agg({
+        agg_df = filtered_df.groupby([agg_month], observed=True).agg({
             f'{prefix_name}_score_kbs_enrollment_id_{yrs}':'sum',
             f'{prefix_name}_{agg_col}_{yrs}':'sum',
         }).reset_index()
@@ -244,9 +364,9 @@ def get_req_filtered_df_scores(df_in, prod_code , agg_month,param_col,agg_col,pr
 
 def get_req_filtered_df_act_ques_pt(df_in, prod_code , agg_month,param_col,agg_col):
     filtered_df = df_in[df_in['product_code'].isin(prod_code)]
-    final_df = pd.DataFrame(df_in[agg_month].unique(), columns=[agg_month])
+    final_df = pd.DataFrame(df_in[agg_month].dropna().unique(), columns=[agg_month])
     for yrs in years:
-        agg_df = filtered_df.groupby([agg_month]).agg({
+        agg_df = filtered_df.groupby([agg_month], observed=True).agg({
             f'{param_col}_kbs_enrollment_id_{yrs}':'sum',
             f'{param_col}_{agg_col}_{yrs}':'sum',
         }).reset_index()
@@ -256,72 +376,43 @@ def get_req_filtered_df_act_ques_pt(df_in, prod_code , agg_month,param_col,agg_c
     final_df = final_df.replace(0,'')
     return final_df
 
-def build_cards_html(registry , selected_products):
-    cards = []
-  
-    for item in registry:
-        df = item["df"]
-        calc = item["calc"]
-        tool_tip_text = item.get("Tooltip_text")
-        print("Tooltip text in build cards html", tool_tip_text)
-        result = calc(df , selected_products)
-        if result is None:
-            # optional: show a placeholder card for empty result
-            continue
-        title, v2024, v2025 = result
-
-        try:
-            change = float(v2025) - float(v2024)
-        except Exception:
-            change = 0.0
-
+def fmt_kpi(x):
+    """Display format for a KPI value"""
+    if pd.isna(x):
+        return "—"
+    if abs(float(x)) >= 1000:
+        return f"{(float(x)):,.0f}"
+    return f"{float(x):.1f}" if isinstance(x, (int,float,np.floating)) else str(x)
+
+def build_cards_html(cards, definitions):
+    """HTML for cards computed by KpiEngine.compute; definitions is a {KPI_Metrics: Definition} index"""
+    html_cards = []
+    for card in cards:
+        change = card["change"]
         arrow = "🔼" if change >= 0 else "🔻"
         change_class = "positive" if change >= 0 else "negative"
-
-        # Format display values (choose formatting per KPI type)
-        def fmt(x):
-            if pd.isna(x):
-                return "—"
-            # for percentages you might format differently, but keep generic here
-            if abs(float(x)) >= 1000:
-                return f"{(float(x)):,.0f}"
-            return f"{float(x):.1f}" if isinstance(x, (int,float,np.floating)) else str(x)
-        KPIs_def = ''
-        if title == 'Score Gain':
-            KPIs_def = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Score Gain', 'Definition'].iloc[0]
-        elif title == 'Avg Activity / User':
-            KPIs_def = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Activity / User', 'Definition'].iloc[0]   
-        elif title == 'Active Users':
-            KPIs_def = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Active Users', 'Definition'].iloc[0]
-        elif title == 'Avg Questions Answered / User':
-            KPIs_def = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Questions Answered / User', 'Definition'].iloc[0]
-        elif title == 'Avg Tests / User':
-            KPIs_def = kpis_metrics_definition.loc[kpis_metrics_definition['KPI_Metrics'] == 'Avg Tests / User', 'Definition'].iloc[0]
-        else:
-            KPIs_def = "Somethig went wrong"
+        values_html = "\n    ".join(f'<p class="kpi-value">{label}: {fmt_kpi(v)}</p>' for label, v in card["values"])
         card_html = f"""
 <div class="kpi-card">
     <div class="kpi-section">
     <div class="kpi-title">
-        {title}
+        {card["title"]}
         <span class="tooltip">
             ℹ️
             <span class="tooltiptext">
-                {tool_tip_text}
+                {definitions.get(card["metric"], "")}
             </span>
         </span>
     </div>
-    <p class="kpi-value">2024: {fmt(v2024)}</p>
-    <p class="kpi-value">2025: {fmt(v2025)}</p>
-    <div class="kpi-change {change_class}">{arrow} {fmt(change)}</div>
+    {values_html}
+    <div class="kpi-change {change_class}">{arrow} {fmt_kpi(change)}</div>
     </div>
     </div>
 """
-
-        cards.append(card_html.strip())
+        html_cards.append(card_html.strip())
 
     # Join cards cleanly without extra newlines or spaces
-    return "\n".join(cards)
+    return "\n".join(html_cards)
 
 
     html = f"""
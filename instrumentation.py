@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Timings, counters and cache hit rates for the dashboard hot paths, plus the logging
+# setup every module uses instead of print.
+#   timer('sheet_fetch'), timer('section', section='score_gain')   wall time per call
+#   incr('snapshot_hits', 3)                                        counters
+#   register_cache('figures', cache)                                hits / misses / size of a BoundedLRU
+# Everything lives in this process; read it with snapshot() (the sidebar debug panel) or
+# prometheus_text() (Prometheus text format, also written to MCAT_METRICS_FILE if set).
+#
+# Log level comes from MCAT_LOG_LEVEL (default WARNING); debug lines use lazy %-formatting,
+# so they cost a level check when disabled.
+
+LOG_LEVEL = os.environ.get('MCAT_LOG_LEVEL', 'WARNING').upper()
+METRICS_FILE = os.environ.get('MCAT_METRICS_FILE')
+PREFIX = 'mcat'
+
+_configured = False
+
+
+def get_logger(name):
+    """Logger under the 'mcat' namespace, configured on first use"""
+    global _configured
+    if not _configured:
+        root = logging.getLogger(PREFIX)
+        if not root.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+            root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+        _configured = True
+    return logging.getLogger(f'{PREFIX}.{name}')
+
+
+log = get_logger('metrics')
+
+_lock = threading.Lock()
+_timings = {}   # (name, labels) -> [count, total seconds, max seconds, last seconds]
+_counters = {}  # (name, labels) -> value
+_caches = {}    # name -> object with hits / misses / __len__
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    """Record one timing"""
+    key = _key(name, labels)
+    with _lock:
+        entry = _timings.get(key)
+        if entry is None:
+            _timings[key] = [1, seconds, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] = seconds
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('%s %s %.1f ms', name, dict(labels) or '', seconds * 1000)
+
+
+@contextmanager
+def timer(name, **labels):
+    """Time the body of a with block (recorded even if it raises)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def incr(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def register_cache(name, cache):
+    """Report a cache's hits / misses / size under `name` (re-registering replaces it)"""
+    with _lock:
+        _caches[name] = cache
+
+
+def reset():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+
+
+def snapshot():
+    """{'timings': [...], 'counters': [...], 'caches': [...]} as plain rows"""
+    with _lock:
+        timings = [{'name': n, 'labels': dict(l), 'count': c, 'total_s': t, 'mean_ms': t / c * 1000,
+                    'max_ms': m * 1000, 'last_ms': last * 1000}
+                   for (n, l), (c, t, m, last) in sorted(_timings.items())]
+        counters = [{'name': n, 'labels': dict(l), 'value': v} for (n, l), v in sorted(_counters.items())]
+        caches = dict(_caches)
+    cache_rows = []
+    for name, cache in sorted(caches.items()):
+        total = cache.hits + cache.misses
+        cache_rows.append({'name': name, 'hits': cache.hits, 'misses': cache.misses, 'entries': len(cache),
+                           'hit_rate': cache.hits / total if total else None})
+    return {'timings': timings, 'counters': counters, 'caches': cache_rows}
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for v in labels.values())
+    return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+
+def prometheus_text():
+    """Every metric in the Prometheus text exposition format"""
+    snap = snapshot()
+    lines = []
+    seen = set()
+
+    def header(metric, kind, help_text):
+        if metric not in seen:
+            seen.add(metric)
+            lines.extend([f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}'])
+
+    for row in snap['timings']:
+        metric = f"{PREFIX}_{row['name']}_seconds"
+        header(metric, 'summary', f"Wall time of {row['name']}")
+        lines.append(f"{metric}_count{_labels(row['labels'])} {row['count']}")
+        lines.append(f"{metric}_sum{_labels(row['labels'])} {row['total_s']:.6f}")
+    for row in snap['timings']:
+        metric = f"{PREFIX}_{row['name']}_max_seconds"
+        header(metric, 'gauge', f"Slowest {row['name']} so far")
+        lines.append(f"{metric}{_labels(row['labels'])} {row['max_ms'] / 1000:.6f}")
+    for row in snap['counters']:
+        metric = f"{PREFIX}_{row['name']}_total"
+        header(metric, 'counter', row['name'].replace('_', ' '))
+        lines.append(f"{metric}{_labels(row['labels'])} {row['value']}")
+    for kind in ('hits', 'misses'):
+        metric = f'{PREFIX}_cache_{kind}_total'
+        for row in snap['caches']:
+            header(metric, 'counter', f'Cache {kind}')
+            lines.append(f"{metric}{_labels({'cache': row['name']})} {row[kind]}")
+    for row in snap['caches']:
+        header(f'{PREFIX}_cache_entries', 'gauge', 'Entries held by the cache')
+        lines.append(f"{PREFIX}_cache_entries{_labels({'cache': row['name']})} {row['entries']}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path=METRICS_FILE):
+    """Write prometheus_text() to path (atomically; no-op without a path)"""
+    if not path:
+        return
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
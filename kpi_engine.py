@@ -0,0 +1,109 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# KPI cards for the KPIs_sheet / KPIs_sheet_tll_PM tabs. Each card block of a tab is
+# summed into one [product x measure] matrix at load (DatasetRegistry builds a KpiEngine
+# per KPI tab), so a product selection computes
+# every card of the tab (every year) with a single mask @ matrix product instead of an
+# isin + sum per card.
+
+
+KPI_TABS = ['KPI_data_all', 'KPI_data_Pm_all']
+
+
+def kpi_card(key, cols, metric, num, den=None):
+    """One KPI card of a KPI tab.
+
+    cols: (start, stop) column slice of the card's block in the tab
+    metric: KPI_Metrics name of the card (title fallback and tooltip lookup)
+    num / den: column prefixes; the card shows sum(num) / sum(den), or sum(num) without den
+    """
+    return {'key': key, 'cols': cols, 'metric': metric, 'num': num, 'den': den}
+
+
+KPI_CARDS = [
+    kpi_card('score_gain', (0, 6), 'Score Gain', 'total_diff_score', 'total_eid'),
+    kpi_card('act_per_user', (7, 13), 'Avg Activity / User', 'total_sequence_name', 'total_eid'),
+    kpi_card('active_user', (14, 18), 'Active Users', 'total_active_user'),
+    kpi_card('ques_ans', (19, 25), 'Avg Questions Answered / User', 'total_total_scored_items_answered', 'total_eid'),
+    kpi_card('test_per_user', (26, 32), 'Avg Tests / User', 'total_sequence_name', 'total_eid'),
+]
+
+
+def definition_index(kpis_metrics_definition):
+    """{KPI_Metrics: Definition}; the first row wins, like the old .loc[...].iloc[0] lookups"""
+    defs = kpis_metrics_definition.drop_duplicates('KPI_Metrics')
+    return dict(zip(defs['KPI_Metrics'], defs['Definition']))
+
+
+def _year_suffixes(frame, prefix):
+    pattern = re.compile(rf'^{re.escape(prefix)}_(\d{{2}})$')
+    return sorted({m.group(1) for m in map(pattern.match, map(str, frame.columns)) if m})
+
+
+class KpiEngine:
+    def __init__(self, df, cards=KPI_CARDS):
+        frames = [df.iloc[:, card['cols'][0]:card['cols'][1]] for card in cards]
+        self.products = pd.Index(pd.unique(np.concatenate(
+            [f['product_code'].dropna().astype(str).to_numpy() for f in frames])))
+        self.cards = []
+        columns = []  # one (card, year, measure) per matrix column
+        for card, frame in zip(cards, frames):
+            parameter = frame['Parameter'].dropna().astype(str)
+            years = _year_suffixes(frame, card['num'])
+            self.cards.append(dict(card, frame=frame, years=years,
+                                   title=parameter.iloc[0] if len(parameter) else card['metric']))
+            columns.append((card['key'], None, 'rows'))
+            for yr in years:
+                columns.append((card['key'], yr, 'num'))
+                if card['den']:
+                    columns.append((card['key'], yr, 'den'))
+        self.columns = {col: i for i, col in enumerate(columns)}
+
+        self.matrix = np.zeros((len(self.products), len(columns)))
+        for card in self.cards:
+            frame = card['frame']
+            p = self.products.get_indexer(frame['product_code'].astype(str))
+            valid = (p >= 0) & frame['product_code'].notna().to_numpy()
+            np.add.at(self.matrix[:, self.columns[(card['key'], None, 'rows')]], p[valid], 1)
+            for yr in card['years']:
+                for measure in ('num', 'den'):
+                    if not card[measure]:
+                        continue
+                    values = frame[f"{card[measure]}_{yr}"]
+                    values = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=0.0)
+                    np.add.at(self.matrix[:, self.columns[(card['key'], yr, measure)]], p[valid], values[valid])
+            del card['frame']
+        self.matrix.setflags(write=False)  # shared by every session of the process
+
+    def compute(self, selected_products):
+        """Every card for a product selection, in KPI_CARDS order.
+
+        Returns [{'key', 'metric', 'title', 'values': [(year label, value)], 'change'}];
+        cards with no rows for the selection are left out.
+        """
+        mask = self.products.isin(list(selected_products)).astype(np.float64)
+        totals = mask @ self.matrix
+        cards = []
+        for card in self.cards:
+            if totals[self.columns[(card['key'], None, 'rows')]] == 0:
+                continue
+            values = []
+            for yr in card['years']:
+                value = totals[self.columns[(card['key'], yr, 'num')]]
+                if card['den']:
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        value = np.float64(value) / totals[self.columns[(card['key'], yr, 'den')]]
+                values.append((f"20{yr}", value))
+            change = float(values[-1][1]) - float(values[-2][1]) if len(values) > 1 else 0.0
+            cards.append({'key': card['key'], 'metric': card['metric'], 'title': card['title'],
+                          'values': values, 'change': change})
+        return cards
+
+
+def memoized_cards(registry, tab_key, selected_products):
+    """KpiEngine.compute for a DatasetRegistry tab, memoized per dataset version and selection"""
+    engine = registry.engines[tab_key]
+    return registry.memoize(tab_key, 'kpi_cards', selected_products, lambda: engine.compute(selected_products))
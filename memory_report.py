@@ -0,0 +1,142 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Memory used by the data one dashboard process holds: the loaded tabs, the aggregation
+# cubes and the memoized results / figures. All of it is shared by every session of the
+# process, so a host's capacity is roughly
+#   replicas = host memory / process RSS,  sessions per replica bounded by CPU, not memory
+# Shown in the app (sidebar > Memory usage) or from the command line:
+#
+#   python memory_report.py          # raw vs compacted size of every tab (MCAT_DATA_SOURCE)
+#   python memory_report.py --source parquet:data/tabs
+#   python memory_report.py --json
+
+
+def deep_size(obj, seen=None):
+    """Approximate bytes held by obj and everything it references (shared objects once)"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        # views share their base's buffer; count it once, through the base
+        return deep_size(obj.base, seen) if obj.base is not None else obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(v, seen) for v in obj)
+    elif hasattr(obj, 'to_plotly_json'):  # plotly figures
+        size += deep_size(obj.to_plotly_json(), seen)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def _cache_rows(name, cache, dataset_of=None):
+    # One row per dataset the entries belong to (keys start with a dataset version)
+    groups = {}
+    for key, value in cache.items():
+        owner = dataset_of.get(key[0], 'other') if dataset_of else 'all'
+        entry = groups.setdefault(owner, [0, 0])
+        entry[0] += 1
+        entry[1] += deep_size(value)
+    rows = [{'kind': 'cache', 'name': f'{name}:{owner}', 'bytes': size, 'entries': count}
+            for owner, (count, size) in sorted(groups.items())]
+    total = cache.hits + cache.misses
+    rows.append({'kind': 'cache', 'name': f'{name} (total)', 'bytes': sum(r['bytes'] for r in rows),
+                 'entries': len(cache), 'hit_rate': round(cache.hits / total, 3) if total else None})
+    return rows
+
+
+def report(registry, caches=None):
+    """[{'kind', 'name', 'bytes', 'entries'}] for the datasets, cubes and caches of a
+    DatasetRegistry, plus any extra {name: BoundedLRU} caches (e.g. figures)"""
+    rows = [{'kind': 'dataset', 'name': key, 'bytes': deep_size(df), 'entries': len(df)}
+            for key, df in registry.datasets.items()]
+    rows += [{'kind': 'cube', 'name': key, 'bytes': deep_size(cube), 'entries': len(cube.blocks)}
+             for key, cube in registry.cubes.items()]
+    dataset_of = {version: key for key, version in registry.versions.items()}
+    rows += _cache_rows('memo', registry.cache, dataset_of)
+    for name, cache in (caches or {}).items():
+        rows += _cache_rows(name, cache)
+    return rows
+
+
+def process_rss():
+    """Resident set size of this process in bytes (None where it cannot be read)"""
+    try:
+        with open('/proc/self/status', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # peak, not current
+    except (ImportError, OSError):
+        return None
+
+
+def fmt_bytes(n):
+    if n is None:
+        return 'n/a'
+    if n < 1024:
+        return f'{n} B'
+    for unit in ('KB', 'MB', 'GB'):
+        n /= 1024
+        if n < 1024 or unit == 'GB':
+            return f'{n:.1f} {unit}'
+
+
+def summary(rows):
+    """Totals per kind plus the process RSS"""
+    totals = {}
+    for row in rows:
+        if not row['name'].endswith('(total)'):
+            totals[row['kind']] = totals.get(row['kind'], 0) + row['bytes']
+    return dict(totals, shared=sum(totals.values()), rss=process_rss())
+
+
+def compaction_report(raw):
+    """Per tab: bytes as read from the data source vs after apply_schemas"""
+    from sheet_schemas import apply_schemas
+    compact = apply_schemas(raw)
+    return [{'name': key, 'rows': len(df), 'raw_bytes': deep_size(df), 'compact_bytes': deep_size(compact[key])}
+            for key, df in raw.items()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory used by the dashboard tabs, raw vs compacted")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    parser.add_argument('--source', help="where to read the tabs from (default: MCAT_DATA_SOURCE)")
+    args = parser.parse_args(argv)
+
+    import data_sources
+    from helper_function import DASHBOARD_TABS
+    # read the way app.load_data does; compaction_report applies the schemas
+    rows = compaction_report(data_sources.get_source(args.source).read_tabs(DASHBOARD_TABS))
+    if args.json:
+        print(json.dumps({'tabs': rows, 'rss': process_rss()}, indent=2))
+        return
+    width = max(len(r['name']) for r in rows)
+    print(f"{'tab':<{width}}  {'rows':>6}  {'raw':>10}  {'compact':>10}")
+    for r in rows:
+        print(f"{r['name']:<{width}}  {r['rows']:>6}  {fmt_bytes(r['raw_bytes']):>10}  {fmt_bytes(r['compact_bytes']):>10}")
+    raw, compact = sum(r['raw_bytes'] for r in rows), sum(r['compact_bytes'] for r in rows)
+    print(f"{'total':<{width}}  {'':>6}  {fmt_bytes(raw):>10}  {fmt_bytes(compact):>10}")
+    print(f"process RSS: {fmt_bytes(process_rss())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from chart_blocks import CHART_TABS, select_blocks, tab_figures
+from instrumentation import get_logger, incr, timer
+from kpi_engine import KPI_TABS, memoized_cards
+from selections import SAVED_SELECTIONS, load_saved_selections
+
+# Cache warm-up after every successful data load. The memo cache (KPI cards, trend
+# blocks) and the figure cache are keyed by dataset version, so a refresh that changes a
+# tab leaves its first viewers computing everything cold. Right after the new registry
+# is swapped in, Prewarmer runs the same calls a page view makes (memoized_cards,
+# select_blocks, tab_figures) on a small thread pool, for:
+#   1. all products (the default "All Products Selected" view)
+#   2. the saved selections (selections.py)
+#   3. the MCAT_PREWARM_TOP selections viewed most often since the process started
+# A newer load cancels what is left of an older warm-up.
+
+PREWARM_TOP = int(os.environ.get('MCAT_PREWARM_TOP', 5))
+PREWARM_WORKERS = int(os.environ.get('MCAT_PREWARM_WORKERS', 2))
+
+log = get_logger('prewarm')
+
+
+def all_products(registry):
+    return registry['product_code_df']['product_code'].dropna().unique().tolist()
+
+
+def warm_selection(registry, products, trends=None, tabs=CHART_TABS, kpi_tabs=KPI_TABS):
+    """Compute and cache what a page view of `products` needs: KPI cards, trend blocks, figures"""
+    for tab_key in kpi_tabs:
+        memoized_cards(registry, tab_key, products)
+    for tab in tabs:
+        tab_figures(tab, select_blocks(registry, tab['key'], products, trends))
+
+
+def selections_to_warm(registry, recent=None, saved=None, top=PREWARM_TOP):
+    """All products, then the saved selections, then the most viewed ones; no repeats"""
+    candidates = [all_products(registry)] + list((saved or {}).values())
+    if recent is not None:
+        candidates += recent.most_common(top)
+    known = set(all_products(registry))
+    seen, result = set(), []
+    for products in candidates:
+        products = [p for p in products if p in known]
+        key = frozenset(products)
+        if products and key not in seen:
+            seen.add(key)
+            result.append(products)
+    return result
+
+
+class Prewarmer:
+    def __init__(self, recent=None, trends=None, workers=PREWARM_WORKERS, top=PREWARM_TOP,
+                 saved_path=SAVED_SELECTIONS):
+        """recent: selections.RecentSelections fed by the page views
+        trends: SqlTrends when the charts read the fact database
+        workers: selections warmed at once
+        """
+        self.recent = recent
+        self.trends = trends
+        self.workers = workers
+        self.top = top
+        self.saved_path = saved_path
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def warm(self, registry, generation=None):
+        """Warm every selection on a pool of `workers` threads; returns the number warmed"""
+        selections = selections_to_warm(registry, self.recent, load_saved_selections(self.saved_path), self.top)
+
+        def run(products):
+            if generation is not None and generation != self._generation:
+                return False  # a newer load took over
+            try:
+                warm_selection(registry, products, self.trends)
+                return True
+            except Exception as e:
+                incr('prewarm_errors')
+                log.warning("Warming a %d product selection failed: %s", len(products), e)
+                return False
+
+        with timer('prewarm'), ThreadPoolExecutor(max_workers=max(1, self.workers),
+                                                  thread_name_prefix='prewarm') as pool:
+            warmed = sum(pool.map(run, selections))
+        incr('prewarm_selections', warmed)
+        log.info("Warmed %d of %d selections", warmed, len(selections))
+        return warmed
+
+    def schedule(self, registry):
+        """Warm `registry` on a background thread (the DataManager on_load hook)"""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        threading.Thread(target=self.warm, args=(registry, generation), name='prewarm', daemon=True).start()
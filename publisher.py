@@ -0,0 +1,184 @@
+import hashlib
+import json
+import math
+import os
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from pygsheets import Address
+
+# Diff-based writer for publishing DataFrames to the dashboard spreadsheet. Blocks are
+# staged with add() and written by publish():
+#   1. blocks whose content hash matches the last publish are skipped outright
+#   2. one metadata read; missing worksheets are added and small ones grown in one
+#      structure batchUpdate
+#   3. one values.batchGet of what is currently published in the changed blocks
+#   4. one values.batchUpdate across all tabs with only the rows that differ
+# Nothing is cleared first: leftover cells of a shrinking tab are overwritten with blanks
+# in the same request, so readers never see a half-written tab.
+
+PUBLISH_STATE = os.environ.get('MCAT_PUBLISH_STATE', '.publish_state.json')
+
+
+def _cell(value):
+    # JSON-safe scalar for the Sheets API (NaN -> '', like set_dataframe(nan=''))
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NaT or value is pd.NA:
+        return ''
+    if isinstance(value, float) and math.isnan(value):
+        return ''
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return str(value)
+    if isinstance(value, (int, float, str, bool)):
+        return value
+    return str(value)
+
+
+def frame_values(df):
+    """Header row + data rows of df as a cell matrix"""
+    return [[str(c) for c in df.columns]] + [[_cell(v) for v in row] for row in df.itertuples(index=False)]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def same_cell(a, b):
+    """Compare an outgoing cell with an UNFORMATTED_VALUE cell read back from Sheets"""
+    if _is_number(a) and _is_number(b):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return str(a) == str(b)
+
+
+def _hash(values):
+    return hashlib.blake2b(json.dumps(values, default=str).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _a1(tab, row, col, end_row, end_col):
+    quoted = "'" + tab.replace("'", "''") + "'"
+    return f"{quoted}!{Address((row, col)).label}:{Address((end_row, end_col)).label}"
+
+
+def changed_row_runs(new, old, width):
+    """(first, last) 0-based row index runs where new and old differ (old padded with '')"""
+    runs, start = [], None
+    for i, row in enumerate(new):
+        current = old[i] if i < len(old) else []
+        differs = any(not same_cell(row[j], current[j] if j < len(current) else '') for j in range(width))
+        if differs and start is None:
+            start = i
+        elif not differs and start is not None:
+            runs.append((start, i - 1))
+            start = None
+    if start is not None:
+        runs.append((start, len(new) - 1))
+    return runs
+
+
+class SheetPublisher:
+    def __init__(self, sheet_id, client=None, state_path=PUBLISH_STATE):
+        """client: SheetsClient to write through (default: helper_function.sheets)"""
+        if client is None:
+            from helper_function import sheets as client
+        self.sheet_id = sheet_id
+        self.client = client
+        self.state_path = state_path
+        self.blocks = []
+
+    def add(self, tab, df, start_cell=None):
+        """Stage a block. start_cell=None replaces the whole tab from A1 (cells past the new
+        data are blanked); with a start cell only the block's own cells are written."""
+        self.blocks.append({'tab': tab, 'values': frame_values(df), 'start': start_cell or 'A1',
+                            'whole_tab': start_cell is None})
+        return self
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get(self.sheet_id, {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, hashes):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state[self.sheet_id] = hashes
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def _ensure_grids(self, blocks):
+        # Add missing worksheets and grow small ones in one structure request
+        props = self.client.sheet_properties(self.sheet_id)
+        requests = []
+        for tab in dict.fromkeys(b['tab'] for b in blocks):
+            rows = max(b['row'] + len(b['values']) - 1 for b in blocks if b['tab'] == tab)
+            cols = max(b['col'] + b['width'] - 1 for b in blocks if b['tab'] == tab)
+            if tab not in props:
+                requests.append({'addSheet': {'properties': {
+                    'title': tab, 'gridProperties': {'rowCount': rows + 10, 'columnCount': cols + 10}}}})
+                continue
+            grid = props[tab].get('gridProperties', {})
+            if grid.get('rowCount', 0) < rows or grid.get('columnCount', 0) < cols:
+                requests.append({'updateSheetProperties': {
+                    'properties': {'sheetId': props[tab]['sheetId'], 'gridProperties': {
+                        'rowCount': max(rows, grid.get('rowCount', 0)),
+                        'columnCount': max(cols, grid.get('columnCount', 0))}},
+                    'fields': 'gridProperties(rowCount,columnCount)'}})
+        if requests:
+            self.client.batch_update(self.sheet_id, requests)
+        return {tab for tab in dict.fromkeys(b['tab'] for b in blocks) if tab not in props}
+
+    def publish(self, force=False):
+        """Write every staged block that changed; returns a summary dict"""
+        state = self._load_state()
+        hashes = dict(state)
+        pending = []
+        for block in self.blocks:
+            key = f"{block['tab']}!{block['start']}"
+            hashes[key] = _hash(block['values'])
+            if force or state.get(key) != hashes[key]:
+                addr = Address(block['start'])
+                block.update(key=key, row=addr.row, col=addr.col, width=max(len(r) for r in block['values']))
+                pending.append(block)
+        summary = {'blocks': len(self.blocks), 'skipped': len(self.blocks) - len(pending), 'ranges': 0, 'cells': 0}
+        if not pending:
+            return summary
+
+        new_tabs = self._ensure_grids(pending)
+        # What is published right now; whole-tab blocks read the full tab to find leftovers
+        readable = [b for b in pending if b['tab'] not in new_tabs]
+        ranges = ["'" + b['tab'].replace("'", "''") + "'" if b['whole_tab'] else
+                  _a1(b['tab'], b['row'], b['col'], b['row'] + len(b['values']) - 1, b['col'] + b['width'] - 1)
+                  for b in readable]
+        current = dict(zip((b['key'] for b in readable),
+                           self.client.values_batch_get(self.sheet_id, ranges, render='UNFORMATTED_VALUE')
+                           if ranges else []))
+
+        data = []
+        for block in pending:
+            old = current.get(block['key'], {}).get('values', [])
+            new, width = block['values'], block['width']
+            if block['whole_tab'] and old:
+                # Blank whatever the previous publish left beyond the new data
+                width = max(width, max(len(r) for r in old))
+                new = new + [[]] * (len(old) - len(new))
+            new = [list(r) + [''] * (width - len(r)) for r in new]
+            for first, last in changed_row_runs(new, old, width):
+                data.append({'range': _a1(block['tab'], block['row'] + first, block['col'],
+                                          block['row'] + last, block['col'] + width - 1),
+                             'majorDimension': 'ROWS', 'values': new[first:last + 1]})
+                summary['cells'] += (last - first + 1) * width
+        if data:
+            self.client.values_batch_update(self.sheet_id, data)
+        summary['ranges'] = len(data)
+        self._save_state(hashes)
+        summary['published_at'] = time.time()
+        return summary
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# Score picks behind the score gain and full length tabs. The notebook ran
+# groupby(...).idxmin()/idxmax() + .loc once per year, window and exam; here the practice
+# test and KFL attempts are sorted once by (enrollment, date_created) and every pick is read
+# off that order in one vectorized pass. The result is a compact table with one row per
+# (enrollment, pick):
+#   <exam label>  first attempt of that full length exam (AAMC1 is the "first score")
+#   max           best scaled score over the practice tests other than AAMC1
+#   latest        most recent practice test
+# plus n_pt, the enrollment's number of distinct practice tests ('# of PT').
+
+AAMC1 = "MCAT Official Prep Practice Exam 1"
+
+# Full length exams on the 'Monthly Full Length Engagement_metrics' tab, in sheet order
+FL_EXAMS = {
+    'AAMC1': ('scores', [AAMC1]),
+    'KFL1': ('kfl', ['mcat22-fl-1-full', 'mcat-fl-1-1b6e4']),
+    'KFL2': ('kfl', ['mcat22-fl-2-full', 'mcat-fl-2-1b6e5']),
+    'KFL3': ('kfl', ['mcat22-fl-3-full', 'mcat-fl-3-1b6e6']),
+    'AAMC2': ('scores', ["MCAT Official Prep Practice Exam 2"]),
+    'AAMC3': ('scores', ["MCAT Official Prep Practice Exam 3"]),
+    'AAMC4': ('scores', ["MCAT Official Prep Practice Exam 4"]),
+    'AAMC5': ('scores', ["MCAT Official Prep Free Practice Exam (Scored)"]),
+}
+FIRST = 'AAMC1'
+MAX = 'max'
+LATEST = 'latest'
+PICKS = list(FL_EXAMS) + [MAX, LATEST]
+
+PICK_COLUMNS = ['kbs_enrollment_id', 'product_code', 'enroll_exp_date', 'Expiry_year', 'Expiry_month',
+                'Activity_year', 'Activity_month', 'date_created', 'date_completed', 'scaled_score']
+
+
+def _events(scores, kfl):
+    # Practice test + KFL attempts with their exam code (-1: not a full length exam)
+    parts = []
+    for source, df in (('scores', scores), ('kfl', kfl)):
+        exam_of = {name: i for i, (label, (src, names)) in enumerate(FL_EXAMS.items()) if src == source
+                   for name in names}
+        part = df.reindex(columns=PICK_COLUMNS + ['sequence_name'])
+        parts.append(part.assign(exam=part['sequence_name'].map(exam_of).fillna(-1).astype(int),
+                                 is_pt=source == 'scores'))
+    return pd.concat(parts, ignore_index=True)
+
+
+def _first_per_key(*keys):
+    # True at the first row of each key in the (already sorted) arrays
+    return ~pd.DataFrame({i: k for i, k in enumerate(keys)}).duplicated().to_numpy()
+
+
+def score_table(scores, kfl):
+    """One row per (enrollment, pick) plus n_pt; see the header comment for the picks.
+
+    Ties on date_created / scaled_score go to the first row in input order, as idxmin/idxmax did.
+    """
+    events = _events(scores, kfl)
+    enrollment = pd.factorize(events['kbs_enrollment_id'])[0]
+    created = events['date_created']
+    has_date = created.notna().to_numpy()
+    date = created.to_numpy(dtype='datetime64[ns]').view('i8')
+    # the single sort: enrollment, then date_created, then original row order
+    order = np.lexsort((np.arange(len(events)), date, enrollment))
+    enrollment, date, has_date = enrollment[order], date[order], has_date[order]
+    exam = events['exam'].to_numpy()[order]
+    is_pt = events['is_pt'].to_numpy()[order]
+    score = events['scaled_score'].to_numpy(dtype=float)[order]
+
+    picks = []
+    # first attempt of each full length exam
+    rows = np.flatnonzero((exam >= 0) & has_date)
+    rows = rows[_first_per_key(enrollment[rows], exam[rows])]
+    picks.append((rows, np.asarray(PICKS, dtype=object)[exam[rows]]))
+    # latest practice test: first row on the enrollment's last date
+    rows = np.flatnonzero(is_pt & has_date)
+    last = np.r_[enrollment[rows][1:] != enrollment[rows][:-1], True]
+    last_date = pd.Series(date[rows][last], index=enrollment[rows][last])
+    rows = rows[date[rows] == last_date.reindex(enrollment[rows]).to_numpy()]
+    rows = rows[_first_per_key(enrollment[rows])]
+    picks.append((rows, LATEST))
+    # best score outside AAMC1 (ties: earliest row in input order, as idxmax)
+    rows = np.flatnonzero(is_pt & (exam != PICKS.index(FIRST)) & ~np.isnan(score))
+    if len(rows):
+        starts = np.flatnonzero(np.r_[True, enrollment[rows][1:] != enrollment[rows][:-1]])
+        best = np.repeat(np.maximum.reduceat(score[rows], starts), np.diff(np.r_[starts, len(rows)]))
+        rows = rows[score[rows] == best]
+        rows = rows[np.lexsort((order[rows], enrollment[rows]))]
+        rows = rows[_first_per_key(enrollment[rows])]
+    picks.append((rows, MAX))
+
+    sorted_events = events.iloc[order].reset_index(drop=True)
+    table = pd.concat([sorted_events.loc[rows, PICK_COLUMNS].assign(pick=pick) for rows, pick in picks],
+                      ignore_index=True)
+    table['pick'] = pd.Categorical(table['pick'], categories=PICKS)
+    table['n_pt'] = table['kbs_enrollment_id'].map(n_practice_tests(scores)).fillna(0).astype(int)
+    return table
+
+
+def n_practice_tests(scores):
+    """'# of PT': distinct practice tests taken, per enrollment"""
+    taken = scores[['kbs_enrollment_id', 'sequence_name']].dropna().drop_duplicates()
+    return taken['kbs_enrollment_id'].value_counts(sort=False)
+
+
+def pick(table, name, min_pt=0):
+    """Rows of one pick, optionally only for enrollments with at least min_pt practice tests"""
+    rows = table[table['pick'] == name]
+    return rows[rows['n_pt'] >= min_pt] if min_pt else rows
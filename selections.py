@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+from collections import Counter
+
+from instrumentation import get_logger
+
+# Product selections shared by every session of the process:
+#   saved selections   named product lists kept in MCAT_SAVED_SELECTIONS ({name: [codes]}
+#                      JSON), saved and loaded from the filter panel, pre-warmed after loads
+#   RecentSelections   how often each selection was viewed, for pre-warming the favourites
+
+SAVED_SELECTIONS = os.environ.get('MCAT_SAVED_SELECTIONS', 'saved_selections.json')
+
+log = get_logger('selections')
+
+_write_lock = threading.Lock()
+
+
+def load_saved_selections(path=SAVED_SELECTIONS):
+    """{name: [product codes]} from the saved selections file ({} when there is none)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable saved selections %s: %s", path, e)
+        return {}
+    if not isinstance(saved, dict) or not all(isinstance(products, list) for products in saved.values()):
+        log.warning("Ignoring saved selections %s: expected {name: [product codes]}", path)
+        return {}
+    return {str(name): [str(p) for p in products] for name, products in saved.items()}
+
+
+def _update(path, change):
+    with _write_lock:
+        saved = load_saved_selections(path)
+        change(saved)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+
+
+def save_selection(name, products, path=SAVED_SELECTIONS):
+    """Save (or overwrite) a named selection"""
+    _update(path, lambda saved: saved.__setitem__(name, sorted(map(str, products))))
+
+
+def delete_selection(name, path=SAVED_SELECTIONS):
+    _update(path, lambda saved: saved.pop(name, None))
+
+
+class RecentSelections:
+    """How often each product selection was viewed (bounded, thread-safe)"""
+
+    def __init__(self, maxsize=200):
+        self.maxsize = maxsize
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, products):
+        key = frozenset(map(str, products))
+        if not key:
+            return
+        with self._lock:
+            self._counts[key] += 1
+            if len(self._counts) > self.maxsize:
+                # forget the least viewed half, so new favourites can still get in
+                self._counts = Counter(dict(self._counts.most_common(self.maxsize // 2)))
+
+    def most_common(self, n):
+        with self._lock:
+            return [sorted(key) for key, _ in self._counts.most_common(n)]
@@ -0,0 +1,69 @@
+import calendar
+import re
+
+import numpy as np
+import pandas as pd
+
+# Declared column types for every tab in DASHBOARD_TABS. Sheet reads come back as
+# strings / mixed objects; apply_schemas converts them once at load so the helpers
+# work on numeric arrays instead of calling pd.to_numeric on every rerun. Numeric
+# columns are stored in the smallest dtype that holds them exactly (most of these tabs
+# are small integer counts), so each worker keeps a compact copy of every tab.
+MONTH_ORDER = [calendar.month_abbr[m] for m in range(1, 13)]
+MONTH_DTYPE = pd.CategoricalDtype(MONTH_ORDER, ordered=True)
+
+YEAR_COLUMNS = r'_\d{4}$'          # pivot tabs: <metric>_2023, <metric>_2024, ...
+KPI_COLUMNS = r'^total_.*_\d{2}$'  # KPI tabs: total_eid_24, total_diff_score_25, ...
+
+TAB_SCHEMAS = {
+    'product_code_df': {'categorical': ['product_code']},
+    'KPI_data_all': {'categorical': ['product_code', 'Parameter'], 'numeric': KPI_COLUMNS},
+    'KPI_data_Pm_all': {'categorical': ['product_code', 'Parameter'], 'numeric': KPI_COLUMNS},
+    'prod_score_gain_data': {'categorical': ['product_code'], 'months': ['Expiry_month'], 'numeric': YEAR_COLUMNS},
+    'DScBd_metrics': {'categorical': ['product_code'], 'months': ['Expiry_month'], 'numeric': YEAR_COLUMNS},
+    'monthly_fl_metrics': {'categorical': ['product_code'], 'months': ['Activity_month'], 'numeric': YEAR_COLUMNS},
+    'monthwise_act_ques_pt_metrics': {'categorical': ['product_code'], 'months': ['Activity_month'], 'numeric': YEAR_COLUMNS},
+    'monthwise_act_ques_pt_metrics_exp': {'categorical': ['product_code'], 'months': ['Expiry_month'], 'numeric': YEAR_COLUMNS},
+    'act_comp_trend': {'categorical': ['product_code'], 'months': ['ESD_month'], 'numeric': YEAR_COLUMNS},
+    'ques_comp_trend': {'categorical': ['product_code'], 'months': ['ESD_month'], 'numeric': YEAR_COLUMNS},
+}
+
+
+def compact_numeric(col):
+    """Lossless downcast: whole numbers without gaps to the smallest int dtype, other
+    values to float32 when every value survives the round trip, else left as float64"""
+    values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+    if len(values) and not np.isnan(values).any() and np.array_equal(values, np.round(values)):
+        return pd.to_numeric(col, downcast='integer')
+    as_float32 = values.astype(np.float32)
+    if np.array_equal(as_float32.astype(np.float64), values, equal_nan=True):
+        return pd.Series(as_float32, index=col.index, name=col.name)
+    return col.astype(np.float64)
+
+
+def _convert(col, name, schema):
+    if name in schema.get('categorical', []):
+        return col.astype(str).astype('category')
+    if name in schema.get('months', []):
+        return col.astype(str).astype(MONTH_DTYPE)
+    numeric = schema.get('numeric')
+    if numeric and re.search(numeric, str(name)):
+        return compact_numeric(pd.to_numeric(col, errors='coerce'))
+    return col
+
+
+def apply_schema(df, schema):
+    """Coerce a tab to its declared dtypes. Works by position, since the wide pivot tabs
+    repeat product_code / month columns once per block."""
+    if df.empty:
+        return df
+    converted = [_convert(df.iloc[:, i], name, schema) for i, name in enumerate(df.columns)]
+    out = pd.concat(converted, axis=1, ignore_index=True)
+    out.columns = df.columns
+    return out
+
+
+def apply_schemas(data):
+    """apply_schema for every tab in a load_dashboard_data() result that has a schema"""
+    return {key: apply_schema(df, TAB_SCHEMAS[key]) if key in TAB_SCHEMAS else df
+            for key, df in data.items()}
@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+
+from instrumentation import get_logger, incr, timer
+
+log = get_logger('sheets')
+
+# Shared, quota-aware wrapper around one pygsheets client. Every dashboard read and
+# every publisher write goes through it:
+#   - single flight: concurrent requests for the same range / revision share one fetch
+#   - token bucket: requests stay under the per-minute Sheets read quota
+#   - jittered exponential backoff on 429 / 5xx responses
+#   - one authorized client (and its HTTP connection) reused for every call
+# The pygsheets client comes from `factory`, so a fake can be injected for testing.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _status(error):
+    """HTTP status of a googleapiclient HttpError (or anything shaped like one)"""
+    resp = getattr(error, 'resp', None)
+    status = getattr(resp, 'status', None) or getattr(error, 'status_code', None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `capacity` saved up"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        self.result, self.error = result, error
+        self.done.set()
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SheetsClient:
+    def __init__(self, factory, rate=0.9, burst=10, max_retries=5, base_delay=1.0, max_delay=32.0):
+        """factory: () -> pygsheets client, called once on first use
+        rate / burst: token bucket; Sheets allows 60 reads per minute per user by default
+        """
+        self.factory = factory
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = 0   # calls actually sent, retries included
+        self.retries = 0
+        self.coalesced = 0  # ranges served by another caller's in-flight fetch
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._io_lock = threading.Lock()  # httplib2 connections are not thread safe
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self.factory()
+        return self._client
+
+    def _call(self, request, op):
+        """request() with rate limiting and jittered exponential backoff on 429/5xx"""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                with self._io_lock, timer('sheets_request', op=op):
+                    self.requests += 1
+                    return request()
+            except Exception as e:
+                if _status(e) not in RETRY_STATUSES or attempt >= self.max_retries:
+                    incr('sheets_errors', op=op)
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                log.warning("Sheets %s failed (%s), retrying in %.1fs", op, _status(e), delay)
+                attempt += 1
+                self.retries += 1
+                incr('sheets_retries', op=op)
+                time.sleep(delay)
+
+    def _claim(self, keys):
+        """Split keys into flights this caller must fetch and flights already under way"""
+        mine, flights = [], {}
+        with self._flights_lock:
+            for key in keys:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    mine.append(key)
+                else:
+                    self.coalesced += 1
+                    incr('sheets_coalesced')
+                flights[key] = flight
+        return mine, flights
+
+    def _land(self, keys):
+        with self._flights_lock:
+            for key in keys:
+                self._flights.pop(key, None)
+
+    def values_batch_get(self, sheet_id, ranges, render='FORMATTED_VALUE'):
+        """values.batchGet for A1 ranges; returns [{'values': [...]}, ...] in order.
+        Ranges another caller is already fetching are waited for, not requested again."""
+        keys = [(sheet_id, r, render) for r in ranges]
+        mine, flights = self._claim(keys)
+        if mine:
+            try:
+                fetched = self._call(lambda: self.client.sheet.values_batch_get(
+                    sheet_id, [r for _, r, _ in mine], value_render_option=render), 'values_batch_get')
+                fetched = list(fetched or [])
+                for i, key in enumerate(mine):
+                    flights[key].finish(result=fetched[i] if i < len(fetched) else {})
+            except BaseException as e:
+                for key in mine:
+                    flights[key].finish(error=e)
+                raise
+            finally:
+                self._land(mine)
+        return [flights[key].wait() for key in keys]
+
+    def sheet_properties(self, sheet_id):
+        """{worksheet title: properties} (sheetId, gridProperties, ...)"""
+        response = self._call(lambda: self.client.sheet.get(sheet_id, fields='sheets.properties'), 'get')
+        return {s['properties']['title']: s['properties'] for s in response.get('sheets', [])}
+
+    def batch_update(self, sheet_id, requests):
+        """spreadsheets.batchUpdate (structure changes: add / resize worksheets)"""
+        return self._call(lambda: self.client.sheet.batch_update(sheet_id, requests), 'batch_update')
+
+    def values_batch_update(self, sheet_id, data, value_input='USER_ENTERED'):
+        """One values.batchUpdate for every {'range', 'values'} in data"""
+        sheet = self.client.sheet
+        body = {'valueInputOption': value_input, 'data': data}
+        return self._call(lambda: sheet._execute_requests(
+            sheet.service.spreadsheets().values().batchUpdate(spreadsheetId=sheet_id, body=body)),
+            'values_batch_update')
+
+    def get_update_time(self, sheet_id):
+        """Drive modifiedTime of the spreadsheet (single flight)"""
+        key = ('revision', sheet_id)
+        mine, flights = self._claim([key])
+        if mine:
+            try:
+                flights[key].finish(result=self._call(lambda: self.client.drive.get_update_time(sheet_id),
+                                                      'get_update_time'))
+            except BaseException as e:
+                flights[key].finish(error=e)
+                raise
+            finally:
+                self._land(mine)
+        return flights[key].wait()
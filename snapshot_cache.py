@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from instrumentation import get_logger
+
+log = get_logger('snapshots')
+
+# Local on-disk copy of every sheet range the dashboard reads. Each A1 range is stored
+# as a Parquet file of raw cell strings plus a small JSON sidecar recording the
+# spreadsheet revision (Drive modifiedTime) it was downloaded at. A snapshot is only
+# served as current when its revision matches; when the revision cannot be read the
+# sheet is downloaded anyway, and a snapshot is the fallback only if that fails too. Such
+# fallbacks must be younger than SNAPSHOT_MAX_AGE and are reported by stale_message().
+SNAPSHOT_DIR = os.environ.get('MCAT_SNAPSHOT_DIR', '.sheet_snapshots')
+SNAPSHOT_MAX_AGE = float(os.environ.get('MCAT_SNAPSHOT_MAX_AGE', 24 * 3600))  # seconds
+REVISION_TTL = 30  # seconds a revision lookup is trusted before asking Drive again
+
+_revision_lock = threading.Lock()
+_revision_cache = {}
+_stale = {}  # (sheet_id, range) -> saved_at of the snapshots served as a fallback
+
+
+def _range_path(sheet_id, a1_range):
+    name = hashlib.sha1(a1_range.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, sheet_id, name)
+
+
+def _atomic_write(path, write):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def get_revision(client, sheet_id):
+    """Cheap change check: the spreadsheet's modifiedTime, or None if it can't be read.
+
+    client: anything with get_update_time(sheet_id), e.g. a SheetsClient
+    """
+    now = time.monotonic()
+    with _revision_lock:
+        cached = _revision_cache.get(sheet_id)
+        if cached and now - cached[1] < REVISION_TTL:
+            return cached[0]
+    try:
+        revision = client.get_update_time(sheet_id)
+    except Exception as e:
+        log.warning("Could not read spreadsheet revision, downloading without it: %s", e)
+        return None
+    with _revision_lock:
+        _revision_cache[sheet_id] = (revision, now)
+    return revision
+
+
+def _read(sheet_id, a1_range, accept):
+    # Stored cell matrix of a range if accept(sidecar) holds, else None
+    path = _range_path(sheet_id, a1_range)
+    try:
+        with open(path + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if not accept(meta):
+            return None
+        if meta.get('rows', 0) == 0:
+            return []
+        df = pd.read_parquet(path + '.parquet')
+    except (OSError, ValueError):
+        return None
+    return df.values.tolist()
+
+
+def load_values(sheet_id, a1_range, revision):
+    """Return the stored cell matrix for a range, or None when missing / out of date.
+    An unknown revision (None) never matches: the range has to be downloaded."""
+    if revision is None:
+        return None
+    return _read(sheet_id, a1_range, lambda meta: meta.get('revision') == revision)
+
+
+def load_fallback(sheet_id, a1_range, max_age=None):
+    """The stored cell matrix for a range the sheet could not be read for, if it is at
+    most max_age seconds old (default SNAPSHOT_MAX_AGE); recorded for stale_message()"""
+    max_age = SNAPSHOT_MAX_AGE if max_age is None else max_age
+    saved = {}
+
+    def young_enough(meta):
+        saved['at'] = meta.get('saved_at', 0)
+        return time.time() - saved['at'] <= max_age
+    values = _read(sheet_id, a1_range, young_enough)
+    if values is not None:
+        with _revision_lock:
+            _stale[(sheet_id, a1_range)] = saved['at']
+    return values
+
+
+def stale_message():
+    """Why the data on screen may be out of date (fallback snapshots in use), or None"""
+    with _revision_lock:
+        stale = dict(_stale)
+    if not stale:
+        return None
+    oldest = time.strftime('%Y-%m-%d %H:%M', time.localtime(min(stale.values())))
+    return f"Google Sheets could not be read: showing {len(stale)} saved range(s), the oldest from {oldest}"
+
+
+def save_values(sheet_id, a1_range, values, revision):
+    path = _range_path(sheet_id, a1_range)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if values:
+        width = max(len(row) for row in values)
+        rows = [[str(v) for v in row] + [''] * (width - len(row)) for row in values]
+        df = pd.DataFrame(rows, columns=[f'c{i}' for i in range(width)])
+        _atomic_write(path + '.parquet', lambda tmp: df.to_parquet(tmp, index=False))
+    meta = {'range': a1_range, 'revision': revision, 'rows': len(values), 'saved_at': time.time()}
+
+    def _write_meta(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+    # Sidecar last, so a reader never sees a new revision pointing at old data
+    _atomic_write(path + '.json', _write_meta)
+    with _revision_lock:
+        _stale.pop((sheet_id, a1_range), None)
+
+
+def clear_revision_cache():
+    with _revision_lock:
+        _revision_cache.clear()
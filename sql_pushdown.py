@@ -0,0 +1,308 @@
+import argparse
+import calendar
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import data_sources
+from dataset_registry import BoundedLRU
+from score_engine import FL_EXAMS
+
+# Trend charts computed in an embedded SQLite / DuckDB database over enrollment-level
+# fact tables instead of the pre-pivoted sheet tabs. The product filter and the
+# month / year grouping are pushed down as one parameterized GROUP BY per chart block, so
+# only the 12 x years result rows reach pandas, and new years or groupings need no sheet
+# changes. SqlTrends.select returns exactly what AggCube.select does for the same
+# chart_blocks.cube_specs(), so the charts cannot tell the two apart.
+#
+#   python sql_pushdown.py build sqlite:facts.db                  # from the ETL store
+#   MCAT_FACTS_DB=sqlite:facts.db streamlit run app.py
+#
+# Fact tables (built from etl frames; see write_facts):
+#   activity     activity rows (or etl_incremental partials): counts, answered items,
+#                30/60/90 day window columns
+#   tests        practice test + KFL rows
+#   score_picks  score_engine.score_table, plus in_gain (enrollment is in score_gain)
+#   score_gain   first / best score and gain per enrollment
+
+FACTS_DB = os.environ.get('MCAT_FACTS_DB')
+
+FACT_COLUMNS = {
+    'activity': ['kbs_enrollment_id', 'product_code', 'Activity_year', 'Activity_month', 'Expiry_year',
+                 'Expiry_month', 'ESD_year', 'ESD_month', 'date_completed', 'enroll_exp_date', 'enroll_start_date',
+                 'n_sequence_title', 'n_sequence_name', 'total_scored_items_answered']
+                + [f'w{d}_{m}' for d in (30, 60, 90) for m in ('rows', 'n_sequence_title', 'total_scored_items_answered')],
+    'tests': ['kbs_enrollment_id', 'product_code', 'Activity_year', 'Activity_month', 'Expiry_year', 'Expiry_month',
+              'date_completed', 'enroll_exp_date', 'n_sequence_name'],
+    'score_picks': ['kbs_enrollment_id', 'product_code', 'Activity_year', 'Activity_month', 'Expiry_year',
+                    'Expiry_month', 'date_completed', 'enroll_exp_date', 'scaled_score', 'pick', 'n_pt', 'in_gain'],
+    'score_gain': ['kbs_enrollment_id', 'product_code', 'Expiry_year', 'Expiry_month', 'enroll_exp_date', 'score_gain'],
+}
+
+# Date behind each month column prefix, for the daily / weekly grains. Tables built from
+# etl_incremental partials keep only the month for activity and tests, so those blocks
+# stay monthly there (see SqlTrends.grains).
+DATE_COLUMNS = {'Activity': 'date_completed', 'Expiry': 'enroll_exp_date', 'ESD': 'enroll_start_date'}
+GRAINS = ['month', 'week', 'day']
+
+
+def fact_source(table, value, where=None, den_table=None, window=None):
+    """Where one chart block's numbers come from.
+
+    value: column summed for the numerator (the denominator is distinct enrollments)
+    where: {column: value} equality filters
+    den_table: count enrollments in this table instead (practice tests per active user)
+    window: completion trend days: rows within N days of enrollment start, for
+    enrollments that started at least N days ago
+    """
+    return {'table': table, 'value': value, 'where': where or {}, 'den_table': den_table, 'window': window}
+
+
+def _monthwise_sources():
+    return {
+        'Avg_Activity': fact_source('activity', 'n_sequence_title'),
+        'Avg Question Answered': fact_source('activity', 'total_scored_items_answered'),
+        'Avg Practice Test': fact_source('tests', 'n_sequence_name', den_table='activity'),
+    }
+
+
+# Tab key -> block key -> fact_source, for the blocks in chart_blocks.CHART_TABS
+FACT_SOURCES = {
+    'prod_score_gain_data': {'Score_gain': fact_source('score_gain', 'score_gain')},
+    'DScBd_metrics': {prefix: fact_source('score_picks', 'scaled_score', {'pick': pick, 'in_gain': 1})
+                      for prefix, pick in (('First', 'AAMC1'), ('Max', 'max'), ('Latest', 'latest'))},
+    'monthly_fl_metrics': {exam: fact_source('score_picks', 'scaled_score', {'pick': exam}) for exam in FL_EXAMS},
+    'monthwise_act_ques_pt_metrics': _monthwise_sources(),
+    'monthwise_act_ques_pt_metrics_exp': _monthwise_sources(),
+    'act_comp_trend': {f'Activity_{d}_days': fact_source('activity', f'w{d}_n_sequence_title', window=d)
+                       for d in (30, 60, 90)},
+    'ques_comp_trend': {f'Ques_Ans_{d}_days': fact_source('activity', f'w{d}_total_scored_items_answered', window=d)
+                        for d in (30, 60, 90)},
+}
+
+
+def _marks(values):
+    return ', '.join('?' * len(values))
+
+
+def _iso(ts):
+    # Dates are stored as ISO text, so range filters compare the same way in SQLite and DuckDB
+    return pd.Timestamp(ts).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+class FactStore:
+    def __init__(self, spec=FACTS_DB):
+        """spec: 'sqlite:<file>' or 'duckdb:<file>' (see data_sources.get_source)"""
+        self.db = data_sources.get_source(spec)
+        if not hasattr(self.db, 'connect'):
+            raise ValueError(f"Fact tables need an SQL data source, not {spec!r}")
+
+    def version(self):
+        """Changes whenever the database file is rewritten"""
+        stat = os.stat(self.db.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def columns(self, table):
+        return list(self.query(f'SELECT * FROM "{table}" LIMIT 0').columns)
+
+    def period_sql(self, col, grain):
+        """SQL for the 'YYYY-MM-DD' day / week (Monday) a date column falls in"""
+        day = f'substr("{col}", 1, 10)'
+        if grain == 'day':
+            return day
+        if isinstance(self.db, data_sources.DuckDBSource):
+            return f"strftime(date_trunc('week', CAST({day} AS DATE)), '%Y-%m-%d')"
+        return f"date({day}, '-' || ((CAST(strftime('%w', {day}) AS INTEGER) + 6) % 7) || ' days')"
+
+    def query(self, sql, params=()):
+        con = self.db.connect()
+        try:
+            return self.db._query(con, sql, tuple(params))
+        finally:
+            con.close()
+
+    def write(self, tables):
+        con = self.db.connect()
+        try:
+            for name, df in tables.items():
+                self.db._replace_table(con, name, df)
+            con.commit()
+        finally:
+            con.close()
+
+
+def write_facts(frames, store):
+    """Fact tables from etl.prepare / etl_incremental.load_frames output"""
+    picks = frames['score_table'].assign(
+        pick=lambda df: df['pick'].astype(str),
+        in_gain=lambda df: df['kbs_enrollment_id'].isin(frames['score_gain']['kbs_enrollment_id']).astype(int))
+    tables = {'activity': frames['activity'], 'tests': frames['tests'], 'score_picks': picks,
+              'score_gain': frames['score_gain']}
+    out = {}
+    for name, df in tables.items():
+        df = df[[c for c in FACT_COLUMNS[name] if c in df.columns]].copy()
+        for col in df.columns:
+            if col.endswith(('_year', '_month')):
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+        for col in set(DATE_COLUMNS.values()) & set(df.columns):
+            dates = pd.to_datetime(df[col], errors='coerce')
+            df[col] = dates.dt.strftime('%Y-%m-%dT%H:%M:%S').where(dates.notna(), None)
+        out[name] = df
+    store.write(out)
+
+
+class SqlTrends:
+    def __init__(self, store, cube_specs, years, sources=FACT_SOURCES):
+        self.store = store
+        self.cube_specs = cube_specs
+        self.years = list(years)
+        self.sources = sources
+        self._months = BoundedLRU(256)  # (store version, table, month col, filters) -> months with data
+        self._columns = BoundedLRU(32)  # (store version, table) -> column names
+        self._memo_version = None
+
+    def version(self):
+        # as_of moves the completion trend windows, so a new day is a new version
+        return ('facts',) + self.store.version() + (date.today().isoformat(),)
+
+    def memoize(self, cache, parts, compute):
+        """compute() once per (version(), *parts) in a DatasetRegistry cache. The entries of
+        older fact store versions are dropped from the cache once the version moves on."""
+        version = self.version()
+        if version != self._memo_version:
+            self._memo_version = version
+            cache.discard(lambda key: isinstance(key[0], tuple) and key[0][:1] == ('facts',) and key[0] != version)
+        return cache.get_or_compute((version,) + tuple(parts), compute)
+
+    def _filters(self, source, year_col, as_of):
+        clauses, params = [f'"{year_col}" IN ({_marks(self.years)})'], list(self.years)
+        for col, value in source['where'].items():
+            clauses.append(f'"{col}" = ?')
+            params.append(value)
+        if source['window']:
+            clauses += [f'"w{source["window"]}_rows" > 0', 'enroll_start_date <= ?']
+            params.append(_iso(pd.Timestamp(as_of).normalize() - timedelta(days=source['window'])))
+        return clauses, params
+
+    def _aggregate(self, table, value, keys, clauses, params, products):
+        """COUNT(DISTINCT enrollment) and SUM(value) per {alias: SQL expression} group key"""
+        if not products:
+            return pd.DataFrame(columns=list(keys) + ['enrollments', 'total'])
+        groups = ', '.join(f'{expr} AS {alias}' for alias, expr in keys.items())
+        sql = (f'SELECT {groups}, COUNT(DISTINCT kbs_enrollment_id) AS enrollments, SUM({value}) AS total '
+               f'FROM "{table}" WHERE product_code IN ({_marks(products)}) AND {" AND ".join(clauses)} '
+               f'GROUP BY {", ".join(str(i + 1) for i in range(len(keys)))}')
+        return self.store.query(sql, list(products) + params)
+
+    def _grouped(self, source, keys, year_col, products, as_of, extra=()):
+        # Aggregate of one block; enrollment counts from den_table when the block has one
+        clauses, params = self._filters(source, year_col, as_of)
+        clauses += list(extra)
+        result = self._aggregate(source['table'], f'"{source["value"]}"', keys, clauses, params, products)
+        if source['den_table']:
+            # enrollment counts (and the month rows) from another table, the way the
+            # practice test block reuses the activity block's grid
+            den_source = dict(source, table=source['den_table'], where={})
+            den_clauses, den_params = self._filters(den_source, year_col, as_of)
+            den = self._aggregate(den_source['table'], '0', keys, den_clauses + list(extra), den_params, products)
+            result = result.drop(columns='enrollments').merge(den[list(keys) + ['enrollments']],
+                                                              on=list(keys), how='outer')
+            return result, den_source, (den_clauses, den_params)
+        return result, source, (clauses, params)
+
+    def _block_months(self, source, month_col, clauses, params):
+        def compute():
+            rows = self.store.query(f'SELECT DISTINCT "{month_col}" AS month FROM "{source["table"]}" '
+                                    f'WHERE "{month_col}" IS NOT NULL AND {" AND ".join(clauses)}', params)
+            return sorted(int(m) for m in rows['month'])
+        key = (self.store.version(), source['table'], month_col, tuple(clauses), tuple(params))
+        return self._months.get_or_compute(key, compute)
+
+    def _block(self, block, source, month_col, products, as_of):
+        year_col = month_col.replace('_month', '_year')
+        keys = {'month': f'"{month_col}"', 'year': f'"{year_col}"'}
+        result, months_source, months_filters = self._grouped(source, keys, year_col, products, as_of)
+        result = result.dropna(subset=['month', 'year']).astype({'month': int, 'year': int})
+        grid = result.set_index(['month', 'year'])[['enrollments', 'total']].astype(float)
+
+        months = self._block_months(months_source, month_col, *months_filters)
+        index = pd.MultiIndex.from_product([months, self.years], names=['month', 'year'])
+        grid = grid.reindex(index, fill_value=0.0).fillna(0.0)
+        den = grid['enrollments'].to_numpy().reshape(len(months), len(self.years))
+        num = grid['total'].to_numpy().reshape(len(months), len(self.years))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.nan_to_num(num / den, nan=0.0, posinf=np.inf, neginf=-np.inf)
+
+        frame = {month_col: [calendar.month_abbr[m] for m in months]}
+        for y, yr in enumerate(self.years):
+            frame[block['den'].format(yr=yr)] = den[:, y]
+            frame[block['num'].format(yr=yr)] = num[:, y]
+            frame[block['out'].format(yr=yr)] = ratio[:, y]
+        df = pd.DataFrame(frame)
+        return df.replace(0, '') if block['blank_zeros'] else df
+
+    def _table_columns(self, table):
+        return self._columns.get_or_compute((self.store.version(), table), lambda: set(self.store.columns(table)))
+
+    def grains(self, key):
+        """Grains every block of tab `key` can be drawn at (week / day need row-level dates)"""
+        month_col, blocks = self.cube_specs[key]
+        date_col = DATE_COLUMNS[month_col.split('_')[0]]
+        sources = [self.sources[key][block['key']] for block in blocks]
+        tables = {t for source in sources for t in (source['table'], source['den_table']) if t}
+        return GRAINS if all(date_col in self._table_columns(t) for t in tables) else GRAINS[:1]
+
+    def series(self, key, selected_products, grain, as_of=None):
+        """{block key: DataFrame} of tab `key` by day or week: one row per (period, year)
+        with the enrollments, total and value (total / enrollments) of that period"""
+        month_col, blocks = self.cube_specs[key]
+        year_col = month_col.replace('_month', '_year')
+        date_col = DATE_COLUMNS[month_col.split('_')[0]]
+        products = sorted(map(str, selected_products))
+        keys = {'period': self.store.period_sql(date_col, grain), 'year': f'"{year_col}"'}
+        result = {}
+        for block in blocks:
+            df, _, _ = self._grouped(self.sources[key][block['key']], keys, year_col, products, as_of or date.today(),
+                                     extra=[f'"{date_col}" IS NOT NULL'])
+            df = df.dropna(subset=['period', 'year']).fillna({'enrollments': 0, 'total': 0})
+            df = df.astype({'enrollments': float, 'total': float}).assign(
+                period=lambda d: pd.to_datetime(d['period']), Year=lambda d: d['year'].astype(int).astype(str))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                df['value'] = np.where(df['enrollments'] > 0, df['total'] / df['enrollments'], 0.0)
+            result[block['key']] = df.drop(columns='year').sort_values(['Year', 'period'], ignore_index=True)
+        return result
+
+    def select(self, key, selected_products, as_of=None):
+        """{block key: DataFrame} for tab `key`, like AggCube.select"""
+        month_col, blocks = self.cube_specs[key]
+        products = sorted(map(str, selected_products))
+        as_of = as_of or date.today()
+        return {block['key']: self._block(block, self.sources[key][block['key']], month_col, products, as_of)
+                for block in blocks}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the enrollment-level fact tables for SQL trend charts")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="write the fact tables to sqlite:<file> or duckdb:<file>")
+    build.add_argument('target', nargs='?', default=FACTS_DB)
+    build.add_argument('--store', help="read the etl_incremental store in this directory")
+    build.add_argument('--query-dir', help="run the source queries instead (full history)")
+    args = parser.parse_args(argv)
+    if not args.target:
+        parser.error("give a target or set MCAT_FACTS_DB")
+
+    import etl
+    import etl_incremental
+    if args.query_dir:
+        frames = etl.prepare(etl.load_sources(args.query_dir))
+    else:
+        frames = etl_incremental.load_frames(etl_incremental.PartitionStore(args.store or etl_incremental.STORE_DIR))
+    write_facts(frames, FactStore(args.target))
+    print(f"Wrote fact tables to {args.target}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import calendar
+
+import numpy as np
+
+from helper_function import DASHBOARD_TABS, _a1_range
+from kpi_engine import KPI_CARDS
+
+# Synthetic dashboard tabs in the layouts etl.py publishes, for measuring the dashboard
+# without Google Sheets. Values are formatted strings, as values.batchGet returns them,
+# keyed by the A1 range the dashboard requests, and served by FakeGSheetsClient, a
+# stand-in for the pygsheets client that SheetsClient wraps.
+#
+#   tabs = synthetic_tabs(n_products=2000, years=range(2016, 2026))
+#   helper_function._gc = FakeGSheetsClient(tabs)
+
+MONTHS = [calendar.month_abbr[m] for m in range(1, 13)]
+
+# Definitions the KPI cards and chart sections look up
+DEFINITION_METRICS = [card['metric'] for card in KPI_CARDS] + [
+    'Score Gain Metrics', 'Detailed Score Breakdown', 'FL Score changes (Activity Month)',
+    'Total Engagment Metrics(Activity Month)', 'Total Engagment Metrics(Expiry Month)',
+    'Activity completion trend', 'Question completion trend',
+]
+
+# Pivot tabs: key -> (month column, [(column prefix, measure, mean value per enrollment)], year_major)
+PIVOT_TABS = {
+    'prod_score_gain_data': ('Expiry_month', [('', 'score_gain', 8)], True),
+    'DScBd_metrics': ('Expiry_month', [(f'{p}_score_', 'scaled_score', 505) for p in ('First', 'Max', 'Latest')], True),
+    'monthly_fl_metrics': ('Activity_month', [(f'{p}_score_', 'scaled_score', 500) for p in
+                                              ('AAMC1', 'KFL1', 'KFL2', 'KFL3', 'AAMC2', 'AAMC3', 'AAMC4', 'AAMC5')],
+                           True),
+    'monthwise_act_ques_pt_metrics': ('Activity_month', [('Avg_Activity_', 'sequence_title', 30),
+                                                         ('Avg Question Answered_', 'total_scored_items_answered', 400),
+                                                         ('Avg Practice Test_', 'sequence_name', 3)], False),
+    'monthwise_act_ques_pt_metrics_exp': ('Expiry_month', [('Avg_Activity_', 'sequence_title', 30),
+                                                           ('Avg Question Answered_', 'total_scored_items_answered', 400),
+                                                           ('Avg Practice Test_', 'sequence_name', 3)], False),
+    'act_comp_trend': ('ESD_month', [(f'Activity_{d}_days_', 'sequence_title', d // 3) for d in (30, 60, 90)], False),
+    'ques_comp_trend': ('ESD_month', [(f'Ques_Ans_{d}_days_', 'total_scored_items_answered', d * 4)
+                                      for d in (30, 60, 90)], False),
+}
+
+# KPI tab blocks, left to right with one blank column between them:
+# (measure name, has a total_eid column, Parameter)
+KPI_BLOCKS = [
+    ('diff_score', True, 'Score Gain'),
+    ('sequence_name', True, 'Avg Activity / User'),
+    ('active_user', False, 'Active Users'),
+    ('total_scored_items_answered', True, 'Avg Questions Answered / User'),
+    ('sequence_name', True, 'Avg Tests / User'),
+]
+
+
+def product_codes(n_products):
+    return [f'MCAT-{i:04d}' for i in range(n_products)]
+
+
+def _fmt(values):
+    return [str(v) for v in np.asarray(values).tolist()]
+
+
+def pivot_values(rng, products, month_col, blocks, years, year_major):
+    """Cell matrix of one wide pivot tab: per block product_code, month, then an
+    enrollment count and a summed measure per year"""
+    header = []
+    for prefix, measure, _ in blocks:
+        names = ['kbs_enrollment_id', measure]
+        order = [(n, y) for y in years for n in names] if year_major else [(n, y) for n in names for y in years]
+        header += ['product_code', month_col] + [f'{prefix}{n}_{y}' for n, y in order]
+    n_rows, n_years = len(products) * 12, len(years)
+    columns = []
+    for prefix, measure, mean in blocks:
+        enrollments = rng.integers(0, 40, size=(n_rows, n_years))
+        totals = np.round(enrollments * rng.normal(mean, mean * 0.1 + 1, size=(n_rows, n_years)))
+        pairs = (np.stack([enrollments, totals], axis=2).reshape(n_rows, -1) if year_major
+                 else np.concatenate([enrollments, totals], axis=1))
+        columns.append(pairs.astype(np.int64))
+    rows = [header]
+    for i in range(n_rows):
+        product, month = products[i // 12], MONTHS[i % 12]
+        row = []
+        for block in columns:
+            row += [product, month] + _fmt(block[i])
+        rows.append(row)
+    return rows
+
+
+def kpi_values(rng, products, kpi_years):
+    """Cell matrix of a KPIs_sheet range starting at A2 (the A2:AF27 layout for 2 years)"""
+    header = []
+    for i, (name, with_eid, _) in enumerate(KPI_BLOCKS):
+        header += ([''] if i else []) + ['product_code']
+        for yr in kpi_years:
+            header += [f'total_{name}_{str(yr)[-2:]}'] + ([f'total_eid_{str(yr)[-2:]}'] if with_eid else [])
+        header += ['Parameter']
+    rows = [header]
+    for product in products:
+        row = []
+        for i, (name, with_eid, parameter) in enumerate(KPI_BLOCKS):
+            row += ([''] if i else []) + [product]
+            for _ in kpi_years:
+                eid = int(rng.integers(1, 200))
+                row += _fmt([eid * int(rng.integers(1, 30))]) + (_fmt([eid]) if with_eid else [])
+            row += [parameter]
+        rows.append(row)
+    return rows
+
+
+def synthetic_tabs(n_products=25, years=(2023, 2024, 2025), kpi_years=None, seed=0):
+    """{A1 range: cell matrix} for every tab in DASHBOARD_TABS"""
+    rng = np.random.default_rng(seed)
+    years = list(years)
+    kpi_years = list(kpi_years or years[-2:])
+    products = product_codes(n_products)
+    tabs = {
+        'product_code_df': [['product_code']] + [[p] for p in products],
+        'KPI_data_all': kpi_values(rng, products, kpi_years),
+        'KPI_data_Pm_all': kpi_values(rng, products, kpi_years),
+        'kpis_metric_def': [['KPI_Metrics', 'Definition']] + [[m, f'Definition of {m}'] for m in DEFINITION_METRICS],
+    }
+    for key, (month_col, blocks, year_major) in PIVOT_TABS.items():
+        tabs[key] = pivot_values(rng, products, month_col, blocks, years, year_major)
+    return {_a1_range(*DASHBOARD_TABS[key]): tabs[key] for key in DASHBOARD_TABS}
+
+
+class _FakeSheetAPI:
+    def __init__(self, tabs):
+        self.tabs = tabs
+        self.requests = 0
+
+    def values_batch_get(self, sheet_id, ranges, **kwargs):
+        # Fixed ranges (KPIs A2:AF27) get the whole generated block, so KPI cards scale
+        # with the product count too
+        self.requests += 1
+        return [{'range': r, 'values': self.tabs.get(r, [])} for r in ranges]
+
+    def get(self, sheet_id, **kwargs):
+        titles = [r.split('!')[0].strip("'") for r in self.tabs]
+        return {'sheets': [{'properties': {'sheetId': i, 'title': t,
+                                           'gridProperties': {'rowCount': 1000, 'columnCount': 100}}}
+                           for i, t in enumerate(dict.fromkeys(titles))]}
+
+
+class _FakeDrive:
+    def __init__(self, revision):
+        self.revision = revision
+
+    def get_update_time(self, sheet_id):
+        return self.revision
+
+
+class FakeGSheetsClient:
+    """Read-only pygsheets client double serving synthetic_tabs()"""
+
+    def __init__(self, tabs, revision='synthetic-1'):
+        self.sheet = _FakeSheetAPI(tabs)
+        self.drive = _FakeDrive(revision)
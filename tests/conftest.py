@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The dashboard modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AAMC_EXAMS = ["MCAT Official Prep Practice Exam 1", "MCAT Official Prep Practice Exam 2",
+              "MCAT Official Prep Practice Exam 3", "MCAT Official Prep Practice Exam 4",
+              "MCAT Official Prep Free Practice Exam (Scored)"]
+KFL_EXAMS = ['mcat22-fl-1-full', 'mcat-fl-1-1b6e4', 'mcat22-fl-2-full', 'mcat-fl-2-1b6e5', 'mcat22-fl-3-full',
+             'mcat-fl-3-1b6e6']
+
+
+def raw_sources(n_rows=4000, n_enrollments=500, n_products=6, seed=0):
+    """The four source query results etl.clean_sources reads ({'scores', 'activity',
+    'kfl', 'quiz'}), with enrollments spread over 2022-2026"""
+    rng = np.random.default_rng(seed)
+    product = rng.integers(0, n_products, n_enrollments)
+    start = pd.Timestamp('2022-06-01') + pd.to_timedelta(rng.integers(0, 1200, n_enrollments), unit='D')
+    expiry = start + pd.to_timedelta(rng.integers(90, 400, n_enrollments), unit='D')
+
+    def rows(n, names):
+        e = rng.integers(0, n_enrollments, n)
+        # to the second, like the warehouse timestamps: no ties on date_created
+        created = start[e] + pd.to_timedelta(rng.integers(0, 200 * 86400, n), unit='s')
+        return pd.DataFrame({
+            'kbs_enrollment_id': e, 'product_code': [f'P{p}' for p in product[e]],
+            'enroll_start_date': start[e], 'enroll_exp_date': expiry[e], 'date_created': created,
+            'date_completed': created + pd.to_timedelta(rng.integers(0, 3, n), unit='D'),
+            'sequence_name': rng.choice(names, n), 'total_scored_items_answered': rng.integers(0, 60, n),
+        })
+
+    activity = rows(n_rows, ['a1', 'a2', 'a3'])
+    activity['status'] = rng.choice(['completed', 'started'], n_rows, p=[.8, .2])
+    activity['sequence_title'] = rng.choice(['Lesson', 'Quiz', 'AAMC Practice Exam x'], n_rows, p=[.5, .45, .05])
+    scores = rows(n_rows // 4, AAMC_EXAMS)
+    scores['scaled_score'] = rng.integers(472, 528, len(scores))
+    kfl = rows(n_rows // 5, KFL_EXAMS)
+    kfl['sequence_title'] = rng.choice(['Full Length', 'Practice Full'], len(kfl), p=[.9, .1])
+    kfl['exam_completed'] = rng.choice([0, 1], len(kfl), p=[.1, .9])
+    kfl['scaled_score'] = rng.integers(472, 528, len(kfl)).astype(str)
+    quiz = rows(n_rows // 4, ['q1', 'q2'])
+    return {'scores': scores, 'activity': activity, 'kfl': kfl, 'quiz': quiz}
+
+
+@pytest.fixture(scope='session')
+def sources():
+    return raw_sources()
+
+
+@pytest.fixture(scope='session')
+def frames(sources):
+    import etl
+    return etl.prepare(sources)
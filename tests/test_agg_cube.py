@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+import data_sources
+import helper_function
+from agg_cube import _block_frame, build_cube
+from chart_blocks import CHART_TABS
+from sheet_schemas import apply_schemas
+
+YEARS = helper_function.years
+
+
+@pytest.fixture(scope='module')
+def data():
+    return apply_schemas(data_sources.synthetic_data(12, YEARS))
+
+
+def strip(template, prefix):
+    # 'First_score_scaled_score_{yr}' -> 'score_scaled_score'
+    return template[len(prefix) + 1 if prefix else 0:-len('_{yr}')]
+
+
+def legacy(tab, block, df, products):
+    """The get_req_filtered_df* call the page made for this block before the cube"""
+    name = block['key']
+    if block['den'] == 'kbs_enrollment_id_{yr}':
+        return helper_function.get_req_filtered_df(df, products, strip(block['out'], ''), strip(block['num'], ''))
+    if block['den'] == f'{name}_score_kbs_enrollment_id_{{yr}}':
+        return helper_function.get_req_filtered_df_scores(df, products, tab['month_col'], strip(block['out'], name),
+                                                          strip(block['num'], name), name)
+    return helper_function.get_req_filtered_df_act_ques_pt(df, products, tab['month_col'], name,
+                                                           strip(block['num'], name))
+
+
+def plain(df, tab):
+    # the month column comes back categorical from the helpers, as strings from the cube
+    return df.astype({tab['month_col']: str}).reset_index(drop=True)
+
+
+def selections(data):
+    products = data['product_code_df']['product_code'].astype(str).tolist()
+    return [products, products[:1], products[::3], ['not-a-product']]
+
+
+@pytest.mark.parametrize('tab', CHART_TABS, ids=[tab['key'] for tab in CHART_TABS])
+def test_select_matches_legacy_helpers(data, tab):
+    blocks = [chart['block'] for chart in tab['charts']]
+    cube = build_cube(data[tab['key']], tab['month_col'], blocks, YEARS)
+    for products in selections(data):
+        selected = cube.select(products)
+        for block in blocks:
+            expected = legacy(tab, block, _block_frame(data[tab['key']], block, YEARS), products)
+            pd.testing.assert_frame_equal(plain(selected[block['key']], tab), plain(expected, tab),
+                                          check_dtype=False)
@@ -0,0 +1,99 @@
+import pandas as pd
+import pytest
+
+import data_sources
+import helper_function
+import snapshot_cache
+from helper_function import DASHBOARD_TABS
+from sheet_schemas import apply_schemas
+from sheets_client import SheetsClient
+from synthetic_data import FakeGSheetsClient, synthetic_tabs
+
+
+@pytest.fixture(scope='module')
+def tabs():
+    return apply_schemas(data_sources.synthetic_data(5))
+
+
+def assert_same_tabs(read, expected):
+    assert list(read) == list(expected)
+    for key, df in expected.items():
+        pd.testing.assert_frame_equal(read[key], df, obj=key)
+
+
+@pytest.mark.parametrize('kind', ['parquet', 'sqlite', 'duckdb'])
+def test_round_trip(tmp_path, tabs, kind):
+    if kind == 'duckdb':
+        pytest.importorskip('duckdb')
+    source = data_sources.get_source(f'{kind}:{tmp_path / "tabs"}')
+    source.write_tabs(tabs)
+    read = source.read_tabs(DASHBOARD_TABS)
+    # the sheet's header survives, repeated and blank column names included
+    for key, df in tabs.items():
+        assert list(read[key].columns) == [str(c) for c in df.columns]
+    assert_same_tabs(apply_schemas(read), tabs)
+
+
+def test_sheets_source_reads_every_tab(tmp_path, monkeypatch):
+    fake = FakeGSheetsClient(synthetic_tabs(5))
+    monkeypatch.setattr(helper_function, '_gc', fake)
+    monkeypatch.setattr(helper_function, 'sheets', SheetsClient(lambda: fake, rate=1e9, burst=1e9))
+    monkeypatch.setattr(snapshot_cache, 'SNAPSHOT_DIR', str(tmp_path))
+    snapshot_cache.clear_revision_cache()
+    read = data_sources.get_source('sheets:test-sheet').read_tabs(DASHBOARD_TABS)
+    assert_same_tabs(apply_schemas(read), apply_schemas(data_sources.synthetic_data(5)))
+    assert fake.sheet.requests == 1
+
+
+@pytest.mark.parametrize('spec', ['nosuch:x', 'parquet', 'sqlite:'])
+def test_bad_specs(spec):
+    with pytest.raises(ValueError):
+        data_sources.get_source(spec)
+
+
+class NoDrive:
+    def get_update_time(self, sheet_id):
+        raise PermissionError('403: Drive API has not been used in this project')
+
+
+@pytest.fixture
+def no_drive(tmp_path, monkeypatch):
+    """A Sheets client whose Drive metadata can't be read, and fresh snapshot state"""
+    fake = FakeGSheetsClient({"'Tab'": [['a'], ['1']]})
+    fake.drive = NoDrive()
+    monkeypatch.setattr(snapshot_cache, 'SNAPSHOT_DIR', str(tmp_path))
+    monkeypatch.setattr(snapshot_cache, '_stale', {})
+    snapshot_cache.clear_revision_cache()
+    return fake, SheetsClient(lambda: fake, rate=1e9, burst=1e9, base_delay=0)
+
+
+def test_unknown_revision_still_downloads(no_drive):
+    fake, client = no_drive
+    assert helper_function.read_range_values('s', ["'Tab'"], client) == [[['a'], ['1']]]
+    fake.sheet.tabs["'Tab'"] = [['a'], ['2']]
+    assert helper_function.read_range_values('s', ["'Tab'"], client) == [[['a'], ['2']]]
+    assert fake.sheet.requests == 2
+    assert snapshot_cache.stale_message() is None
+
+
+def test_snapshot_is_only_a_fallback_and_is_reported(no_drive, monkeypatch):
+    fake, client = no_drive
+    helper_function.read_range_values('s', ["'Tab'"], client)
+    def unreachable(*args, **kwargs):
+        raise ConnectionError('offline')
+    monkeypatch.setattr(fake.sheet, 'values_batch_get', unreachable)
+
+    assert helper_function.read_range_values('s', ["'Tab'"], client) == [[['a'], ['1']]]
+    assert 'could not be read' in snapshot_cache.stale_message()
+
+    # too old to serve: the error comes through instead of frozen data
+    monkeypatch.setattr(snapshot_cache, 'SNAPSHOT_MAX_AGE', -1)
+    with pytest.raises(ConnectionError):
+        helper_function.read_range_values('s', ["'Tab'"], client)
+
+
+def test_data_manager_keeps_the_stale_warning():
+    from data_manager import DataManager
+    manager = DataManager(lambda: {}, interval=None, check=lambda: 'showing saved ranges')
+    manager.current()
+    assert manager.last_error == 'showing saved ranges'
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+import data_sources
+from dataset_registry import BoundedLRU, DatasetRegistry
+from kpi_engine import KPI_TABS
+
+
+def test_lru_evicts_least_recently_used():
+    cache = BoundedLRU(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert [k for k, _ in cache.items()] == ['a', 'c']
+
+
+def test_concurrent_misses_compute_once():
+    cache = BoundedLRU()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert results == ['value'] * 8
+    assert len(calls) == 1
+    assert cache.misses == 1 and cache.coalesced == 7
+
+
+def test_failed_compute_reaches_waiters_and_is_not_cached():
+    cache = BoundedLRU()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        deadline = time.monotonic() + 5
+        while not cache.coalesced and time.monotonic() < deadline:  # until the waiter is queued
+            time.sleep(0.01)
+        raise RuntimeError('boom')
+
+    errors = []
+    def wait_for_it():
+        started.wait(5)
+        try:
+            cache.get_or_compute('k', lambda: 'unused')
+        except RuntimeError as e:
+            errors.append(e)
+    waiter = threading.Thread(target=wait_for_it)
+    waiter.start()
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('k', fail)
+    waiter.join(5)
+    assert len(errors) == 1
+    assert cache.get_or_compute('k', lambda: 'retried') == 'retried'
+
+
+def test_refresh_reuses_engines_and_drops_stale_entries():
+    data = data_sources.synthetic_data(6)
+    first = DatasetRegistry(data, kpi_tabs=KPI_TABS)
+    first.memoize('KPI_data_all', 'block', ['MCAT-0001'], lambda: 'old')
+    first.memoize('product_code_df', 'block', ['MCAT-0001'], lambda: 'kept')
+
+    changed = dict(data, KPI_data_all=data['KPI_data_all'].iloc[:-1])
+    second = DatasetRegistry(changed, kpi_tabs=KPI_TABS, previous=first)
+    assert second.engines['KPI_data_Pm_all'] is first.engines['KPI_data_Pm_all']
+    assert second.engines['KPI_data_all'] is not first.engines['KPI_data_all']
+    assert second.memoize('product_code_df', 'block', ['MCAT-0001'], lambda: 'new') == 'kept'
+    assert second.memoize('KPI_data_all', 'block', ['MCAT-0001'], lambda: 'new') == 'new'
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+import etl
+from score_engine import AAMC1
+
+KPI_YEARS = [2024, 2025]
+
+# The KPI cells of kpis_metrics.ipynb, kept as close to the notebook as possible: one
+# filter per year, one loop over the product codes, the year blocks merged side by side.
+
+
+def notebook_block(product_codes, per_year, total):
+    """total(rows of one product) -> {column prefix: value}, for each year in KPI_YEARS"""
+    blocks = []
+    for yr, df_in in per_year.items():
+        results = []
+        for pcode in product_codes:
+            temp = df_in[df_in['product_code'] == pcode]
+            row = {'product_code': pcode}
+            row.update({f'{name}_{str(yr)[-2:]}': value for name, value in total(temp).items()})
+            results.append(row)
+        blocks.append(pd.DataFrame(results))
+    merged = blocks[0]
+    for block in blocks[1:]:
+        merged = pd.merge(merged, block, on='product_code', how='inner')
+    return merged
+
+
+def get_avg_act(col_name):
+    return lambda temp: {f'total_{col_name}': temp[col_name].count() if len(temp) else 0,
+                         'total_eid': temp['kbs_enrollment_id'].nunique() if len(temp) else 0}
+
+
+def get_score_gain_all_avg(col_name, out_name=None):
+    return lambda temp: {f'total_{out_name or col_name}': temp[col_name].sum() if len(temp) else 0,
+                         'total_eid': temp['kbs_enrollment_id'].nunique() if len(temp) else 0}
+
+
+def get_active_user(temp):
+    return {'total_active_user': temp['kbs_enrollment_id'].nunique() if len(temp) else 0}
+
+
+def notebook_score_gain(scores, yr, months):
+    score_data_pt = scores.assign(**{'# of PT': scores['kbs_enrollment_id'].map(
+        scores.groupby('kbs_enrollment_id')['sequence_name'].nunique())})
+    ap = score_data_pt[(score_data_pt['Expiry_year'] == yr) & months(score_data_pt['Expiry_month'])]
+    ap = ap[ap['# of PT'] >= 2]
+    first = ap[ap['sequence_name'] == AAMC1]
+    first = first.loc[first.groupby(['kbs_enrollment_id'])['date_created'].idxmin()]
+    best = ap[ap['sequence_name'] != AAMC1]
+    best = best.loc[best.groupby(['kbs_enrollment_id'])['scaled_score'].idxmax()]
+    gain = pd.merge(first[['kbs_enrollment_id', 'product_code', 'scaled_score']],
+                    best[['kbs_enrollment_id', 'scaled_score']], on='kbs_enrollment_id', how='inner',
+                    suffixes=('_first', '_max'))
+    gain['diff_score'] = gain['scaled_score_max'] - gain['scaled_score_first']
+    return gain
+
+
+def notebook_kpis(frames, ref_month, cumulative):
+    months = (lambda m: m <= ref_month) if cumulative else (lambda m: m == ref_month)
+    products = frames['products']
+
+    def activity_rows(df):
+        return {yr: df[months(df['Activity_month']) & (df['Activity_year'] == yr)] for yr in KPI_YEARS}
+    act_user = activity_rows(frames['activity'])
+    blocks = {
+        'A2': (notebook_block(products, {yr: notebook_score_gain(frames['scores'], yr, months) for yr in KPI_YEARS},
+                              get_score_gain_all_avg('diff_score')), 'Score Gain'),
+        'H2': (notebook_block(products, act_user, get_avg_act('sequence_name')), 'Avg Activity / User'),
+        'O2': (notebook_block(products, act_user, get_active_user), 'Active Users'),
+        'T2': (notebook_block(products, act_user, get_score_gain_all_avg('total_scored_items_answered')),
+               'Avg Questions Answered / User'),
+        'AA2': (notebook_block(products, activity_rows(frames['tests']), get_avg_act('sequence_name')),
+                'Avg Tests / User'),
+    }
+    return {cell: block.assign(Parameter=parameter) for cell, (block, parameter) in blocks.items()}
+
+
+@pytest.mark.parametrize('cumulative', [False, True], ids=['KPIs_sheet', 'KPIs_sheet_tll_PM'])
+@pytest.mark.parametrize('ref_month', [1, 6, 12])
+def test_kpi_blocks_match_notebook(frames, ref_month, cumulative):
+    expected = notebook_kpis(frames, ref_month, cumulative)
+    blocks = etl.kpi_blocks(frames, ref_month, KPI_YEARS, cumulative)
+    assert [cell for cell, _ in blocks] == list(expected)
+    for cell, block in blocks:
+        pd.testing.assert_frame_equal(block, expected[cell], check_dtype=False, obj=cell)
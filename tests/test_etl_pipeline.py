@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+import etl
+import etl_pipeline
+from etl_pipeline import node, run_graph, run_pipeline
+
+YEARS = [2023, 2024, 2025]
+AS_OF = pd.Timestamp('2025-10-01')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_pipeline_matches_build_outputs(frames, workers):
+    outputs, timings = run_pipeline(frames, 6, YEARS, as_of=AS_OF, workers=workers)
+    expected = etl.build_outputs(frames, 6, YEARS, as_of=AS_OF)
+    assert list(outputs) == list(expected)
+    for tab, cells in expected.items():
+        assert [cell for cell, _ in outputs[tab]] == [cell for cell, _ in cells]
+        for (cell, df), (_, got) in zip(cells, outputs[tab]):
+            pd.testing.assert_frame_equal(got, df, obj=f'{tab}!{cell}')
+    assert all(seconds >= 0 for seconds in timings.values())
+
+
+def test_shared_frames_round_trip(frames, tmp_path):
+    kinds = {name: isinstance(v, pd.DataFrame) for name, v in frames.items()}
+    attached = etl_pipeline.attach_frames(etl_pipeline.share_frames(frames, str(tmp_path)), kinds)
+    for name, value in frames.items():
+        if kinds[name]:
+            pd.testing.assert_frame_equal(attached[name], value.reset_index(drop=True), check_dtype=False, obj=name)
+        else:
+            assert list(attached[name]) == list(value)
+
+
+def _fail(frames, message):
+    raise ValueError(message)
+
+
+def _rows(frames, name):
+    return len(frames[name])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failing_task_raises(frames, workers):
+    # the error comes back from the pool; the nodes depending on it are never run
+    graph = {'ok': node(_rows, ('scores',)), 'bad': node(_fail, ('boom',)),
+             'after': node(lambda *parts: parts, deps=['ok', 'bad'], local=True)}
+    with pytest.raises(ValueError, match='boom'):
+        run_graph(graph, {'scores': frames['scores']}, workers=workers)
+
+
+def test_graph_errors():
+    with pytest.raises(ValueError, match='unknown'):
+        run_graph({'a': node(len, deps=['missing'], local=True)}, {}, workers=1)
+    with pytest.raises(ValueError, match='cycle'):
+        run_graph({'a': node(len, deps=['b'], local=True), 'b': node(len, deps=['a'], local=True)}, {}, workers=1)
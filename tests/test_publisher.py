@@ -0,0 +1,107 @@
+import pandas as pd
+from pygsheets import Address
+
+from publisher import SheetPublisher, changed_row_runs, same_cell
+
+SHEET = 'sheet-id'
+
+
+class FakeSheet:
+    """SheetsClient double holding each tab as a list of rows"""
+
+    def __init__(self, tabs=None):
+        self.tabs = {tab: [list(r) for r in rows] for tab, rows in (tabs or {}).items()}
+        self.updates = []
+
+    def sheet_properties(self, sheet_id):
+        return {tab: {'sheetId': i, 'gridProperties': {'rowCount': 1000, 'columnCount': 26}}
+                for i, tab in enumerate(self.tabs)}
+
+    def batch_update(self, sheet_id, requests):
+        for request in requests:
+            if 'addSheet' in request:
+                self.tabs[request['addSheet']['properties']['title']] = []
+
+    @staticmethod
+    def _parse(a1):
+        tab, _, cells = a1.partition('!')
+        tab = tab[1:-1].replace("''", "'")
+        if not cells:
+            return tab, None
+        start, end = (Address(c) for c in cells.split(':'))
+        return tab, (start.row, start.col, end.row, end.col)
+
+    def values_batch_get(self, sheet_id, ranges, render=None):
+        result = []
+        for a1 in ranges:
+            tab, box = self._parse(a1)
+            rows = self.tabs[tab]
+            if box is not None:
+                rows = [r[box[1] - 1:box[3]] for r in rows[box[0] - 1:box[2]]]
+            result.append({'values': [list(r) for r in rows]})
+        return result
+
+    def values_batch_update(self, sheet_id, data):
+        self.updates.append(data)
+        for item in data:
+            tab, (row, col, _, _) = self._parse(item['range'])
+            grid = self.tabs[tab]
+            for i, values in enumerate(item['values']):
+                while len(grid) < row + i:
+                    grid.append([])
+                target = grid[row + i - 1]
+                target.extend([''] * (col - 1 + len(values) - len(target)))
+                target[col - 1:col - 1 + len(values)] = values
+
+    def cells(self, tab):
+        # what a reader sees: trailing blanks dropped
+        rows = [list(r) for r in self.tabs[tab]]
+        for r in rows:
+            while r and r[-1] == '':
+                r.pop()
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+
+def test_changed_row_runs():
+    old = [['a', 1], ['b', 2], ['c', 3], ['d', 4]]
+    new = [['a', 1], ['B', 2], ['C', 3], ['d', 4], ['e', 5]]
+    assert changed_row_runs(new, old, 2) == [(1, 2), (4, 4)]
+    assert changed_row_runs(old, old, 2) == []
+    assert changed_row_runs([['a', '']], [['a']], 2) == []  # missing cells read back as ''
+
+
+def test_numbers_compare_with_tolerance():
+    assert same_cell(0.1 + 0.2, 0.3)
+    assert same_cell(3, '3')
+    assert not same_cell(3, 4)
+
+
+def test_whole_tab_blanks_what_the_last_publish_left(tmp_path):
+    sheet = FakeSheet({'Tab': [['x'], [1], [4, 5], [7]]})
+    publisher = SheetPublisher(SHEET, client=sheet, state_path=str(tmp_path / 'state.json'))
+    summary = publisher.add('Tab', pd.DataFrame({'x': [1, 40]})).publish()
+
+    assert sheet.cells('Tab') == [['x'], [1], [40]]
+    # only the rows that differ are written, as wide as the widest leftover row
+    assert [item['range'] for item in sheet.updates[0]] == ["'Tab'!A3:B4"]
+    assert summary['ranges'] == 1
+
+
+def test_block_writes_only_its_cells_and_skips_unchanged(tmp_path):
+    sheet = FakeSheet({'Tab': [['keep', 'keep', 'keep']] * 3})
+    state = str(tmp_path / 'state.json')
+    df = pd.DataFrame({'a': [1.5, None]})
+    SheetPublisher(SHEET, client=sheet, state_path=state).add('Tab', df, 'B2').publish()
+    assert sheet.cells('Tab') == [['keep', 'keep', 'keep'], ['keep', 'a', 'keep'], ['keep', 1.5, 'keep']]
+
+    summary = SheetPublisher(SHEET, client=sheet, state_path=state).add('Tab', df, 'B2').publish()
+    assert summary['skipped'] == 1 and len(sheet.updates) == 1
+
+
+def test_new_tab_is_created(tmp_path):
+    sheet = FakeSheet()
+    SheetPublisher(SHEET, client=sheet, state_path=str(tmp_path / 'state.json')) \
+        .add('New', pd.DataFrame({'a': ['x']})).publish()
+    assert sheet.cells('New') == [['a'], ['x']]
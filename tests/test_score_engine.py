@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import score_engine
+from score_engine import AAMC1, FL_EXAMS, LATEST, MAX, score_table
+
+AAMC2 = FL_EXAMS['AAMC2'][1][0]
+AAMC3 = FL_EXAMS['AAMC3'][1][0]
+KFL1 = FL_EXAMS['KFL1'][1][0]
+
+
+def attempts(rows):
+    return pd.DataFrame(rows, columns=['kbs_enrollment_id', 'sequence_name', 'date_created', 'scaled_score']) \
+        .astype({'date_created': 'datetime64[ns]', 'scaled_score': float})
+
+
+def random_attempts(seed, n=400, names=(AAMC1, AAMC2, AAMC3, 'Unscored Diagnostic')):
+    rng = np.random.default_rng(seed)
+    return attempts({
+        'kbs_enrollment_id': rng.integers(0, 40, n).astype(str),
+        'sequence_name': rng.choice(list(names), n),
+        'date_created': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 20, n), unit='D'),
+        'scaled_score': np.where(rng.random(n) < 0.1, np.nan, rng.integers(500, 505, n)),  # many ties
+    })
+
+
+def picked(table, name):
+    rows = table[table['pick'] == name]
+    return rows.set_index('kbs_enrollment_id')[['date_created', 'scaled_score']].sort_index()
+
+
+def notebook_first(df, names):
+    # notebook: groupby(...)['date_created'].idxmin() over the exam's attempts
+    df = df[df['sequence_name'].isin(names)].dropna(subset=['date_created'])
+    return df.loc[df.groupby('kbs_enrollment_id')['date_created'].idxmin()]
+
+
+def notebook_max(scores):
+    # notebook: groupby(...)['scaled_score'].idxmax() over the practice tests other than AAMC1
+    df = scores[scores['sequence_name'] != AAMC1].dropna(subset=['scaled_score'])
+    return df.loc[df.groupby('kbs_enrollment_id')['scaled_score'].idxmax()]
+
+
+def notebook_latest(scores):
+    df = scores.dropna(subset=['date_created'])
+    return df.loc[df.groupby('kbs_enrollment_id')['date_created'].idxmax()]
+
+
+def expected(df):
+    return df.set_index('kbs_enrollment_id')[['date_created', 'scaled_score']].sort_index()
+
+
+def test_max_tie_goes_to_first_row_in_input_order():
+    scores = attempts([
+        ('e1', AAMC2, '2024-03-05', 510),  # first in input order, later date
+        ('e1', AAMC3, '2024-03-01', 510),
+        ('e1', AAMC1, '2024-02-01', 520),  # AAMC1 never counts as the max
+    ])
+    table = score_table(scores, attempts([]))
+    row = picked(table, MAX).loc['e1']
+    assert row['date_created'] == pd.Timestamp('2024-03-05')
+    assert row['scaled_score'] == 510
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_picks_match_notebook(seed):
+    scores = random_attempts(seed)
+    kfl = random_attempts(seed + 100, n=150, names=(KFL1, 'mcat-other'))
+    table = score_table(scores, kfl)
+
+    pd.testing.assert_frame_equal(picked(table, MAX), expected(notebook_max(scores)))
+    pd.testing.assert_frame_equal(picked(table, LATEST), expected(notebook_latest(scores)))
+    for label, (source, names) in FL_EXAMS.items():
+        frame = scores if source == 'scores' else kfl
+        pd.testing.assert_frame_equal(picked(table, label), expected(notebook_first(frame, names)))
+
+
+def test_n_pt_counts_distinct_practice_tests():
+    scores = attempts([
+        ('e1', AAMC1, '2024-01-01', 500),
+        ('e1', AAMC1, '2024-01-02', 501),
+        ('e1', AAMC2, '2024-01-03', 502),
+        ('e2', AAMC2, '2024-01-03', 502),
+    ])
+    table = score_table(scores, attempts([]))
+    assert table.groupby('kbs_enrollment_id')['n_pt'].first().to_dict() == {'e1': 2, 'e2': 1}
+    assert set(score_engine.pick(table, MAX, min_pt=2)['kbs_enrollment_id']) == {'e1'}
@@ -0,0 +1,27 @@
+import pytest
+
+from selections import RecentSelections, delete_selection, load_saved_selections, save_selection
+
+
+def test_save_load_delete(tmp_path):
+    path = str(tmp_path / 'saved.json')
+    assert load_saved_selections(path) == {}
+    save_selection('top', ['P2', 'P1'], path)
+    save_selection('one', ['P3'], path)
+    assert load_saved_selections(path) == {'one': ['P3'], 'top': ['P1', 'P2']}
+    delete_selection('one', path)
+    assert load_saved_selections(path) == {'top': ['P1', 'P2']}
+
+
+@pytest.mark.parametrize('content', ['[1, 2]', '"P1"', '{"top": null}', '{"top": "P1"}', 'not json'])
+def test_malformed_file_is_ignored(tmp_path, content):
+    path = tmp_path / 'saved.json'
+    path.write_text(content)
+    assert load_saved_selections(str(path)) == {}
+
+
+def test_recent_selections_most_common():
+    recent = RecentSelections(maxsize=4)
+    for products in (['P1'], ['P2', 'P1'], ['P1', 'P2'], [], ['P3']):
+        recent.record(products)
+    assert recent.most_common(1) == [['P1', 'P2']]
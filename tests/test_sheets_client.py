@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from sheets_client import SheetsClient
+from synthetic_data import FakeGSheetsClient, synthetic_tabs
+
+SHEET = 'sheet-id'
+
+
+class HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f'HTTP {status}')
+        self.resp = type('Resp', (), {'status': status})()
+
+
+@pytest.fixture(scope='module')
+def tabs():
+    return synthetic_tabs(3)
+
+
+def client_for(fake, **kwargs):
+    return SheetsClient(lambda: fake, rate=1000, burst=1000, base_delay=0, **kwargs)
+
+
+def test_concurrent_reads_share_one_request(tabs):
+    fake = FakeGSheetsClient(tabs)
+    fetch, release = fake.sheet.values_batch_get, threading.Event()
+    def slow_fetch(*args, **kwargs):
+        release.wait(5)
+        return fetch(*args, **kwargs)
+    fake.sheet.values_batch_get = slow_fetch
+    client = client_for(fake)
+    ranges = list(tabs)[:3]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.values_batch_get(SHEET, ranges)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while client.coalesced < 3 * len(ranges) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert fake.sheet.requests == 1
+    assert client.coalesced == 3 * len(ranges)
+    assert [[r['values'] for r in result] for result in results] == [[tabs[r] for r in ranges]] * 4
+
+
+def test_finished_flights_are_fetched_again(tabs):
+    fake = FakeGSheetsClient(tabs)
+    client = client_for(fake)
+    ranges = list(tabs)[:1]
+    client.values_batch_get(SHEET, ranges)
+    client.values_batch_get(SHEET, ranges)
+    assert fake.sheet.requests == 2
+
+
+def flaky(fake, failures):
+    fetch = fake.sheet.values_batch_get
+    def values_batch_get(*args, **kwargs):
+        if failures:
+            raise HttpError(failures.pop(0))
+        return fetch(*args, **kwargs)
+    fake.sheet.values_batch_get = values_batch_get
+
+
+def test_retries_rate_limits_and_server_errors(tabs):
+    fake = FakeGSheetsClient(tabs)
+    flaky(fake, [429, 503])
+    client = client_for(fake)
+    ranges = list(tabs)[:2]
+    assert [r['values'] for r in client.values_batch_get(SHEET, ranges)] == [tabs[r] for r in ranges]
+    assert client.retries == 2
+    assert client.requests == 3
+
+
+def test_client_errors_are_not_retried(tabs):
+    fake = FakeGSheetsClient(tabs)
+    flaky(fake, [403])
+    client = client_for(fake)
+    with pytest.raises(HttpError):
+        client.values_batch_get(SHEET, list(tabs)[:1])
+    assert client.retries == 0
+
+
+def test_gives_up_after_max_retries_and_waiters_see_the_error(tabs):
+    fake = FakeGSheetsClient(tabs)
+    flaky(fake, [500] * 3)  # one more than the attempts allowed
+    client = client_for(fake, max_retries=2)
+    with pytest.raises(HttpError):
+        client.values_batch_get(SHEET, list(tabs)[:1])
+    assert client.requests == 3
+    # the failed flight is gone: the next call fetches again
+    assert client.values_batch_get(SHEET, list(tabs)[:1])[0]['values'] == tabs[list(tabs)[0]]
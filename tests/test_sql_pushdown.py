@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import etl
+import sql_pushdown
+from agg_cube import build_cube
+from chart_blocks import cube_specs
+from helper_function import DASHBOARD_TABS
+
+YEARS = [2023, 2024, 2025]
+AS_OF = pd.Timestamp('2025-10-01')
+
+
+@pytest.fixture(scope='module')
+def cubes(frames):
+    outputs = etl.build_outputs(frames, 6, YEARS, as_of=AS_OF)
+    tabs = {key: dict(outputs[DASHBOARD_TABS[key][0]])[None] for key in cube_specs()}
+    return {key: build_cube(tabs[key], month_col, blocks, YEARS) for key, (month_col, blocks) in cube_specs().items()}
+
+
+@pytest.fixture(scope='module')
+def trends(frames, tmp_path_factory):
+    store = sql_pushdown.FactStore(f"sqlite:{tmp_path_factory.mktemp('facts') / 'facts.db'}")
+    sql_pushdown.write_facts(frames, store)
+    return sql_pushdown.SqlTrends(store, cube_specs(), YEARS)
+
+
+def selections(frames):
+    products = sorted(map(str, frames['products']))
+    return {'all': products, 'some': products[::2], 'one': products[:1], 'none': []}
+
+
+@pytest.mark.parametrize('selection', ['all', 'some', 'one', 'none'])
+@pytest.mark.parametrize('key', list(cube_specs()))
+def test_select_matches_cube(frames, cubes, trends, key, selection):
+    products = selections(frames)[selection]
+    expected = cubes[key].select(products)
+    result = trends.select(key, products, as_of=AS_OF)
+    assert list(result) == list(expected)
+    for block, df in expected.items():
+        pd.testing.assert_frame_equal(result[block], df.reset_index(drop=True), check_dtype=False, obj=block)
+
+
+def test_memo_entries_of_old_store_versions_are_dropped(trends):
+    from dataset_registry import BoundedLRU
+    cache = BoundedLRU()
+    cache.put(('dataset-version', 'block'), 'kept')
+    old = ('facts', 0, 0, 'yesterday')
+    cache.put((old, 'key'), 'stale')
+    assert trends.memoize(cache, ('key',), lambda: 'fresh') == 'fresh'
+    assert [k for k, _ in cache.items()] == [('dataset-version', 'block'), (trends.version(), 'key')]